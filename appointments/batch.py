@@ -0,0 +1,163 @@
+"""
+Bulk booking and bulk status changes.
+
+Every item is validated without touching the database. Doctor and patient
+existence is then checked with one query each. Accepted items are written
+with ``bulk_create`` / ``bulk_update`` inside a single transaction. Rejected
+items don't abort the batch; the caller gets one result per item, in request
+order.
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import Doctor, Patient
+from users.scoping import scope_to_user
+from .models import Appointment
+from .serializers import AppointmentBatchItemSerializer, AppointmentStatusItemSerializer
+from .signals import appointments_bulk_created, appointments_bulk_updated
+from . import scheduling
+
+MAX_BATCH_SIZE = 1000
+WRITE_BATCH_SIZE = 500
+
+
+def create_appointments(items, patient_id=None):
+    """
+    Book ``items`` (dicts shaped like AppointmentBatchItemSerializer).
+
+    ``patient_id`` pins every item to one patient, as ``perform_create`` does
+    for patients booking for themselves.
+    """
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        serializer = AppointmentBatchItemSerializer(data=item)
+        if not serializer.is_valid():
+            results[index] = {'index': index, 'errors': serializer.errors}
+            continue
+        data = serializer.validated_data
+        if patient_id is not None:
+            data['patient'] = patient_id
+        elif data.get('patient') is None:
+            results[index] = {'index': index, 'errors': {'patient': ['This field is required.']}}
+            continue
+        valid.append((index, data))
+
+    doctors = Doctor.objects.in_bulk({data['doctor'] for _, data in valid})
+    patients = set(Patient.objects.filter(
+        pk__in={data['patient'] for _, data in valid}).values_list('pk', flat=True))
+
+    bookable = []
+    for index, data in valid:
+        if data['doctor'] not in doctors:
+            results[index] = {'index': index, 'errors': {'doctor': ['Doctor not found.']}}
+        elif data['patient'] not in patients:
+            results[index] = {'index': index, 'errors': {'patient': ['Patient not found.']}}
+        else:
+            doctor = doctors[data['doctor']]
+            data['end_at'] = data['appointment_date'] + doctor.slot_length
+            if scheduling.within_hours(doctor, data['appointment_date'], data['end_at']):
+                bookable.append((index, data))
+            else:
+                results[index] = {'index': index, 'errors': {
+                    'appointment_date': ["Outside the doctor's working hours."]}}
+
+    with transaction.atomic():
+        to_create = []
+        for index, data in _drop_conflicts(bookable, results):
+            to_create.append((index, Appointment(
+                doctor_id=data['doctor'], patient_id=data['patient'],
+                appointment_date=data['appointment_date'], end_at=data['end_at'],
+                status=data['status'], notes=data['notes'],
+            )))
+        created = Appointment.objects.bulk_create([obj for _, obj in to_create], batch_size=WRITE_BATCH_SIZE)
+        appointments_bulk_created.send(sender=Appointment, instances=created)
+
+    for index, obj in to_create:
+        results[index] = {'index': index, 'id': obj.pk}
+    return results
+
+
+def _drop_conflicts(bookable, results):
+    """
+    Return the items that fit their doctor's calendar, recording an error for the rest.
+
+    Locks the doctors involved, so it must run inside the writing transaction.
+    """
+    active = [(index, data) for index, data in bookable if data['status'] != 'cancelled']
+    busy = defaultdict(lambda: ([], []))  # doctor -> (sorted starts, matching ends)
+    if active:
+        doctor_ids = sorted({data['doctor'] for _, data in active})
+        scheduling.lock_doctors(doctor_ids)
+        window_start = min(data['appointment_date'] for _, data in active)
+        window_end = max(data['end_at'] for _, data in active)
+        for doctor_id, start, end in Appointment.objects.filter(
+            doctor_id__in=doctor_ids,
+            appointment_date__gt=window_start - timedelta(minutes=Doctor.MAX_SLOT_MINUTES),
+            appointment_date__lt=window_end,
+            end_at__gt=window_start,
+        ).exclude(status='cancelled').order_by('appointment_date').values_list(
+            'doctor_id', 'appointment_date', 'end_at'
+        ):
+            starts, ends = busy[doctor_id]
+            starts.append(start)
+            ends.append(end)
+
+    accepted = []
+    for index, data in bookable:
+        if data['status'] != 'cancelled':
+            starts, ends = busy[data['doctor']]
+            start, end = data['appointment_date'], data['end_at']
+            # intervals don't overlap, so only the last one starting before `end` can clash
+            position = bisect_left(starts, end)
+            if position and ends[position - 1] > start:
+                results[index] = {'index': index, 'errors': {
+                    'appointment_date': ['The doctor is already booked at this time.']}}
+                continue
+            position = bisect_right(starts, start)
+            starts.insert(position, start)
+            ends.insert(position, end)
+        accepted.append((index, data))
+    return accepted
+
+
+def update_statuses(items, user):
+    """Apply ``{id, status}`` changes to appointments ``user`` can see."""
+    results = [None] * len(items)
+    valid = {}
+    for index, item in enumerate(items):
+        serializer = AppointmentStatusItemSerializer(data=item)
+        if not serializer.is_valid():
+            results[index] = {'index': index, 'errors': serializer.errors}
+        elif serializer.validated_data['id'] in valid:
+            results[index] = {'index': index, 'errors': {'id': ['Duplicate id in batch.']}}
+        else:
+            valid[serializer.validated_data['id']] = (index, serializer.validated_data['status'])
+
+    with transaction.atomic():
+        appointments = scope_to_user(Appointment.objects.all(), user).select_for_update().in_bulk(valid)
+        changed = []
+        previous = {}
+        now = timezone.now()
+        for pk, (index, status) in valid.items():
+            appointment = appointments.get(pk)
+            if appointment is None:
+                results[index] = {'index': index, 'errors': {'id': ['Not found.']}}
+                continue
+            if appointment.status == 'cancelled' and status != 'cancelled':
+                # reopening needs a slot check; use the detail endpoint for that
+                results[index] = {'index': index, 'errors': {
+                    'status': ['Cancelled appointments cannot be reopened in a batch.']}}
+                continue
+            previous[pk] = appointment.status
+            appointment.status = status
+            appointment.updated_at = now
+            changed.append(appointment)
+            results[index] = {'index': index, 'id': pk, 'status': status}
+        Appointment.objects.bulk_update(changed, ['status', 'updated_at'], batch_size=WRITE_BATCH_SIZE)
+        appointments_bulk_updated.send(sender=Appointment, instances=changed, previous=previous)
+    return results
@@ -0,0 +1,47 @@
+import logging
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from appointments.reminders import DEFAULT_BATCH_SIZE, run_once
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Send due appointment reminders and mark no-shows; keeps running unless --once (safe to run several)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run one pass and exit (e.g. from cron)')
+        parser.add_argument('--interval', type=float, default=60, help='Seconds between passes')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Rows claimed per transaction')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            self.report(run_once(batch_size=options['batch_size']))
+            return
+
+        stopping = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stopping.set())  # finish the current batch, then exit
+        self.stdout.write(f"Scheduler running every {options['interval']}s")
+        while not stopping.is_set():
+            close_old_connections()
+            try:
+                report = run_once(batch_size=options['batch_size'])
+            except Exception:
+                # e.g. the notification backend is down; the batch was rolled back and is retried next pass
+                logger.exception('Scheduler pass failed')
+            else:
+                if any(report[job] for job in report if job != 'seconds'):
+                    self.report(report)
+            stopping.wait(options['interval'])
+        self.stdout.write('Scheduler stopped')
+
+    def report(self, report):
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {report['no_show']} no-shows, {report['reminder_24h']} 24h and "
+            f"{report['reminder_1h']} 1h reminders in {report['seconds']}s"))
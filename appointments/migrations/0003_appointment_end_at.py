@@ -0,0 +1,52 @@
+# Generated by Django 6.0.2 on 2026-10-18 03:04
+
+import datetime
+from django.db import migrations, models
+from django.db.models import DateTimeField, ExpressionWrapper, F
+
+
+def backfill_end_at(apps, schema_editor):
+    # existing rows predate per-doctor slot lengths; assume the 30 minute default
+    Appointment = apps.get_model('appointments', 'Appointment')
+    Appointment.objects.filter(end_at__isnull=True).update(end_at=ExpressionWrapper(
+        F('appointment_date') + datetime.timedelta(minutes=30), output_field=DateTimeField()))
+
+
+def add_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return  # SQLite relies on the locked check in appointments.scheduling
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(
+        "ALTER TABLE appointments_appointment ADD CONSTRAINT appt_no_doctor_overlap "
+        "EXCLUDE USING gist (doctor_id WITH =, tstzrange(appointment_date, end_at, '[)') WITH &&) "
+        "WHERE (status <> 'cancelled')"
+    )
+
+
+def drop_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('ALTER TABLE appointments_appointment DROP CONSTRAINT IF EXISTS appt_no_doctor_overlap')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_appointment_keyset_indexes'),
+        ('users', '0003_doctor_working_hours'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='end_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(backfill_end_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='appointment',
+            name='end_at',
+            field=models.DateTimeField(),
+        ),
+        migrations.RunPython(add_overlap_constraint, drop_overlap_constraint),
+    ]
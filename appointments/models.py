@@ -1,18 +1,92 @@
-from django.db import models
-from users.models import Doctor, Patient
+from django.db import connections, models
+from django.db.models import F
+from users.models import Doctor, Patient, full_name
+from users.scoping import scope_to_user
+
+
+class AppointmentQuerySet(models.QuerySet):
+    row_fields = (
+        'id', 'doctor_id', 'patient_id', 'doctor_name', 'patient_name',
+        'appointment_date', 'end_at', 'status', 'notes', 'updated_at',
+    )
+
+    def visible_to(self, user):
+        """``user``'s appointments, with the names the serializers show."""
+        return scope_to_user(self, user).select_related('doctor__user', 'patient__user')
+
+    def list_rows(self):
+        """Flat dict rows for bulk reads; names are joined in the same query."""
+        return self.annotate(
+            doctor_name=full_name('doctor__user'),
+            patient_name=full_name('patient__user'),
+        ).values(*self.row_fields)
+
+    def claim(self, batch_size):
+        """
+        Up to ``batch_size`` rows no other worker holds, locked until the transaction ends.
+
+        Concurrent workers (``SKIP LOCKED``) each get different rows.
+        """
+        if connections[self.db].features.has_select_for_update:
+            return self.select_for_update(skip_locked=True, of=('self',))[:batch_size]
+        # SQLite has no row locks; a no-op write of the batch takes the database write lock, so workers take turns
+        self.model.objects.filter(pk__in=self.values('pk')[:batch_size]).update(status=F('status'))
+        return self[:batch_size]
+
 
 class Appointment(models.Model):
     STATUS_CHOICES = [
         ('scheduled', 'Scheduled'),
         ('completed', 'Completed'),
         ('cancelled', 'Cancelled'),
+        ('no_show', 'No-show'),  # set by appointments.reminders once the slot has passed
     ]
     doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='appointments')
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='appointments')
     appointment_date = models.DateTimeField()
+    end_at = models.DateTimeField()  # appointment_date + the doctor's slot length at booking time
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='scheduled')
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # bulk_update callers must set it themselves
+    # sent state of appointments.reminders; cleared when the appointment moves
+    reminder_24h_sent_at = models.DateTimeField(null=True, blank=True)
+    reminder_1h_sent_at = models.DateTimeField(null=True, blank=True)
+
+    objects = AppointmentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination: (appointment_date, id) per role scope
+            models.Index(fields=['appointment_date', 'id'], name='appt_date_id_idx'),
+            models.Index(fields=['doctor', 'appointment_date', 'id'], name='appt_doctor_date_id_idx'),
+            models.Index(fields=['patient', 'appointment_date', 'id'], name='appt_patient_date_id_idx'),
+            # conditional GET validators: MAX(updated_at) and COUNT(*) per role scope
+            models.Index(fields=['updated_at'], name='appt_updated_idx'),
+            models.Index(fields=['doctor', 'updated_at'], name='appt_doctor_updated_idx'),
+            models.Index(fields=['patient', 'updated_at'], name='appt_patient_updated_idx'),
+            # reminder and no-show scans: only the (few) scheduled rows, by time
+            models.Index(fields=['appointment_date'], name='appt_scheduled_date_idx',
+                         condition=models.Q(status='scheduled')),
+        ]
 
     def __str__(self):
-        return f"{self.patient} with {self.doctor} on {self.appointment_date}"
\ No newline at end of file
+        return f"{self.patient} with {self.doctor} on {self.appointment_date}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_status = instance.__dict__.get('status')  # for status-change events
+        instance._saved_appointment_date = instance.__dict__.get('appointment_date')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self.end_at is None:
+            self.end_at = self.appointment_date + self.doctor.slot_length
+        saved_date = getattr(self, '_saved_appointment_date', None)
+        if saved_date is not None and saved_date != self.appointment_date:
+            # moved: the reminders sent so far named the old time
+            self.reminder_24h_sent_at = self.reminder_1h_sent_at = None
+        super().save(*args, **kwargs)
+        self._saved_status = self.status
+        self._saved_appointment_date = self.appointment_date
\ No newline at end of file
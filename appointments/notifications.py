@@ -0,0 +1,105 @@
+"""
+Patient notifications sent by ``appointments.reminders``.
+
+``NOTIFICATION_BACKEND`` is the dotted path of the backend class, as with
+Django's ``EMAIL_BACKEND``. ``send(notifications)`` delivers a whole batch.
+If it raises, the batch counts as undelivered, and the scheduler offers it
+again on its next run. It returns the notifications it had to skip, which stay
+unstamped and are offered again on later runs too (say, once the patient has
+an email address). The rest is stamped as sent.
+
+- ``EmailBackend``: one email per notification, over Django's mail
+  connection (``EMAIL_*`` settings). Skips patients without an email
+  address. This is the default.
+- ``ConsoleBackend``: prints them. This is the default under ``DEBUG`` only,
+  as a worker that prints never delivers a reminder.
+- ``FileBackend``: appends JSON lines to ``NOTIFICATION_FILE_PATH``.
+- ``MemoryBackend``: collects them in ``MemoryBackend.outbox``, for tests.
+"""
+import json
+import sys
+import threading
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+from django.conf import settings
+from django.core import mail
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+@dataclass(frozen=True)
+class Notification:
+    kind: str  # 'reminder_24h' or 'reminder_1h'
+    appointment_id: int
+    patient_id: int
+    recipient: str  # the patient's email; may be empty
+    patient_name: str
+    doctor_name: str
+    appointment_date: datetime
+
+    @property
+    def subject(self):
+        return 'Appointment reminder'
+
+    @property
+    def body(self):
+        when = timezone.localtime(self.appointment_date).strftime('%A %d %B at %H:%M')
+        return f"Dear {self.patient_name}, this is a reminder of your appointment with {self.doctor_name} on {when}."
+
+    def as_dict(self):
+        return {**asdict(self), 'appointment_date': self.appointment_date.isoformat()}
+
+
+class BaseBackend:
+    def send(self, notifications):
+        """
+        Deliver ``notifications`` (a list of ``Notification``); raise if they weren't.
+
+        Returns the ones that can't be delivered, if any.
+        """
+        raise NotImplementedError
+
+
+class ConsoleBackend(BaseBackend):
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send(self, notifications):
+        for notification in notifications:
+            self.stream.write(f"[{notification.kind}] to={notification.recipient or '-'} {notification.body}\n")
+        self.stream.flush()
+
+
+class FileBackend(BaseBackend):
+    _lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self.path = path or settings.NOTIFICATION_FILE_PATH
+
+    def send(self, notifications):
+        lines = ''.join(json.dumps(notification.as_dict()) + '\n' for notification in notifications)
+        with self._lock, open(self.path, 'a') as f:
+            f.write(lines)
+
+
+class MemoryBackend(BaseBackend):
+    outbox = []
+
+    def send(self, notifications):
+        MemoryBackend.outbox.extend(notifications)
+
+
+class EmailBackend(BaseBackend):
+    def send(self, notifications):
+        messages = [
+            mail.EmailMessage(notification.subject, notification.body, to=[notification.recipient])
+            for notification in notifications if notification.recipient
+        ]
+        with mail.get_connection() as connection:
+            connection.send_messages(messages)
+        return [notification for notification in notifications if not notification.recipient]
+
+
+def get_backend():
+    return import_string(settings.NOTIFICATION_BACKEND)()
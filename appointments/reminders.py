@@ -0,0 +1,130 @@
+"""
+Appointment reminders and no-show marking, run by ``manage.py run_scheduler``.
+
+Each job picks its due rows from the scheduled appointments only, through the
+partial ``appt_scheduled_date_idx`` index, so a scan touches one time window
+instead of the whole table:
+
+- ``reminder_24h``: the appointment starts in (1h, 24h] and no 24h reminder
+  has been sent. Appointments booked closer than that get only the 1h one.
+- ``reminder_1h``: the appointment starts in (0, 1h].
+- no-show: the appointment ended more than ``NO_SHOW_GRACE_MINUTES`` ago and
+  is still scheduled. It's moved to ``no_show`` and announced with
+  ``appointments_bulk_updated``, like a batch status change.
+
+Rows are claimed a batch at a time with ``SELECT ... FOR UPDATE SKIP LOCKED``,
+so parallel workers split the due rows between them. The batch is then
+dispatched, and its sent-at column is stamped in the same transaction. A
+stamped row is never picked again, so re-runs are harmless. If the backend
+fails, the transaction rolls back and the batch is retried on the next run.
+Notifications the backend skips (no email address) are left unstamped; the
+run passes over them, and the next one tries again.
+Delivery is at-least-once: a crash between a successful send and the commit
+repeats that batch.
+"""
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from users.models import full_name
+from .models import Appointment
+from .notifications import Notification, get_backend
+from .signals import appointments_bulk_updated
+
+DEFAULT_BATCH_SIZE = 200
+
+
+@dataclass(frozen=True)
+class Reminder:
+    kind: str
+    lead: timedelta  # sent once the appointment is at most this far away
+    until: timedelta  # ...and still further away than this
+    sent_field: str
+
+
+REMINDERS = (
+    Reminder('reminder_24h', timedelta(hours=24), timedelta(hours=1), 'reminder_24h_sent_at'),
+    Reminder('reminder_1h', timedelta(hours=1), timedelta(0), 'reminder_1h_sent_at'),
+)
+
+
+def due_reminders(reminder, now):
+    return Appointment.objects.filter(
+        status='scheduled',
+        appointment_date__gt=now + reminder.until,
+        appointment_date__lte=now + reminder.lead,
+        **{f'{reminder.sent_field}__isnull': True},
+    ).order_by('appointment_date')
+
+
+def due_no_shows(now):
+    cutoff = now - timedelta(minutes=settings.NO_SHOW_GRACE_MINUTES)
+    # appointment_date < end_at, so the first condition bounds the index range
+    return Appointment.objects.filter(
+        status='scheduled', appointment_date__lt=cutoff, end_at__lt=cutoff,
+    ).order_by('appointment_date')
+
+
+def send_reminders(reminder, now=None, batch_size=DEFAULT_BATCH_SIZE, backend=None):
+    """Send every due ``reminder``, a batch per transaction; returns how many were sent."""
+    now = now or timezone.now()
+    backend = backend or get_backend()
+    sent = 0
+    skipped = set()
+    while True:
+        with transaction.atomic():
+            rows = list(due_reminders(reminder, now).exclude(pk__in=skipped).claim(batch_size).values(
+                'id', 'patient_id', 'appointment_date',
+                recipient=F('patient__user__email'),
+                patient_name=full_name('patient__user'),
+                doctor_name=full_name('doctor__user'),
+            ))
+            if not rows:
+                return sent
+            notifications = [Notification(kind=reminder.kind, appointment_id=row.pop('id'), **row) for row in rows]
+            skipped.update(n.appointment_id for n in backend.send(notifications) or ())
+            delivered = [n.appointment_id for n in notifications if n.appointment_id not in skipped]
+            # update(), not save(): the stamp isn't part of the API, so updated_at (the ETags) stays put
+            Appointment.objects.filter(pk__in=delivered).update(**{reminder.sent_field: now})
+        sent += len(delivered)
+        if len(rows) < batch_size:
+            return sent
+
+
+def mark_no_shows(now=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Move scheduled appointments whose slot has passed to ``no_show``; returns how many."""
+    now = now or timezone.now()
+    marked = 0
+    while True:
+        with transaction.atomic():
+            appointments = list(due_no_shows(now).claim(batch_size).only(
+                'id', 'doctor_id', 'patient_id', 'appointment_date', 'status'))
+            if not appointments:
+                return marked
+            Appointment.objects.filter(pk__in=[a.pk for a in appointments]).update(
+                status='no_show', updated_at=now)
+            for appointment in appointments:
+                appointment.status = 'no_show'
+                appointment.updated_at = now
+            appointments_bulk_updated.send(sender=Appointment, instances=appointments,
+                                           previous={a.pk: 'scheduled' for a in appointments})
+        marked += len(appointments)
+        if len(appointments) < batch_size:
+            return marked
+
+
+def run_once(now=None, batch_size=DEFAULT_BATCH_SIZE, backend=None):
+    """One pass of every job: ``{'no_show': n, 'reminder_24h': n, 'reminder_1h': n, 'seconds': s}``."""
+    started = time.monotonic()
+    now = now or timezone.now()
+    backend = backend or get_backend()
+    report = {'no_show': mark_no_shows(now, batch_size=batch_size)}
+    for reminder in REMINDERS:
+        report[reminder.kind] = send_reminders(reminder, now, batch_size=batch_size, backend=backend)
+    report['seconds'] = round(time.monotonic() - started, 3)
+    return report
@@ -0,0 +1,100 @@
+"""
+Per-doctor slot bookkeeping.
+
+An appointment occupies ``[appointment_date, end_at)`` on its doctor's
+calendar, inside the doctor's working hours. Cancelled appointments free
+their slot. On Postgres the
+``appt_no_doctor_overlap`` exclusion constraint guarantees no two active
+appointments of a doctor overlap; ``reserve`` performs the same check under a
+per-doctor lock so SQLite (and friendlier error messages) get the same
+guarantee.
+"""
+from datetime import datetime, timedelta
+
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from users.models import Doctor
+from .models import Appointment
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+def lock_doctors(doctor_ids):
+    """Serialise bookings for these doctors until the surrounding transaction ends."""
+    doctors = Doctor.objects.filter(pk__in=doctor_ids)
+    if connection.features.has_select_for_update:
+        # always lock in pk order so concurrent batches can't deadlock
+        list(doctors.select_for_update().order_by('pk').values_list('pk'))
+    else:
+        # SQLite has no row locks; a no-op write takes the database write lock instead
+        doctors.update(slot_minutes=F('slot_minutes'))
+
+
+def lock_doctor(doctor_id):
+    lock_doctors([doctor_id])
+
+
+def booked_intervals(doctor_id, start, end, exclude_pk=None):
+    """``(start, end)`` pairs of active appointments overlapping ``[start, end)``, by start."""
+    queryset = Appointment.objects.filter(
+        doctor_id=doctor_id,
+        # bounded on both sides so this stays a range scan on (doctor, appointment_date, id)
+        appointment_date__gt=start - timedelta(minutes=Doctor.MAX_SLOT_MINUTES),
+        appointment_date__lt=end,
+        end_at__gt=start,
+    ).exclude(status='cancelled')
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+    return queryset.order_by('appointment_date').values_list('appointment_date', 'end_at')
+
+
+def within_hours(doctor, start, end):
+    """Whether ``[start, end)`` lies inside ``doctor``'s working hours on the day it starts."""
+    day = timezone.localtime(start).date()
+    return (timezone.make_aware(datetime.combine(day, doctor.work_start)) <= start
+            and end <= timezone.make_aware(datetime.combine(day, doctor.work_end)))
+
+
+def reserve(doctor, start, exclude_pk=None):
+    """
+    Claim ``doctor``'s slot starting at ``start`` and return its end.
+
+    Must run inside ``transaction.atomic()``; the lock is held until commit.
+    """
+    end = start + doctor.slot_length
+    if not within_hours(doctor, start, end):
+        raise SlotUnavailable(
+            f"{doctor} sees patients {doctor.work_start:%H:%M}-{doctor.work_end:%H:%M}; "
+            f"{start:%Y-%m-%d %H:%M} is outside those hours.")
+    lock_doctor(doctor.pk)
+    if booked_intervals(doctor.pk, start, end, exclude_pk=exclude_pk).exists():
+        raise SlotUnavailable(f"{doctor} is already booked at {start:%Y-%m-%d %H:%M}.")
+    return end
+
+
+def free_slots(doctor, start, end):
+    """Unbooked ``(start, end)`` slots inside the doctor's working hours within ``[start, end)``."""
+    step = doctor.slot_length
+    busy = list(booked_intervals(doctor.pk, start, end))
+    slots = []
+    i = 0
+    day = timezone.localtime(start).date()
+    last_day = timezone.localtime(end).date()
+    while day <= last_day:
+        slot = timezone.make_aware(datetime.combine(day, doctor.work_start))
+        day_end = timezone.make_aware(datetime.combine(day, doctor.work_end))
+        while slot + step <= day_end:
+            slot_end = slot + step
+            if slot >= start and slot_end <= end:
+                # a doctor's intervals don't overlap, so sorted by start they are sorted by end too
+                while i < len(busy) and busy[i][1] <= slot:
+                    i += 1
+                if i == len(busy) or busy[i][0] >= slot_end:
+                    slots.append((slot, slot_end))
+            slot = slot_end
+        day += timedelta(days=1)
+    return slots
@@ -1,13 +1,64 @@
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
+from hospital_management.fieldsets import SparseFieldsMixin
 from .models import Appointment
+from . import scheduling
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     doctor_name = serializers.CharField(source='doctor.user.get_full_name', read_only=True)
     patient_name = serializers.CharField(source='patient.user.get_full_name', read_only=True)
 
     class Meta:
         model = Appointment
-        fields = ['id', 'doctor', 'patient', 'doctor_name', 'patient_name', 'appointment_date', 'status', 'notes']
+        fields = ['id', 'doctor', 'patient', 'doctor_name', 'patient_name', 'appointment_date', 'end_at', 'status', 'notes']
+        read_only_fields = ['end_at']
         extra_kwargs = {
             'patient': {'required': False, 'allow_null': True}
-        }
\ No newline at end of file
+        }
+
+    def create(self, validated_data):
+        return self._book(None, validated_data)
+
+    def update(self, instance, validated_data):
+        doctor = validated_data.get('doctor', instance.doctor)
+        start = validated_data.get('appointment_date', instance.appointment_date)
+        status = validated_data.get('status', instance.status)
+        moved = doctor != instance.doctor or start != instance.appointment_date
+        reopened = instance.status == 'cancelled' and status != 'cancelled'
+        if status == 'cancelled' or not (moved or reopened):
+            if moved:
+                # a cancelled appointment holds no slot, but its interval still follows the move
+                validated_data['end_at'] = start + doctor.slot_length
+            return super().update(instance, validated_data)
+        return self._book(instance, validated_data)
+
+    def _book(self, instance, validated_data):
+        """Save while holding the doctor's slot, so concurrent bookings can't overlap."""
+        doctor = validated_data.get('doctor') or instance.doctor
+        start = validated_data.get('appointment_date') or instance.appointment_date
+        try:
+            with transaction.atomic():
+                validated_data['end_at'] = scheduling.reserve(
+                    doctor, start, exclude_pk=instance.pk if instance else None)
+                if instance is None:
+                    return super().create(validated_data)
+                return super().update(instance, validated_data)
+        except scheduling.SlotUnavailable as exc:
+            raise serializers.ValidationError({'appointment_date': [str(exc)]})
+        except IntegrityError:
+            # lost the race against the database exclusion constraint
+            raise serializers.ValidationError({'appointment_date': ['This slot was just booked.']})
+
+
+class AppointmentBatchItemSerializer(serializers.Serializer):
+    """One entry of a batch booking; doctor and patient are checked in bulk by appointments.batch."""
+    doctor = serializers.IntegerField()
+    patient = serializers.IntegerField(required=False, allow_null=True)
+    appointment_date = serializers.DateTimeField()
+    status = serializers.ChoiceField(choices=Appointment.STATUS_CHOICES, default='scheduled')
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class AppointmentStatusItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Appointment.STATUS_CHOICES)
@@ -0,0 +1,43 @@
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+from hospital_management import events
+from .models import Appointment
+
+# Bulk writes skip post_save, so appointments.batch announces them instead.
+# appointments_bulk_created: instances=[Appointment, ...]
+# appointments_bulk_updated: instances=[Appointment, ...], previous={pk: old status}
+appointments_bulk_created = Signal()
+appointments_bulk_updated = Signal()
+
+
+# ── Change events (/api/events/) ────────────────────────
+
+def _event_fields(appointment):
+    return {'status': appointment.status, 'appointment_date': appointment.appointment_date.isoformat()}
+
+
+@receiver(post_save, sender=Appointment)
+def publish_appointment_event(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        events.publish('appointment.created', instance, **_event_fields(instance))
+        return
+    previous = getattr(instance, '_saved_status', None)
+    if previous is not None and previous != instance.status:
+        events.publish('appointment.status_changed', instance, previous_status=previous, **_event_fields(instance))
+
+
+@receiver(appointments_bulk_created, sender=Appointment)
+def publish_bulk_created_events(sender, instances, **kwargs):
+    for appointment in instances:
+        events.publish('appointment.created', appointment, **_event_fields(appointment))
+
+
+@receiver(appointments_bulk_updated, sender=Appointment)
+def publish_bulk_status_events(sender, instances, previous, **kwargs):
+    for appointment in instances:
+        if previous.get(appointment.pk) != appointment.status:
+            events.publish('appointment.status_changed', appointment, previous_status=previous.get(appointment.pk),
+                           **_event_fields(appointment))
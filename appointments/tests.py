@@ -1,3 +1,779 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import re
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from billing.models import Invoice
+from hospital_management import conditional, events, exports, idempotency
+from prescriptions.models import Prescription
+from reports.models import DailyAppointments
+from users.models import User, Doctor, Patient
+from users.serializers import ClaimsTokenObtainPairSerializer
+from .models import Appointment
+from .notifications import BaseBackend, MemoryBackend
+from .views import AppointmentListCreateView
+from . import batch, reminders, scheduling
+
+
+def parse_sse(chunk):
+    fields = dict(line.split(': ', 1) for line in chunk.decode().strip().splitlines())
+    if 'data' in fields:
+        fields['data'] = json.loads(fields['data'])
+    return fields
+
+
+@override_settings(EVENTS_BACKEND='memory')
+class EventStreamTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctors = []
+        for name in ('dr_one', 'dr_two'):
+            user = User.objects.create_user(username=name, password='x', role='doctor')
+            cls.doctors.append(Doctor.objects.create(user=user, specialization='general', consultation_fee=500))
+        patient_user = User.objects.create_user(username='patient_e', password='x', role='patient')
+        cls.patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1))
+        cls.token = str(ClaimsTokenObtainPairSerializer.get_token(cls.doctors[0].user).access_token)
+
+    def setUp(self):
+        events.reset_bus()
+        self.addCleanup(events.reset_bus)
+
+    def backlog(self):
+        return [event for _, event in async_to_sync(events.get_bus().replay)('0')]
+
+    def test_changes_publish_events_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.create(
+                doctor=self.doctors[0], patient=self.patient, appointment_date=timezone.now() + timedelta(days=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.get(pk=appointment.pk)
+            appointment.notes = 'Bring reports'
+            appointment.save()  # no status change, no event
+            appointment.status = 'completed'
+            appointment.save()
+            Prescription.objects.create(appointment=appointment, diagnosis='Flu', medicines='Rest', instructions='')
+            invoice = Invoice.objects.create(appointment=appointment, amount=500)
+            invoice.status = 'paid'
+            invoice.save()
+            invoice.save()  # already paid, no second event
+
+        backlog = self.backlog()
+        self.assertEqual([event['type'] for event in backlog], [
+            'appointment.created', 'appointment.status_changed', 'prescription.added', 'invoice.paid'])
+        self.assertEqual(backlog[1]['previous_status'], 'scheduled')
+        self.assertEqual({event['doctor'] for event in backlog}, {self.doctors[0].pk})
+
+    def test_nothing_is_published_for_a_rolled_back_change(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Appointment.objects.create(doctor=self.doctors[0], patient=self.patient, appointment_date=timezone.now())
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.backlog(), [])
+
+    async def open_stream(self, **headers):
+        response = await self.async_client.get(
+            '/api/events/', headers={'Authorization': f'Bearer {self.token}', **headers})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+        return stream
+
+    def publish(self, doctor, status='scheduled'):
+        return events.get_bus().publish({'type': 'appointment.created', 'doctor': doctor.pk,
+                                         'patient': self.patient.pk, 'status': status})
+
+    async def test_stream_is_scoped_to_the_doctor(self):
+        stream = await self.open_stream()
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.05)  # let the stream subscribe
+        self.publish(self.doctors[1])
+        own = self.publish(self.doctors[0])
+        message = parse_sse(await asyncio.wait_for(pending, 1))
+        self.assertEqual(message['id'], own)
+        self.assertEqual(message['event'], 'appointment.created')
+        self.assertEqual(message['data']['doctor'], self.doctors[0].pk)
+
+    async def test_resume_from_last_event_id(self):
+        first = self.publish(self.doctors[0], status='scheduled')
+        self.publish(self.doctors[0], status='completed')
+        stream = await self.open_stream(**{'Last-Event-ID': first})
+        message = parse_sse(await asyncio.wait_for(anext(stream), 1))
+        self.assertEqual(message['data']['status'], 'completed')
+
+    async def test_resume_outside_the_backlog_resets(self):
+        stream = await self.open_stream(**{'Last-Event-ID': '999'})
+        self.assertEqual(parse_sse(await asyncio.wait_for(anext(stream), 1))['event'], 'reset')
+
+    async def test_slow_consumer_is_dropped(self):
+        bus = events.MemoryEventBus(backlog=100, buffer=2)
+        listener = bus.listen(heartbeat=1)
+        pending = asyncio.ensure_future(anext(listener))
+        await asyncio.sleep(0)
+        for i in range(5):  # the listener doesn't get to run in between
+            bus.publish({'n': i})
+        with self.assertRaises(events.EventsLost):
+            await pending
+
+    async def test_redis_listener_misses_nothing_published_while_it_subscribes(self):
+        stream, STREAM_KEY = [], events.STREAM_KEY
+
+        class FakeRedis:
+            async def xrevrange(self, key, count):
+                return stream[-count:][::-1]
+
+            async def xrange(self, key, min='-', count=None):
+                after = bus.sort_key(min.lstrip('(')) if min != '-' else (-1, 0)
+                return [entry for entry in stream if bus.sort_key(entry[0].decode()) > after][:count]
+
+            async def xread(self, streams, block, count):
+                entries = await self.xrange(STREAM_KEY, min=f'({streams[STREAM_KEY]}', count=count)
+                if not entries:
+                    await asyncio.sleep(0.01)
+                return [(STREAM_KEY, entries)] if entries else []
+
+            async def aclose(self):
+                pass
+
+        def publish(n):
+            stream.append((f'{n}-0'.encode(), {b'data': json.dumps({'n': n}).encode()}))
+
+        bus = events.RedisEventBus(backlog=100, buffer=10, url='redis://unused')
+        subscribed = bus._subscribed
+
+        def subscribed_late(subscription, start):
+            publish(2)  # lands after the listener looked up where to start
+            subscribed(subscription, start)
+
+        publish(1)
+        with mock.patch.object(bus, '_client', FakeRedis), \
+                mock.patch.object(bus, '_subscribed', subscribed_late):
+            listener = bus.listen(heartbeat=1)
+            self.assertEqual(await asyncio.wait_for(anext(listener), 1), ('2-0', {'n': 2}))
+            publish(3)
+            self.assertEqual(await asyncio.wait_for(anext(listener), 1), ('3-0', {'n': 3}))
+            await listener.aclose()
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get('/api/events/')
+        self.assertEqual(response.status_code, 401)
+
+
+class ConditionalRequestTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        doctor_user = User.objects.create_user(username='dr_c', password='x', role='doctor')
+        cls.doctor = Doctor.objects.create(user=doctor_user, specialization='general', consultation_fee=500)
+        patient_user = User.objects.create_user(username='patient_c', password='x', role='patient')
+        cls.patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1))
+        cls.appointment = Appointment.objects.create(
+            doctor=cls.doctor, patient=cls.patient, appointment_date=timezone.now() + timedelta(days=1))
+
+    def setUp(self):
+        self.client.force_authenticate(self.doctor.user)
+
+    def test_unchanged_list_is_not_modified(self):
+        response = self.client.get('/api/appointments/')
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/appointments/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        Appointment.objects.create(doctor=self.doctor, patient=self.patient, appointment_date=timezone.now())
+        response = self.client.get('/api/appointments/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_etag_differs_per_user(self):
+        etag = self.client.get('/api/appointments/')['ETag']
+        self.client.force_authenticate(self.patient.user)
+        response = self.client.get('/api/appointments/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_stale_write_is_rejected(self):
+        url = f'/api/appointments/{self.appointment.pk}/'
+        etag = self.client.get(url)['ETag']
+        response = self.client.patch(url, {'notes': 'first'}, headers={'If-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        response = self.client.patch(url, {'notes': 'second'}, headers={'If-Match': etag})
+        self.assertEqual(response.status_code, 412)
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.notes, 'first')
+
+    def test_write_that_lands_before_the_lock_is_rejected(self):
+        url = f'/api/appointments/{self.appointment.pk}/'
+        etag = self.client.get(url)['ETag']
+        lock_row = conditional.lock_row
+
+        def concurrent_write_first(instance):
+            # another request with the same ETag saved while this one was being checked
+            Appointment.objects.get(pk=instance.pk).save()
+            lock_row(instance)
+
+        with mock.patch.object(conditional, 'lock_row', concurrent_write_first):
+            response = self.client.patch(url, {'notes': 'second'}, headers={'If-Match': etag})
+        self.assertEqual(response.status_code, 412)
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.notes, '')
+
+
+class SparseFieldsTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        doctor_user = User.objects.create_user(username='dr_f', password='x', role='doctor')
+        cls.doctor = Doctor.objects.create(user=doctor_user, specialization='general', consultation_fee=500)
+        patient_user = User.objects.create_user(username='patient_f', password='x', role='patient')
+        cls.patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1))
+        cls.appointment = Appointment.objects.create(
+            doctor=cls.doctor, patient=cls.patient, appointment_date=timezone.now() + timedelta(days=1),
+            notes='x' * 2000)
+
+    def setUp(self):
+        self.client.force_authenticate(self.doctor.user)
+
+    def columns(self, url):
+        """The response to ``url``, and the appointment columns its one query selected."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(len(queries), 1)
+        select = queries[0]['sql'].split(' FROM ', 1)[0]
+        return response, set(re.findall(r'"appointments_appointment"\."(\w+)"', select))
+
+    def test_only_the_selected_columns_are_read(self):
+        response, columns = self.columns('/api/appointments/?fields=id,doctor,appointment_date')
+        self.assertEqual(response.json(), [{'id': self.appointment.pk, 'doctor': self.doctor.pk,
+                                            'appointment_date': response.json()[0]['appointment_date']}])
+        # plus the validator column for the ETag
+        self.assertEqual(columns, {'id', 'doctor_id', 'appointment_date', 'updated_at'})
+
+        response, columns = self.columns('/api/appointments/?exclude=notes')
+        self.assertNotIn('notes', response.json()[0])
+        self.assertNotIn('notes', columns)
+        self.assertIn('patient_name', response.json()[0])
+
+        _, columns = self.columns('/api/appointments/')
+        self.assertIn('notes', columns)
+
+    def test_each_selection_has_its_own_etag(self):
+        etags = {self.client.get(url)['ETag'] for url in (
+            '/api/appointments/', '/api/appointments/?fields=id', '/api/appointments/?exclude=notes')}
+        self.assertEqual(len(etags), 3)
+
+    def test_unknown_fields_are_rejected(self):
+        for query in ('fields=id,bogus', 'exclude=bogus'):
+            response = self.client.get(f'/api/appointments/?{query}')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('bogus', str(response.data))
+
+
+class SchedulingTests(APITestCase):
+    day = datetime(2030, 1, 7, tzinfo=dt_timezone.utc)  # working hours 09:00-17:00, 30-minute slots
+
+    @classmethod
+    def setUpTestData(cls):
+        doctor_user = User.objects.create_user(username='dr_s', password='x', role='doctor')
+        cls.doctor = Doctor.objects.create(user=doctor_user, specialization='general', consultation_fee=500)
+        patient_user = User.objects.create_user(username='patient_s', password='x', role='patient')
+        cls.patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1))
+
+    def setUp(self):
+        self.client.force_authenticate(self.patient.user)
+
+    def at(self, hour, minute=0):
+        return self.day.replace(hour=hour, minute=minute)
+
+    def book(self, start):
+        return self.client.post('/api/appointments/', {'doctor': self.doctor.pk, 'appointment_date': start.isoformat()})
+
+    def free_starts(self):
+        return [start.strftime('%H:%M') for start, _ in
+                scheduling.free_slots(self.doctor, self.day, self.day + timedelta(days=1))]
+
+    def test_overlapping_bookings_are_rejected(self):
+        self.assertEqual(self.book(self.at(10)).status_code, 201)
+        for start in (self.at(10), self.at(10, 15), self.at(9, 45)):
+            response = self.book(start)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('appointment_date', response.json())
+        self.assertEqual(self.book(self.at(10, 30)).status_code, 201)  # back to back is fine
+        self.assertEqual(self.book(self.at(9, 30)).status_code, 201)
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor).count(), 3)
+
+    def test_reserve_checks_under_the_lock(self):
+        with transaction.atomic():
+            end = scheduling.reserve(self.doctor, self.at(11))
+            Appointment.objects.create(doctor=self.doctor, patient=self.patient,
+                                       appointment_date=self.at(11), end_at=end)
+        with self.assertRaises(scheduling.SlotUnavailable), transaction.atomic():
+            scheduling.reserve(self.doctor, self.at(11, 10))
+        appointment = Appointment.objects.get(doctor=self.doctor)
+        with transaction.atomic():  # rescheduling onto an overlapping slot of its own is fine
+            self.assertEqual(scheduling.reserve(self.doctor, self.at(11, 10), exclude_pk=appointment.pk),
+                             self.at(11, 40))
+
+    def test_bookings_must_fall_inside_working_hours(self):
+        for start in (self.at(8, 30), self.at(16, 45), self.at(17)):
+            response = self.book(start)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('outside those hours', response.json()['appointment_date'][0])
+        self.assertEqual(self.book(self.at(16, 30)).status_code, 201)
+        response = self.client.post('/api/appointments/batch/', [
+            {'doctor': self.doctor.pk, 'appointment_date': start.isoformat()} for start in (self.at(7), self.at(9))
+        ], format='json')
+        results = response.json()['results']
+        self.assertEqual([sorted(result) for result in results], [['errors', 'index'], ['id', 'index']])
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor).count(), 2)
+
+    def test_moving_an_appointment_moves_its_end(self):
+        appointment = Appointment.objects.get(pk=self.book(self.at(10)).json()['id'])
+        response = self.client.patch(f'/api/appointments/{appointment.pk}/',
+                                     {'appointment_date': self.at(14).isoformat(), 'status': 'cancelled'})
+        self.assertEqual(response.status_code, 200)
+        appointment.refresh_from_db()
+        self.assertEqual((appointment.appointment_date, appointment.end_at), (self.at(14), self.at(14, 30)))
+
+    def test_free_slots_skip_booked_and_misaligned_intervals(self):
+        self.assertEqual(len(self.free_starts()), 16)
+        Appointment.objects.create(doctor=self.doctor, patient=self.patient,
+                                   appointment_date=self.at(9, 15), end_at=self.at(9, 45))
+        Appointment.objects.create(doctor=self.doctor, patient=self.patient,
+                                   appointment_date=self.at(12), end_at=self.at(12, 30))
+        Appointment.objects.create(doctor=self.doctor, patient=self.patient, status='cancelled',
+                                   appointment_date=self.at(14), end_at=self.at(14, 30))
+        free = self.free_starts()
+        self.assertEqual(free[:3], ['10:00', '10:30', '11:00'])
+        self.assertNotIn('12:00', free)
+        self.assertIn('14:00', free)
+        self.assertEqual(len(free), 13)
+
+    def test_slots_endpoint(self):
+        self.book(self.at(16))
+        response = self.client.get(f'/api/users/doctors/{self.doctor.pk}/slots/',
+                                   {'from': self.at(15).isoformat(), 'to': self.at(17).isoformat()})
+        self.assertEqual([slot['start'][11:16] for slot in response.json()['slots']], ['15:00', '15:30', '16:30'])
+
+    def test_invalid_date_params_are_rejected(self):
+        for url in (f'/api/users/doctors/{self.doctor.pk}/slots/', '/api/appointments/'):
+            for param in ('from', 'to'):
+                for bad in ('2026-02-30', '2026-02-28T25:00', 'tomorrow'):
+                    response = self.client.get(url, {param: bad})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json(), [f"Invalid date for '{param}': {bad!r}"])
+
+
+class BatchTests(APITestCase):
+    day = datetime(2030, 1, 7, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctors = []
+        for name in ('dr_b1', 'dr_b2'):
+            user = User.objects.create_user(username=name, password='x', role='doctor')
+            cls.doctors.append(Doctor.objects.create(user=user, specialization='general', consultation_fee=500))
+        patient_user = User.objects.create_user(username='patient_b', password='x', role='patient')
+        cls.patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1))
+
+    def at(self, hour, minute=0):
+        return self.day.replace(hour=hour, minute=minute).isoformat()
+
+    def item(self, hour, minute=0, doctor=None, **extra):
+        return {'doctor': (doctor or self.doctors[0]).pk, 'appointment_date': self.at(hour, minute), **extra}
+
+    def errors(self, results):
+        return {result['index']: next(iter(result['errors'])) for result in results if 'errors' in result}
+
+    def test_results_follow_request_order(self):
+        Appointment.objects.create(doctor=self.doctors[0], patient=self.patient,
+                                   appointment_date=self.day.replace(hour=12))
+        results = batch.create_appointments([
+            self.item(10),
+            {'doctor': self.doctors[0].pk},                 # no date
+            self.item(12, 15),                              # overlaps an existing appointment
+            self.item(10, 15),                              # overlaps item 0
+            self.item(9, doctor=Doctor(pk=10 ** 6)),        # unknown doctor
+            self.item(10, status='cancelled'),              # cancelled: takes no slot
+            self.item(10, 15, doctor=self.doctors[1]),      # another doctor's calendar
+            self.item(9, 30),                               # ends as item 0 starts
+        ], patient_id=self.patient.pk)
+
+        self.assertEqual([result['index'] for result in results], list(range(8)))
+        self.assertEqual(self.errors(results), {1: 'appointment_date', 2: 'appointment_date',
+                                                3: 'appointment_date', 4: 'doctor'})
+        created = Appointment.objects.in_bulk([result['id'] for result in results if 'id' in result])
+        self.assertEqual(len(created), 4)
+        self.assertEqual(created[results[0]['id']].end_at, self.day.replace(hour=10, minute=30))
+        self.assertEqual(created[results[5]['id']].status, 'cancelled')
+        self.assertEqual({a.patient_id for a in created.values()}, {self.patient.pk})
+
+    def test_endpoint_pins_patients_to_themselves(self):
+        self.client.force_authenticate(self.patient.user)
+        other = Patient.objects.create(user=User.objects.create_user(username='patient_c2', password='x',
+                                                                     role='patient'), date_of_birth=date(1990, 1, 1))
+        response = self.client.post('/api/appointments/batch/', [self.item(11, patient=other.pk)], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Appointment.objects.get(pk=response.json()['results'][0]['id']).patient, self.patient)
+
+        response = self.client.post('/api/appointments/batch/', [self.item(11)], format='json')
+        self.assertEqual(response.status_code, 400)  # nothing booked
+        self.assertEqual(response.json()['created'], 0)
+
+    def test_update_statuses(self):
+        mine, cancelled, others = (
+            Appointment.objects.create(doctor=doctor, patient=self.patient, appointment_date=self.day.replace(hour=h),
+                                       status=status)
+            for doctor, h, status in ((self.doctors[0], 9, 'scheduled'), (self.doctors[0], 10, 'cancelled'),
+                                      (self.doctors[1], 11, 'scheduled')))
+        results = batch.update_statuses([
+            {'id': mine.pk, 'status': 'completed'},
+            {'id': mine.pk, 'status': 'no_show'},
+            {'id': cancelled.pk, 'status': 'scheduled'},
+            {'id': others.pk, 'status': 'completed'},  # not this doctor's
+            {'id': mine.pk + 1000, 'status': 'bogus'},
+        ], self.doctors[0].user)
+        self.assertEqual(results[0], {'index': 0, 'id': mine.pk, 'status': 'completed'})
+        self.assertEqual(self.errors(results), {1: 'id', 2: 'status', 3: 'id', 4: 'status'})
+        self.assertEqual([a.status for a in Appointment.objects.order_by('appointment_date')],
+                         ['completed', 'cancelled', 'scheduled'])
+
+
+class KeysetPaginationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin_k', password='x', role='admin')
+        cls.patients = []
+        for i in range(3):
+            user = User.objects.create_user(username=f'patient_k{i}', password='x', role='patient')
+            cls.patients.append(Patient.objects.create(user=user, date_of_birth=date(1990, 1, 1)))
+        cls.start = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        cls.doctors = []
+        for i in range(7):  # seven appointments at the same instant, with different doctors
+            user = User.objects.create_user(username=f'dr_k{i}', password='x', role='doctor')
+            doctor = Doctor.objects.create(user=user, specialization='general', consultation_fee=500)
+            cls.doctors.append(doctor)
+            Appointment.objects.create(doctor=doctor, patient=cls.patients[i % 3], appointment_date=cls.start)
+        for i in range(3):
+            Appointment.objects.create(doctor=cls.doctors[0], patient=cls.patients[0],
+                                       appointment_date=cls.start + timedelta(hours=i + 1))
+
+    def setUp(self):
+        self.client.force_authenticate(self.admin)
+
+    def expected_ids(self):
+        return list(Appointment.objects.order_by('appointment_date', 'id').values_list('id', flat=True))
+
+    def walk(self, url, link='next'):
+        ids, pages = [], []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                page = self.client.get(url).json()
+            self.assertNotIn('OFFSET', queries[-1]['sql'])
+            ids += [row['id'] for row in page['results']]
+            pages.append(page)
+            url = page[link]
+        return ids, pages
+
+    def test_ties_page_in_key_order(self):
+        ids, pages = self.walk('/api/appointments/?page_size=3')
+        self.assertEqual(ids, self.expected_ids())
+        self.assertEqual([len(page['results']) for page in pages], [3, 3, 3, 1])
+        self.assertIsNone(pages[0]['previous'])
+
+        back = []
+        url = pages[-1]['previous']
+        while url:
+            page = self.client.get(url).json()
+            back = [row['id'] for row in page['results']] + back
+            url = page['previous']
+        self.assertEqual(back, self.expected_ids()[:-1])
+
+    def test_pages_are_stable_under_inserts_behind_the_cursor(self):
+        first = self.client.get('/api/appointments/?page_size=4').json()
+        Appointment.objects.create(doctor=self.doctors[1], patient=self.patients[1],
+                                   appointment_date=self.start - timedelta(days=1))
+        rest, _ = self.walk(first['next'])
+        self.assertEqual([row['id'] for row in first['results']] + rest, self.expected_ids()[1:])
+
+    def test_invalid_cursor(self):
+        for cursor in ('garbage', 'cD0x', 'cD14JnA9eQ=='):  # not base64; one value; two bad values
+            self.assertEqual(self.client.get(f'/api/appointments/?cursor={cursor}').status_code, 404)
+
+
+@override_settings(NOTIFICATION_BACKEND='appointments.notifications.MemoryBackend', NO_SHOW_GRACE_MINUTES=30)
+class ReminderSchedulerTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        doctor_user = User.objects.create_user(username='dr_r', password='x', role='doctor', first_name='Asha')
+        cls.doctor = Doctor.objects.create(user=doctor_user, specialization='general', consultation_fee=500)
+        patient_user = User.objects.create_user(username='patient_r', password='x', role='patient',
+                                                email='patient_r@example.com')
+        cls.patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1))
+        cls.now = timezone.now()
+
+    def setUp(self):
+        MemoryBackend.outbox = []
+
+    def book(self, offset, status='scheduled'):
+        return Appointment.objects.create(doctor=self.doctor, patient=self.patient, status=status,
+                                          appointment_date=self.now + offset)
+
+    def test_reminders_are_sent_once_per_window(self):
+        tomorrow = self.book(timedelta(hours=20))
+        soon = self.book(timedelta(minutes=40))
+        self.book(timedelta(days=3))
+        self.book(timedelta(hours=5), status='cancelled')
+
+        report = reminders.run_once(now=self.now)
+        self.assertEqual((report['reminder_24h'], report['reminder_1h']), (1, 1))
+        self.assertEqual({(n.kind, n.appointment_id) for n in MemoryBackend.outbox},
+                         {('reminder_24h', tomorrow.pk), ('reminder_1h', soon.pk)})
+        self.assertEqual(MemoryBackend.outbox[0].recipient, 'patient_r@example.com')
+
+        report = reminders.run_once(now=self.now)
+        self.assertEqual((report['reminder_24h'], report['reminder_1h']), (0, 0))
+        report = reminders.run_once(now=self.now + timedelta(hours=19, minutes=30))
+        self.assertEqual((report['reminder_24h'], report['reminder_1h']), (0, 1))
+
+    def test_moving_an_appointment_resets_its_reminders(self):
+        appointment = self.book(timedelta(hours=20))
+        reminders.run_once(now=self.now)
+        appointment.refresh_from_db()
+        self.assertIsNotNone(appointment.reminder_24h_sent_at)
+        appointment.appointment_date += timedelta(hours=1)
+        appointment.save()
+        self.assertIsNone(appointment.reminder_24h_sent_at)
+        self.assertEqual(reminders.run_once(now=self.now)['reminder_24h'], 1)
+
+    def test_failed_dispatch_is_retried(self):
+        self.book(timedelta(hours=20))
+
+        class Down(BaseBackend):
+            def send(self, notifications):
+                raise ConnectionError('smtp down')
+
+        with self.assertRaises(ConnectionError):
+            reminders.run_once(now=self.now, backend=Down())
+        self.assertEqual(reminders.run_once(now=self.now)['reminder_24h'], 1)
+
+    @override_settings(NOTIFICATION_BACKEND='appointments.notifications.EmailBackend')
+    def test_email_backend_delivers(self):
+        self.book(timedelta(hours=20))
+        self.assertEqual(reminders.run_once(now=self.now)['reminder_24h'], 1)
+        self.assertEqual([(message.to, message.subject) for message in mail.outbox],
+                         [(['patient_r@example.com'], 'Appointment reminder')])
+
+    @override_settings(NOTIFICATION_BACKEND='appointments.notifications.EmailBackend')
+    def test_reminders_without_a_recipient_stay_unsent(self):
+        patient = Patient.objects.create(date_of_birth=date(1990, 1, 1), user=User.objects.create_user(
+            username='patient_r2', password='x', role='patient'))
+        unreachable = Appointment.objects.create(doctor=self.doctor, patient=patient,
+                                                 appointment_date=self.now + timedelta(hours=20))
+        self.book(timedelta(hours=21))
+        self.assertEqual(reminders.send_reminders(reminders.REMINDERS[0], now=self.now, batch_size=1), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        unreachable.refresh_from_db()
+        self.assertIsNone(unreachable.reminder_24h_sent_at)
+
+        patient.user.email = 'patient_r2@example.com'
+        patient.user.save()
+        self.assertEqual(reminders.run_once(now=self.now)['reminder_24h'], 1)
+        self.assertEqual(mail.outbox[-1].to, ['patient_r2@example.com'])
+
+    def test_passed_appointments_become_no_shows(self):
+        missed = self.book(-timedelta(hours=2))
+        ongoing = self.book(-timedelta(minutes=40))  # ended 10 minutes ago, within the grace period
+        done = self.book(-timedelta(days=1), status='completed')
+
+        self.assertEqual(reminders.run_once(now=self.now, batch_size=1)['no_show'], 1)
+        statuses = dict(Appointment.objects.values_list('pk', 'status'))
+        self.assertEqual([statuses[a.pk] for a in (missed, ongoing, done)], ['no_show', 'scheduled', 'completed'])
+        self.assertEqual(DailyAppointments.objects.get(
+            day=timezone.localdate(missed.appointment_date), status='no_show').count, 1)
+        self.assertEqual(reminders.run_once(now=self.now)['no_show'], 0)
+
+
+@override_settings(THROTTLE_ENABLED=False, IDEMPOTENCY_WAIT_SECONDS=0)
+class IdempotencyTests(APITestCase):
+    start = datetime(2030, 1, 7, 10, tzinfo=dt_timezone.utc)  # inside working hours
+
+    @classmethod
+    def setUpTestData(cls):
+        doctor_user = User.objects.create_user(username='dr_i', password='x', role='doctor')
+        cls.doctor = Doctor.objects.create(user=doctor_user, specialization='general', consultation_fee=500)
+        patient_user = User.objects.create_user(username='patient_i', password='x', role='patient')
+        cls.patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.patient.user)
+        self.booking = {'doctor': self.doctor.pk, 'appointment_date': self.start.isoformat()}
+
+    def book(self, key, data=None, path='/api/appointments/'):
+        return self.client.post(path, data or self.booking, format='json', headers={'Idempotency-Key': key})
+
+    def test_a_retry_replays_the_first_response(self):
+        first = self.book('k1')
+        self.assertEqual(first.status_code, 201)
+        with self.assertNumQueries(0):
+            retry = self.book('k1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Appointment.objects.filter(patient=self.patient).count(), 1)
+
+        later = {**self.booking, 'appointment_date': (self.start + timedelta(days=1)).isoformat()}
+        self.assertEqual(self.book('k2', later).status_code, 201)  # a new key books again
+        self.client.force_authenticate(User.objects.create_user(username='admin_i', password='x', role='admin'))
+        self.assertNotIn('Idempotent-Replayed', self.book('k1'))  # keys are per user
+
+    def test_key_reused_for_another_request(self):
+        self.book('k1')
+        other = {**self.booking, 'appointment_date': (self.start + timedelta(days=1)).isoformat()}
+        self.assertEqual(self.book('k1', other).status_code, 422)
+        self.assertEqual(self.book('k1', [self.booking], path='/api/appointments/batch/').status_code, 422)
+
+    def test_errors_are_not_stored(self):
+        self.assertEqual(self.book('k1', {'doctor': self.doctor.pk}).status_code, 400)
+        self.assertEqual(self.book('k1', {'doctor': self.doctor.pk}).status_code, 400)
+        self.assertEqual(Appointment.objects.count(), 0)
+
+    def test_duplicate_in_flight_is_a_conflict(self):
+        user = self.patient.user
+        cache.add(idempotency._cache_key(user, 'k1', 'lock'), 'in flight')
+        response = self.book('k1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(Appointment.objects.count(), 0)
+
+    def test_response_stored_while_taking_the_lock_is_replayed(self):
+        first = self.book('k1')
+        result_key, cache_get = idempotency._cache_key(self.patient.user, 'k1', 'response'), cache.get
+        reads = []
+
+        def get(key, *args):
+            if key == result_key:
+                reads.append(key)
+                if len(reads) == 1:
+                    return None  # the first read missed: the other request hadn't stored its response yet
+            return cache_get(key, *args)
+
+        with mock.patch.object(idempotency.cache, 'get', side_effect=get):
+            retry = self.book('k1')
+        self.assertEqual((retry.status_code, retry['Idempotent-Replayed']), (201, 'true'))
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual((len(reads), Appointment.objects.count()), (2, 1))
+        self.assertIsNone(cache.get(idempotency._cache_key(self.patient.user, 'k1', 'lock')))
+
+    def test_only_the_holder_releases_the_lock(self):
+        lock_key = idempotency._cache_key(self.patient.user, 'k1', 'lock')
+        perform_create = AppointmentListCreateView.perform_create
+
+        def outlive_the_lock(view, serializer):
+            cache.set(lock_key, 'a retry')  # ours expired, and a retry took the key over
+            perform_create(view, serializer)
+
+        with mock.patch.object(AppointmentListCreateView, 'perform_create', outlive_the_lock):
+            self.assertEqual(self.book('k1').status_code, 201)
+        self.assertEqual(cache.get(lock_key), 'a retry')
+
+
+class ExportTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin_x', password='x', role='admin')
+        cls.admin_token = str(ClaimsTokenObtainPairSerializer.get_token(cls.admin).access_token)
+        cls.doctors = []
+        for name in ('dr_x1', 'dr_x2'):
+            user = User.objects.create_user(username=name, password='x', role='doctor', last_name=name)
+            cls.doctors.append(Doctor.objects.create(user=user, specialization='general', consultation_fee=400))
+        patient_user = User.objects.create_user(username='patient_x', password='x', role='patient')
+        cls.patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1))
+        day = datetime(2030, 5, 6, 9, tzinfo=dt_timezone.utc)
+        cls.appointments = [
+            Appointment.objects.create(doctor=doctor, patient=cls.patient, status='completed',
+                                       appointment_date=day + timedelta(days=i), notes=f'note, "{i}"')
+            for i, doctor in enumerate([cls.doctors[0], cls.doctors[1], cls.doctors[0]])
+        ]
+        for appointment in cls.appointments[:2]:
+            Prescription.objects.create(appointment=appointment, diagnosis='Flu',
+                                        medicines='Paracetamol 500mg - twice daily', instructions='')
+
+    def export(self, url, user=None):
+        if user is not None:
+            self.client.force_authenticate(user)
+        response = self.client.get(url)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body.decode()
+
+    def test_csv_streams_every_visible_row(self):
+        response, body = self.export('/api/appointments/export/?format=csv', self.admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="appointments.csv"')
+        header, *rows = list(csv.reader(body.splitlines()))
+        self.assertEqual(header, list(Appointment.objects.all().row_fields))
+        self.assertEqual([row[0] for row in rows], [str(appointment.pk) for appointment in self.appointments])
+        self.assertEqual(rows[1][header.index('notes')], 'note, "1"')
+        self.assertEqual(rows[1][header.index('doctor_name')], 'dr_x2')
+
+    def test_ndjson_streams_one_object_per_line(self):
+        response, body = self.export('/api/prescriptions/export/?format=ndjson', self.admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['appointment_id'] for row in rows], [a.pk for a in self.appointments[:2]])
+
+    def test_rows_are_scoped_to_the_caller(self):
+        _, body = self.export('/api/appointments/export/?format=ndjson', self.doctors[0].user)
+        self.assertEqual([json.loads(line)['id'] for line in body.splitlines()],
+                         [self.appointments[0].pk, self.appointments[2].pk])
+        _, body = self.export('/api/prescriptions/export/?format=ndjson', self.doctors[1].user)
+        self.assertEqual([json.loads(line)['appointment_id'] for line in body.splitlines()],
+                         [self.appointments[1].pk])
+        _, body = self.export('/api/appointments/export/?format=ndjson', self.patient.user)
+        self.assertEqual(len(body.splitlines()), 3)
+
+    def test_anonymous_is_refused_in_the_requested_format(self):
+        response, body = self.export('/api/appointments/export/?format=csv')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(list(csv.reader(body.splitlines())),
+                         [['detail'], ['Authentication credentials were not provided.']])
+        response, body = self.export('/api/appointments/export/')
+        self.assertEqual((response.status_code, response['Content-Type']), (401, 'text/csv; charset=utf-8'))
+        response, body = self.export('/api/prescriptions/export/?format=ndjson')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(json.loads(body), {'detail': 'Authentication credentials were not provided.'})
+
+    async def test_streams_through_asgi(self):
+        with mock.patch.object(exports, 'EXPORT_CHUNK_SIZE', 2):
+            response = await self.async_client.get('/api/appointments/export/?format=ndjson',
+                                                   headers={'Authorization': f'Bearer {self.admin_token}'})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)  # a sync iterator would be read into a list before sending
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual([len(chunk.decode().splitlines()) for chunk in chunks], [2, 1])
+        self.assertEqual([json.loads(line)['id'] for chunk in chunks for line in chunk.decode().splitlines()],
+                         [appointment.pk for appointment in self.appointments])
+
+    def test_user_without_a_role_is_forbidden(self):
+        user = User.objects.create_user(username='no_role', password='x')
+        response, body = self.export('/api/billing/export/?format=ndjson', user)
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('permission', json.loads(body)['detail'])
@@ -1,7 +1,12 @@
 from django.urls import path
-from .views import AppointmentListCreateView, AppointmentDetailView
+from hospital_management.exports import ExportView
+from hospital_management.async_views import read_view
+from .views import (AppointmentListCreateView, AppointmentDetailView, AppointmentBatchView,
+                    AsyncAppointmentListView, AsyncAppointmentDetailView)
 
 urlpatterns = [
-    path('', AppointmentListCreateView.as_view()),
-    path('<int:pk>/', AppointmentDetailView.as_view()),
+    path('', read_view(AppointmentListCreateView.as_view(), AsyncAppointmentListView)),
+    path('batch/', AppointmentBatchView.as_view()),
+    path('<int:pk>/', read_view(AppointmentDetailView.as_view(), AsyncAppointmentDetailView)),
+    path('export/', ExportView.as_view(dataset='appointments')),
 ]
\ No newline at end of file
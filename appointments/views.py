@@ -1,53 +1,123 @@
-from rest_framework import generics, permissions
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from .models import Appointment
 from .serializers import AppointmentSerializer
+from . import batch
+from archive.archival import reaches_archive
+from archive.models import AppointmentRecord
+from hospital_management.async_views import AsyncReadView, Validated
+from hospital_management.conditional import (ConditionalDetailMixin, ConditionalListMixin, list_etag, object_etag,
+                                             row_validators)
+from hospital_management.fieldsets import load_only, selected_fields
+from hospital_management.idempotency import IdempotentCreateMixin, idempotent
+from hospital_management.instrumentation import serialized
+from hospital_management.params import date_param
+from users.models import Patient
 from users.permissions import IsAdmin, IsAdminOrDoctor
 from rest_framework.permissions import IsAuthenticated
 
-class AppointmentListCreateView(generics.ListCreateAPIView):
+class AppointmentListCreateView(IdempotentCreateMixin, ConditionalListMixin, generics.ListCreateAPIView):
+    """
+    ``?from=`` / ``?to=`` (ISO date or datetime, ``to`` exclusive) filter by
+    appointment date. Archived appointments are included only when the range
+    starts before the newest of them; the list is then read from the hot +
+    archive view. ``?fields=`` / ``?exclude=`` narrow the columns and joins read
+    (see ``hospital_management.fieldsets``).
+    """
     serializer_class = AppointmentSerializer
     permission_classes = [IsAuthenticated]
+    ordering = ('appointment_date', 'id')
+    throttle_scope = 'booking'
 
     def get_queryset(self):
-        user = self.request.user
-
-        if user.role == 'admin':
-            return Appointment.objects.all().select_related('doctor__user', 'patient__user')
-
-        elif user.role == 'doctor':
-            return Appointment.objects.filter(
-                doctor__user=user
-            ).select_related('doctor__user', 'patient__user')
-
-        elif user.role == 'patient':
-            return Appointment.objects.filter(
-                patient__user=user
-            ).select_related('doctor__user', 'patient__user')
-
-        return Appointment.objects.none()  # fallback — return nothing
+        if self.request.method != 'GET':
+            return Appointment.objects.visible_to(self.request.user)
+        start = date_param(self.request, 'from')
+        end = date_param(self.request, 'to')
+        if start and end and end <= start:
+            raise ValidationError("'to' must be after 'from'.")
+        model = AppointmentRecord if (start or end) and reaches_archive(start) else Appointment
+        queryset = model.objects.visible_to(self.request.user)
+        if start:
+            queryset = queryset.filter(appointment_date__gte=start)
+        if end:
+            queryset = queryset.filter(appointment_date__lt=end)
+        fields = selected_fields(self)
+        if fields is not None:
+            queryset = load_only(queryset, fields, keep=('updated_at', *self.ordering))
+        return queryset
 
     def perform_create(self, serializer):
         user = self.request.user
         if user.role == 'patient':
             # Automatically assign the patient profile of the logged-in user
-            serializer.save(patient=user.patient_profile)
+            patient = Patient.objects.select_related('user').get(user_id=user.id)
+            serializer.save(patient=patient)
         elif user.role == 'admin':
             serializer.save()
         else:
-            from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("Only patients or admins can book appointments.")
 
 
-class AppointmentDetailView(generics.RetrieveUpdateAPIView):
+class AppointmentDetailView(ConditionalDetailMixin, generics.RetrieveUpdateAPIView):
     serializer_class = AppointmentSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        if user.role == 'admin':
-            return Appointment.objects.all()
-        elif user.role == 'doctor':
-            return Appointment.objects.filter(doctor__user=user)
-        elif user.role == 'patient':
-            return Appointment.objects.filter(patient__user=user)
-        return Appointment.objects.none()
\ No newline at end of file
+        return Appointment.objects.visible_to(self.request.user)
+
+
+
+class AsyncAppointmentListView(AsyncReadView):
+    async def get(self, request, user):
+        appointments = [a async for a in Appointment.objects.visible_to(user).aiterator()]
+        last_modified, count = row_validators(appointments)
+        return Validated(serialized(AppointmentSerializer(appointments, many=True)),
+                         list_etag(request, user, self.renderer.format, last_modified, count), last_modified)
+
+
+class AsyncAppointmentDetailView(AsyncReadView):
+    async def get(self, request, user, pk):
+        appointment = await Appointment.objects.visible_to(user).aget(pk=pk)
+        return Validated(serialized(AppointmentSerializer(appointment)),
+                         object_etag(appointment, self.renderer.format), appointment.updated_at)
+
+
+class AppointmentBatchView(APIView):
+    """
+    POST a list of appointments to book them, PATCH a list of ``{id, status}``
+    to change statuses. Both return one result per item, in request order.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'booking'
+
+    @idempotent
+    def post(self, request):
+        items = self._items(request)
+        user = request.user
+        if user.role == 'patient':
+            patient_id = getattr(user, 'patient_id', None) or Patient.objects.values_list(
+                'pk', flat=True).get(user_id=user.id)
+        elif user.role == 'admin':
+            patient_id = None
+        else:
+            raise PermissionDenied("Only patients or admins can book appointments.")
+        results = batch.create_appointments(items, patient_id=patient_id)
+        created = sum('id' in result for result in results)
+        return Response({'created': created, 'results': results},
+                        status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+    def patch(self, request):
+        results = batch.update_statuses(self._items(request), request.user)
+        return Response({'updated': sum('id' in result for result in results), 'results': results})
+
+    @staticmethod
+    def _items(request):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError("Expected a list of items.")
+        if len(items) > batch.MAX_BATCH_SIZE:
+            raise ValidationError(f"At most {batch.MAX_BATCH_SIZE} items per batch.")
+        return items
@@ -0,0 +1,22 @@
+from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate, pre_migrate
+
+
+def drop_record_views(using, **kwargs):
+    from .storage import drop_views
+    drop_views(connections[using])
+
+
+def create_record_views(using, **kwargs):
+    from .storage import create_views
+    create_views(connections[using])
+
+
+class ArchiveConfig(AppConfig):
+    name = 'archive'
+
+    def ready(self):
+        # the union views would block migrations that rebuild or retype the tables they read
+        pre_migrate.connect(drop_record_views, sender=self)
+        post_migrate.connect(create_record_views, sender=self)
@@ -0,0 +1,160 @@
+"""
+Moving closed appointments out of the hot tables.
+
+An appointment is archived once it's older than ``ARCHIVE_AFTER_DAYS`` and
+closed: completed, cancelled or a no-show, with no invoice still pending.
+Its prescription and invoice move with it. Each batch runs in one
+transaction:
+
+1. claim the oldest due appointments (``SKIP LOCKED``, so edits and other
+   runs aren't blocked),
+2. create the monthly partitions they need (Postgres),
+3. copy the rows into the archive tables,
+4. delete them from the hot tables.
+
+A batch either moves completely or not at all, so an interrupted run just
+continues with the next due rows when started again.
+
+The deletes are raw, so no ``post_delete`` fires. The report tables keep
+counting archived rows, because ``reports.summary`` reads the hot + archive
+views. ``appointments_archived`` is sent instead, for the caches that only
+cover hot rows.
+
+Reads only reach archived rows through ``AppointmentRecord`` /
+``InvoiceRecord``. ``reaches_archive`` tells whether a date range needs them.
+Only the appointment list (with ``?from=`` / ``?to=``) and the reports read
+them. Appointment details, patient timelines, the invoice and prescription
+lists and the exports cover hot rows only, so an archived appointment is a
+404 there and is missing from their output.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from appointments.models import Appointment
+from billing.models import Invoice
+from hospital_management.replicas import primary
+from prescriptions.models import Prescription, PrescriptionItem
+from .models import ArchivedAppointment, ArchivedInvoice, ArchivedPrescription
+from .signals import appointments_archived
+from .storage import ensure_partitions
+
+DEFAULT_BATCH_SIZE = 500
+CLOSED_STATUSES = ('completed', 'cancelled', 'no_show')
+NEWEST_KEY = 'archive:newest'
+
+
+def archive_horizon(now=None):
+    return (now or timezone.now()) - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+
+
+def archivable(before):
+    """Closed appointments dated before ``before``, oldest first."""
+    return Appointment.objects.filter(
+        status__in=CLOSED_STATUSES, appointment_date__lt=before,
+    ).exclude(invoice__status='pending').order_by('appointment_date', 'id')
+
+
+def archive_batch(before, batch_size=DEFAULT_BATCH_SIZE):
+    """Move up to ``batch_size`` archivable appointments; returns how many moved."""
+    now = timezone.now()
+    with transaction.atomic():
+        appointments = list(archivable(before).claim(batch_size))
+        if not appointments:
+            return 0
+        ids = [appointment.pk for appointment in appointments]
+        dates = {appointment.pk: appointment.appointment_date for appointment in appointments}
+        prescriptions = list(Prescription.objects.filter(appointment_id__in=ids).select_for_update())
+        invoices = list(Invoice.objects.filter(appointment_id__in=ids).select_for_update())
+        by_id = {appointment.pk: appointment for appointment in appointments}
+
+        ensure_partitions(connection, dates.values())
+        ArchivedAppointment.objects.bulk_create([
+            ArchivedAppointment(
+                id=a.pk, doctor_id=a.doctor_id, patient_id=a.patient_id, appointment_date=a.appointment_date,
+                end_at=a.end_at, status=a.status, notes=a.notes, created_at=a.created_at,
+                updated_at=a.updated_at, archived_at=now,
+            ) for a in appointments
+        ])
+        ArchivedPrescription.objects.bulk_create([
+            ArchivedPrescription(
+                id=p.pk, appointment_id=p.appointment_id, appointment_date=dates[p.appointment_id],
+                diagnosis=p.diagnosis, medicines=p.medicines, instructions=p.instructions,
+                created_at=p.created_at, updated_at=p.updated_at,
+            ) for p in prescriptions
+        ])
+        ArchivedInvoice.objects.bulk_create([
+            ArchivedInvoice(
+                id=i.pk, appointment_id=i.appointment_id, appointment_date=dates[i.appointment_id],
+                doctor_id=by_id[i.appointment_id].doctor_id, patient_id=by_id[i.appointment_id].patient_id,
+                amount=i.amount, status=i.status, issued_at=i.issued_at, paid_at=i.paid_at,
+                updated_at=i.updated_at,
+            ) for i in invoices
+        ])
+
+        # children first; raw deletes skip the collector and its post_delete signals (see above)
+        items = PrescriptionItem.objects.filter(prescription_id__in=[p.pk for p in prescriptions])
+        items._raw_delete(connection.alias)
+        Prescription.objects.filter(appointment_id__in=ids)._raw_delete(connection.alias)
+        Invoice.objects.filter(appointment_id__in=ids)._raw_delete(connection.alias)
+        Appointment.objects.filter(pk__in=ids)._raw_delete(connection.alias)
+
+        appointments_archived.send(sender=Appointment, instances=appointments)
+        newest = max(dates.values())
+        transaction.on_commit(lambda: _advance_newest(newest))
+    return len(appointments)
+
+
+def archive(before=None, batch_size=DEFAULT_BATCH_SIZE, max_batches=None, progress=None):
+    """
+    Archive everything due before ``before`` (default: the horizon), a batch at a time.
+
+    Stops after ``max_batches`` batches if given; the next run carries on.
+    ``progress(report)`` is called after each batch. Returns the final report:
+    ``{'archived': n, 'batches': b, 'seconds': s, 'per_second': r}``.
+    """
+    before = before or archive_horizon()
+    started = time.monotonic()
+    report = {'archived': 0, 'batches': 0, 'seconds': 0.0, 'per_second': 0.0}
+    while max_batches is None or report['batches'] < max_batches:
+        moved = archive_batch(before, batch_size=batch_size)
+        if not moved:
+            break
+        report['archived'] += moved
+        report['batches'] += 1
+        report['seconds'] = round(time.monotonic() - started, 3)
+        report['per_second'] = round(report['archived'] / report['seconds'], 1) if report['seconds'] else 0.0
+        if progress is not None:
+            progress(report)
+        if moved < batch_size:
+            break
+    return report
+
+
+# ── Read path ───────────────────────────────────────────
+
+def newest_archived():
+    """The latest ``appointment_date`` in the archive, or None when it's empty."""
+    newest = cache.get(NEWEST_KEY)
+    if newest is None:
+        with primary():
+            newest = ArchivedAppointment.objects.aggregate(newest=Max('appointment_date'))['newest'] or ''
+        cache.set(NEWEST_KEY, newest, None)
+    return newest or None
+
+
+def _advance_newest(moment):
+    current = newest_archived()
+    if current is None or moment > current:
+        cache.set(NEWEST_KEY, moment, None)
+
+
+def reaches_archive(start):
+    """Whether rows dated from ``start`` on (None: unbounded) may include archived ones."""
+    newest = newest_archived()
+    return newest is not None and (start is None or start <= newest)
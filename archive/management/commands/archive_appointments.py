@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from archive.archival import DEFAULT_BATCH_SIZE, archivable, archive, archive_horizon
+
+
+class Command(BaseCommand):
+    help = ('Move closed appointments older than ARCHIVE_AFTER_DAYS, with their prescriptions and invoices, '
+            'into the archive tables (batched; safe to interrupt and re-run)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, help='Override ARCHIVE_AFTER_DAYS for this run')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches; the next run continues')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be archived')
+
+    def handle(self, *args, **options):
+        if options['older_than_days'] is not None:
+            before = timezone.now() - timedelta(days=options['older_than_days'])
+        else:
+            before = archive_horizon()
+        if options['dry_run']:
+            self.stdout.write(f"{archivable(before).count()} appointments dated before {before:%Y-%m-%d} "
+                              f"would be archived")
+            return
+
+        def progress(report):
+            self.stdout.write(f"  {report['archived']} appointments, {report['per_second']}/s")
+
+        report = archive(before, batch_size=options['batch_size'], max_batches=options['max_batches'],
+                         progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {report['archived']} appointments archived in {report['batches']} batches "
+            f"({report['seconds']}s, {report['per_second']}/s)"))
@@ -0,0 +1,118 @@
+# Generated by Django 6.0.2 on 2026-10-18 03:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from archive import storage
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('users', '0004_profile_updated_at'),
+        ('appointments', '0005_appointment_reminders'),
+        ('billing', '0003_invoice_updated_at'),
+        ('prescriptions', '0005_prescription_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('appointment_date', models.DateTimeField()),
+                ('end_at', models.DateTimeField()),
+                ('status', models.CharField(max_length=20)),
+                ('notes', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived', models.BooleanField()),
+            ],
+            options={
+                'db_table': 'archive_appointment_record',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='InvoiceRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('appointment_id', models.BigIntegerField()),
+                ('appointment_date', models.DateTimeField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(max_length=20)),
+                ('issued_at', models.DateTimeField()),
+                ('paid_at', models.DateTimeField(null=True)),
+                ('updated_at', models.DateTimeField()),
+                ('archived', models.BooleanField()),
+            ],
+            options={
+                'db_table': 'archive_invoice_record',
+                'managed': False,
+            },
+        ),
+        # partitioned on Postgres, so the tables are created by archive.storage rather than from the state
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.CreateModel(
+                name='ArchivedPrescription',
+                fields=[
+                    ('pk', models.CompositePrimaryKey('id', 'appointment_date', blank=True, editable=False, primary_key=True, serialize=False)),
+                    ('id', models.BigIntegerField()),
+                    ('appointment_id', models.BigIntegerField()),
+                    ('appointment_date', models.DateTimeField()),
+                    ('diagnosis', models.TextField()),
+                    ('medicines', models.TextField()),
+                    ('instructions', models.TextField()),
+                    ('created_at', models.DateTimeField()),
+                    ('updated_at', models.DateTimeField()),
+                ],
+                options={
+                    'db_table': 'archive_prescription',
+                    'indexes': [models.Index(fields=['appointment_id'], name='arch_rx_appointment_idx')],
+                },
+            ),
+            migrations.CreateModel(
+                name='ArchivedAppointment',
+                fields=[
+                    ('pk', models.CompositePrimaryKey('id', 'appointment_date', blank=True, editable=False, primary_key=True, serialize=False)),
+                    ('id', models.BigIntegerField()),
+                    ('appointment_date', models.DateTimeField()),
+                    ('end_at', models.DateTimeField()),
+                    ('status', models.CharField(max_length=20)),
+                    ('notes', models.TextField(blank=True)),
+                    ('created_at', models.DateTimeField()),
+                    ('updated_at', models.DateTimeField()),
+                    ('archived_at', models.DateTimeField()),
+                    ('doctor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.doctor')),
+                    ('patient', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.patient')),
+                ],
+                options={
+                    'db_table': 'archive_appointment',
+                    'indexes': [models.Index(fields=['appointment_date', 'id'], name='arch_appt_date_id_idx'), models.Index(fields=['doctor', 'appointment_date', 'id'], name='arch_appt_doctor_date_idx'), models.Index(fields=['patient', 'appointment_date', 'id'], name='arch_appt_patient_date_idx')],
+                },
+            ),
+            migrations.CreateModel(
+                name='ArchivedInvoice',
+                fields=[
+                    ('pk', models.CompositePrimaryKey('id', 'appointment_date', blank=True, editable=False, primary_key=True, serialize=False)),
+                    ('id', models.BigIntegerField()),
+                    ('appointment_id', models.BigIntegerField()),
+                    ('appointment_date', models.DateTimeField()),
+                    ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                    ('status', models.CharField(max_length=20)),
+                    ('issued_at', models.DateTimeField()),
+                    ('paid_at', models.DateTimeField(blank=True, null=True)),
+                    ('updated_at', models.DateTimeField()),
+                    ('doctor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.doctor')),
+                    ('patient', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.patient')),
+                ],
+                options={
+                    'db_table': 'archive_invoice',
+                    'indexes': [models.Index(fields=['appointment_id'], name='arch_invoice_appointment_idx'), models.Index(fields=['doctor', 'issued_at'], name='arch_invoice_doctor_issued_idx')],
+                },
+            ),
+        ]),
+        migrations.RunPython(storage.create_tables, storage.drop_tables),
+    ]
@@ -0,0 +1,122 @@
+from django.db import models
+
+from appointments.models import AppointmentQuerySet
+from users.models import Doctor, Patient
+
+
+# ── Archive tables ──────────────────────────────────────
+# Written only by archive.archival. On Postgres each is range-partitioned by
+# month of appointment_date (see archive.storage), which is why the partition
+# key is part of every primary key. Ids are those of the original rows.
+
+class ArchivedAppointment(models.Model):
+    pk = models.CompositePrimaryKey('id', 'appointment_date')
+    id = models.BigIntegerField()
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='+', db_index=False)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='+', db_index=False)
+    appointment_date = models.DateTimeField()
+    end_at = models.DateTimeField()
+    status = models.CharField(max_length=20)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'archive_appointment'
+        indexes = [
+            # the same keyset shapes as the hot table, per role scope
+            models.Index(fields=['appointment_date', 'id'], name='arch_appt_date_id_idx'),
+            models.Index(fields=['doctor', 'appointment_date', 'id'], name='arch_appt_doctor_date_idx'),
+            models.Index(fields=['patient', 'appointment_date', 'id'], name='arch_appt_patient_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived appointment #{self.id} on {self.appointment_date}"
+
+
+class ArchivedPrescription(models.Model):
+    pk = models.CompositePrimaryKey('id', 'appointment_date')
+    id = models.BigIntegerField()
+    appointment_id = models.BigIntegerField()
+    appointment_date = models.DateTimeField()  # the appointment's, copied as the partition key
+    diagnosis = models.TextField()
+    medicines = models.TextField()
+    instructions = models.TextField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'archive_prescription'
+        indexes = [models.Index(fields=['appointment_id'], name='arch_rx_appointment_idx')]
+
+    def __str__(self):
+        return f"Archived prescription #{self.id}"
+
+
+class ArchivedInvoice(models.Model):
+    pk = models.CompositePrimaryKey('id', 'appointment_date')
+    id = models.BigIntegerField()
+    appointment_id = models.BigIntegerField()
+    appointment_date = models.DateTimeField()  # the appointment's, copied as the partition key
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='+', db_index=False)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='+', db_index=False)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20)
+    issued_at = models.DateTimeField()
+    paid_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'archive_invoice'
+        indexes = [
+            models.Index(fields=['appointment_id'], name='arch_invoice_appointment_idx'),
+            # report buckets are recomputed per (issue day, doctor)
+            models.Index(fields=['doctor', 'issued_at'], name='arch_invoice_doctor_issued_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived invoice #{self.id} - {self.status}"
+
+
+# ── Hot + archive views ─────────────────────────────────
+# Read-only UNION ALL views over the live and the archive table
+# (archive.storage.VIEWS), for reads that may reach past the archive horizon.
+
+class AppointmentRecord(models.Model):
+    """An appointment, live or archived. Shaped like ``Appointment`` so its serializers and querysets apply."""
+    id = models.BigIntegerField(primary_key=True)
+    doctor = models.ForeignKey(Doctor, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False)
+    patient = models.ForeignKey(Patient, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False)
+    appointment_date = models.DateTimeField()
+    end_at = models.DateTimeField()
+    status = models.CharField(max_length=20)
+    notes = models.TextField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived = models.BooleanField()
+
+    objects = AppointmentQuerySet.as_manager()
+
+    class Meta:
+        managed = False
+        db_table = 'archive_appointment_record'
+
+
+class InvoiceRecord(models.Model):
+    """An invoice, live or archived, with its appointment's doctor, patient and date."""
+    id = models.BigIntegerField(primary_key=True)
+    appointment_id = models.BigIntegerField()
+    doctor = models.ForeignKey(Doctor, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False)
+    patient = models.ForeignKey(Patient, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False)
+    appointment_date = models.DateTimeField()
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20)
+    issued_at = models.DateTimeField()
+    paid_at = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField()
+    archived = models.BooleanField()
+
+    class Meta:
+        managed = False
+        db_table = 'archive_invoice_record'
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# archive.archival moves rows with raw deletes, which send no post_delete.
+# appointments_archived: instances=[Appointment, ...] (as they were before the move)
+appointments_archived = Signal()
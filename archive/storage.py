@@ -0,0 +1,108 @@
+"""
+DDL for the archive tables and the hot + archive views.
+
+The archive tables are created by migration ``0001_initial``:
+
+- Postgres: declaratively range-partitioned by ``appointment_date``, one
+  partition per calendar month (UTC). ``ensure_partitions`` creates the
+  partitions a batch needs before it's inserted. Old months can later be
+  detached or dropped as a unit, and a date filter only scans the months it
+  covers.
+- Anything else: plain tables with the same columns and indexes.
+
+``VIEWS`` are ``UNION ALL`` views of the live and the archive table, read
+through ``AppointmentRecord`` and ``InvoiceRecord``. A view pins the columns
+of the tables it reads, and SQLite can't rebuild a table a view refers to.
+So ``archive.apps`` drops the views before every ``migrate`` and creates them
+again afterwards.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+
+ARCHIVE_TABLES = ('archive_appointment', 'archive_prescription', 'archive_invoice')
+PARTITION_KEY = 'appointment_date'
+
+VIEWS = {
+    'archive_appointment_record': """
+        SELECT id, doctor_id, patient_id, appointment_date, end_at, status, notes, created_at, updated_at,
+               FALSE AS archived
+        FROM appointments_appointment
+        UNION ALL
+        SELECT id, doctor_id, patient_id, appointment_date, end_at, status, notes, created_at, updated_at, TRUE
+        FROM archive_appointment
+    """,
+    'archive_invoice_record': """
+        SELECT i.id, i.appointment_id, a.doctor_id, a.patient_id, a.appointment_date, i.amount, i.status,
+               i.issued_at, i.paid_at, i.updated_at, FALSE AS archived
+        FROM billing_invoice i JOIN appointments_appointment a ON a.id = i.appointment_id
+        UNION ALL
+        SELECT id, appointment_id, doctor_id, patient_id, appointment_date, amount, status,
+               issued_at, paid_at, updated_at, TRUE
+        FROM archive_invoice
+    """,
+}
+
+_partitions = set()  # (database alias, table, month) known to exist, i.e. created in a committed transaction
+
+
+def create_tables(apps, schema_editor):
+    for model_name in ('ArchivedAppointment', 'ArchivedPrescription', 'ArchivedInvoice'):
+        model = apps.get_model('archive', model_name)
+        if schema_editor.connection.vendor != 'postgresql':
+            schema_editor.create_model(model)
+            continue
+        sql, params = schema_editor.table_sql(model)
+        schema_editor.execute(f'{sql} PARTITION BY RANGE ("{PARTITION_KEY}")', params or None)
+        for index in model._meta.indexes:
+            schema_editor.add_index(model, index)  # cascades to every partition
+
+
+def drop_tables(apps, schema_editor):
+    for table in ARCHIVE_TABLES:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}' + (
+            ' CASCADE' if schema_editor.connection.vendor == 'postgresql' else ''))
+
+
+def month_of(moment):
+    moment = moment.astimezone(dt_timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _next_month(month):
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def ensure_partitions(connection, moments):
+    """Create the monthly partitions that rows dated ``moments`` go to (Postgres only)."""
+    if connection.vendor != 'postgresql':
+        return
+    months = {month_of(moment) for moment in moments}
+    created = set()
+    with connection.cursor() as cursor:
+        for month in sorted(months):
+            for table in ARCHIVE_TABLES:
+                if (connection.alias, table, month) in _partitions:
+                    continue
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table}_y{month:%Y}m{month:%m} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')")
+                created.add((connection.alias, table, month))
+    # DDL is transactional on Postgres: a rolled-back batch takes its partitions with it
+    transaction.on_commit(lambda: _partitions.update(created), using=connection.alias)
+
+
+def drop_views(connection):
+    with connection.cursor() as cursor:
+        for name in VIEWS:
+            cursor.execute(f'DROP VIEW IF EXISTS {name}')
+
+
+def create_views(connection):
+    """(Re)create the views, once the tables they read exist."""
+    if not set(ARCHIVE_TABLES) <= set(connection.introspection.table_names()):
+        return
+    drop_views(connection)
+    with connection.cursor() as cursor:
+        for name, sql in VIEWS.items():
+            cursor.execute(f'CREATE VIEW {name} AS {sql}')
@@ -0,0 +1,129 @@
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from appointments.models import Appointment
+from billing.models import Invoice
+from prescriptions.models import Prescription, PrescriptionItem
+from reports.models import DailyAppointments, DailyRevenue
+from reports.summary import diff
+from users.models import User, Doctor, Patient
+from .archival import NEWEST_KEY, archive
+from . import storage
+from .models import ArchivedAppointment, ArchivedInvoice, ArchivedPrescription
+
+
+class RecordingPostgres:
+    """Stands in for a Postgres connection: records the DDL sent through it."""
+    vendor = 'postgresql'
+    alias = 'default'  # transaction.on_commit follows the test database's transactions
+
+    def __init__(self):
+        self.statements = []
+
+    @contextmanager
+    def cursor(self):
+        yield self
+
+    def execute(self, sql):
+        self.statements.append(sql)
+
+
+@override_settings(ARCHIVE_AFTER_DAYS=365)
+class ArchivalTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='x', role='admin')
+        doctor_user = User.objects.create_user(username='dr_old', password='x', role='doctor')
+        cls.doctor = Doctor.objects.create(user=doctor_user, specialization='general', consultation_fee=500)
+        patient_user = User.objects.create_user(username='patient_old', password='x', role='patient')
+        cls.patient = Patient.objects.create(user=patient_user, date_of_birth=date(1970, 1, 1))
+
+        now = timezone.now()
+        cls.old = []
+        for i in range(5):
+            appointment = Appointment.objects.create(
+                doctor=cls.doctor, patient=cls.patient, status='completed',
+                appointment_date=now - timedelta(days=400 + 35 * i))  # spread over several months
+            Prescription.objects.create(appointment=appointment, diagnosis='Flu',
+                                        medicines='Paracetamol 500mg - thrice daily', instructions='Rest')
+            Invoice.objects.create(appointment=appointment, amount=500, status='paid')
+            cls.old.append(appointment)
+        # too recent, still open, or still owing: these stay
+        cls.recent = Appointment.objects.create(doctor=cls.doctor, patient=cls.patient, status='completed',
+                                                appointment_date=now - timedelta(days=10))
+        cls.open = Appointment.objects.create(doctor=cls.doctor, patient=cls.patient, status='scheduled',
+                                              appointment_date=now - timedelta(days=500))
+        cls.owing = Appointment.objects.create(doctor=cls.doctor, patient=cls.patient, status='completed',
+                                               appointment_date=now - timedelta(days=500))
+        Invoice.objects.create(appointment=cls.owing, amount=500)
+
+    def setUp(self):
+        cache.delete(NEWEST_KEY)
+        self.client.force_authenticate(self.admin)
+
+    def test_moves_closed_appointments_with_their_records(self):
+        report = archive(batch_size=2)
+        self.assertEqual((report['archived'], report['batches']), (5, 3))
+        old_ids = {appointment.pk for appointment in self.old}
+        self.assertFalse(Appointment.objects.filter(pk__in=old_ids).exists())
+        self.assertFalse(Prescription.objects.filter(appointment_id__in=old_ids).exists())
+        self.assertFalse(PrescriptionItem.objects.filter(prescription__appointment_id__in=old_ids).exists())
+        self.assertFalse(Invoice.objects.filter(appointment_id__in=old_ids).exists())
+        self.assertEqual(set(ArchivedAppointment.objects.values_list('id', flat=True)), old_ids)
+        self.assertEqual(ArchivedPrescription.objects.count(), 5)
+        self.assertEqual(set(ArchivedInvoice.objects.values_list('status', flat=True)), {'paid'})
+        self.assertEqual(set(Appointment.objects.values_list('pk', flat=True)),
+                         {self.recent.pk, self.open.pk, self.owing.pk})
+        self.assertEqual(archive()['archived'], 0)
+
+    def test_reports_still_count_archived_rows(self):
+        archive()
+        self.assertEqual(diff(DailyAppointments), {})
+        self.assertEqual(diff(DailyRevenue), {})
+
+    def test_date_filter_reaches_into_the_archive(self):
+        archive()
+        hot = self.client.get('/api/appointments/').json()
+        self.assertEqual(len(hot), 3)
+        since = (timezone.now() - timedelta(days=600)).date()
+        rows = self.client.get(f'/api/appointments/?from={since}').json()
+        self.assertEqual(len(rows), 8)
+        oldest = sorted(rows, key=lambda row: (row['appointment_date'], row['id']))[:4]
+        page = self.client.get(f'/api/appointments/?from={since}&page_size=4').json()
+        self.assertEqual([row['id'] for row in page['results']], [row['id'] for row in oldest])
+
+        # past the newest archived row, the hot table alone answers
+        since = (timezone.now() - timedelta(days=30)).date()
+        with self.assertNumQueries(1):
+            rows = self.client.get(f'/api/appointments/?from={since}').json()
+        self.assertEqual([row['id'] for row in rows], [self.recent.pk])
+
+    def test_deleting_a_doctor_removes_their_archive(self):
+        archive()
+        self.doctor.delete()
+        self.assertFalse(ArchivedAppointment.objects.exists())
+        self.assertFalse(ArchivedInvoice.objects.exists())
+
+    @mock.patch.object(storage, '_partitions', set())
+    def test_partitions_are_remembered_once_committed(self):
+        connection, moment = RecordingPostgres(), datetime(2020, 5, 17, tzinfo=dt_timezone.utc)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                storage.ensure_partitions(connection, [moment])
+                raise DatabaseError('the batch failed')  # and its CREATE TABLEs were rolled back
+        self.assertEqual((callbacks, len(connection.statements)), ([], 3))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            storage.ensure_partitions(connection, [moment])
+        self.assertEqual(len(connection.statements), 6)  # created again
+        self.assertIn('archive_invoice_y2020m05 PARTITION OF archive_invoice', connection.statements[-1])
+        storage.ensure_partitions(connection, [moment])
+        self.assertEqual(len(connection.statements), 6)
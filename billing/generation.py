@@ -0,0 +1,81 @@
+"""
+Bulk invoicing of completed appointments.
+
+Completed appointments without an invoice are found with an anti-join and
+streamed with ``.iterator()``. Each chunk is inserted with one ``bulk_create``
+in its own short transaction, which first locks the chunk's appointments. A
+run racing another one then waits for it and sees its invoices, so it only
+inserts and reports what is still missing. The OneToOne constraint on
+``Invoice.appointment`` stays the backstop.
+"""
+import time
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from appointments.models import Appointment
+from .models import Invoice
+from .signals import invoices_bulk_created
+
+DEFAULT_CHUNK_SIZE = 1000
+REQUEST_LIMIT = 5000  # appointments one POST /api/billing/generate/ invoices; the command has no limit
+
+
+def uninvoiced_appointments():
+    """``(appointment_id, consultation_fee)`` of completed appointments that have no invoice yet."""
+    return Appointment.objects.filter(
+        status='completed', invoice__isnull=True,
+    ).order_by().values_list('id', 'doctor__consultation_fee')
+
+
+def _lock_appointments(appointment_ids):
+    """Hold these appointments until the surrounding transaction ends, as ``scheduling.lock_doctors`` does."""
+    appointments = Appointment.objects.filter(pk__in=appointment_ids)
+    if connection.features.has_select_for_update:
+        list(appointments.select_for_update().order_by('pk').values_list('pk'))
+    else:
+        appointments.update(status=F('status'))
+
+
+def generate_invoices(chunk_size=DEFAULT_CHUNK_SIZE, progress=None, limit=None):
+    """
+    Invoice every completed, uninvoiced appointment at its doctor's consultation fee.
+
+    ``progress(report)`` is called after each chunk. Returns the final report:
+    ``{'invoiced': n, 'seconds': s, 'per_second': r, 'more': bool}``.
+    ``invoiced`` counts the rows actually inserted. With ``limit``, at most that
+    many appointments are looked at, and ``more`` says whether more may be left.
+    """
+    started = time.monotonic()
+    report = {'invoiced': 0, 'seconds': 0.0, 'per_second': 0.0, 'more': False}
+
+    def flush(chunk):
+        appointment_ids = [invoice.appointment_id for invoice in chunk]
+        with transaction.atomic():
+            _lock_appointments(appointment_ids)
+            # invoiced by a concurrent run since this one read the chunk
+            taken = set(Invoice.objects.filter(appointment_id__in=appointment_ids).values_list(
+                'appointment_id', flat=True))
+            inserted = [invoice for invoice in chunk if invoice.appointment_id not in taken]
+            Invoice.objects.bulk_create(inserted, ignore_conflicts=True)
+        invoices_bulk_created.send(sender=Invoice, instances=inserted)
+        report['invoiced'] += len(inserted)
+        report['seconds'] = round(time.monotonic() - started, 3)
+        report['per_second'] = round(report['invoiced'] / report['seconds'], 1) if report['seconds'] else 0.0
+        if progress is not None:
+            progress(report)
+
+    appointments = uninvoiced_appointments()
+    if limit is not None:
+        appointments = appointments[:limit]
+    chunk, read = [], 0
+    for appointment_id, fee in appointments.iterator(chunk_size=chunk_size):
+        read += 1
+        chunk.append(Invoice(appointment_id=appointment_id, amount=fee))
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    report['more'] = limit is not None and read >= limit
+    return report
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from billing.generation import DEFAULT_CHUNK_SIZE, generate_invoices
+
+
+class Command(BaseCommand):
+    help = 'Create pending invoices for completed appointments that have none (safe to re-run)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        def progress(report):
+            self.stdout.write(f"  {report['invoiced']} invoices, {report['per_second']}/s")
+
+        report = generate_invoices(chunk_size=options['chunk_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {report['invoiced']} invoices in {report['seconds']}s ({report['per_second']}/s)"))
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-18 03:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_invoice_invoice_issued_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['updated_at'], name='invoice_updated_idx'),
+        ),
+    ]
@@ -1,5 +1,33 @@
 from django.db import models
+from django.db.models import F
 from appointments.models import Appointment
+from users.models import full_name
+from users.scoping import scope_to_user
+
+
+class InvoiceQuerySet(models.QuerySet):
+    row_fields = (
+        'id', 'appointment_id', 'amount', 'status', 'issued_at', 'paid_at', 'updated_at',
+        'doctor_name', 'patient_name', 'appointment_date',
+    )
+
+    def visible_to(self, user):
+        return scope_to_user(self, user, prefix='appointment__')
+
+    def list_rows(self, fields=None):
+        """
+        Flat dict rows for list responses; names are joined in the same query.
+
+        ``fields`` limits the rows to those names (see ``hospital_management.fieldsets``).
+        """
+        annotations = {
+            'doctor_name': full_name('appointment__doctor__user'),
+            'patient_name': full_name('appointment__patient__user'),
+            'appointment_date': F('appointment__appointment_date'),
+        }
+        names = [name for name in self.row_fields if fields is None or name in fields]
+        return self.annotate(**{name: annotations[name] for name in names if name in annotations}).values(*names)
+
 
 class Invoice(models.Model):
     STATUS_CHOICES = [
@@ -12,6 +40,26 @@ class Invoice(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     issued_at = models.DateTimeField(auto_now_add=True)
     paid_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InvoiceQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['issued_at', 'id'], name='invoice_issued_id_idx'),
+            # conditional GET validators: MAX(updated_at) per scope
+            models.Index(fields=['updated_at'], name='invoice_updated_idx'),
+        ]
 
     def __str__(self):
-        return f"Invoice #{self.id} - {self.status}"
\ No newline at end of file
+        return f"Invoice #{self.id} - {self.status}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_status = instance.__dict__.get('status')  # for the invoice-paid event
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._saved_status = self.status
\ No newline at end of file
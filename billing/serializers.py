@@ -1,11 +1,25 @@
 from rest_framework import serializers
+from hospital_management.fieldsets import SparseFieldsMixin
 from .models import Invoice
 
-class InvoiceSerializer(serializers.ModelSerializer):
+class InvoiceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     doctor_name = serializers.CharField(source='appointment.doctor.user.get_full_name', read_only=True)
     patient_name = serializers.CharField(source='appointment.patient.user.get_full_name', read_only=True)
     appointment_date = serializers.DateTimeField(source='appointment.appointment_date', read_only=True)
 
     class Meta:
         model = Invoice
-        fields = ['id', 'appointment', 'amount', 'status', 'issued_at', 'paid_at', 'doctor_name', 'patient_name', 'appointment_date']
\ No newline at end of file
+        fields = ['id', 'appointment', 'amount', 'status', 'issued_at', 'paid_at', 'doctor_name', 'patient_name', 'appointment_date']
+
+
+class InvoiceRowSerializer(SparseFieldsMixin, serializers.Serializer):
+    """Read-only twin of InvoiceSerializer for ``Invoice.objects.list_rows()`` dicts."""
+    id = serializers.IntegerField()
+    appointment = serializers.IntegerField(source='appointment_id')
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    status = serializers.CharField()
+    issued_at = serializers.DateTimeField()
+    paid_at = serializers.DateTimeField()
+    doctor_name = serializers.CharField()
+    patient_name = serializers.CharField()
+    appointment_date = serializers.DateTimeField()
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+from hospital_management import events
+from .models import Invoice
+
+# Bulk writes skip post_save, so billing.generation announces them instead.
+# Rows skipped by ignore_conflicts are included; receivers should re-read what they need.
+# invoices_bulk_created: instances=[Invoice, ...]
+invoices_bulk_created = Signal()
+
+
+# ── Change events (/api/events/) ────────────────────────
+
+@receiver(post_save, sender=Invoice)
+def publish_invoice_event(sender, instance, created, raw=False, **kwargs):
+    if raw or instance.status != 'paid' or getattr(instance, '_saved_status', None) == 'paid':
+        return
+    events.publish('invoice.paid', instance.appointment, invoice=instance.pk, amount=str(instance.amount))
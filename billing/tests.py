@@ -1,3 +1,81 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from appointments.models import Appointment
+from hospital_management.testing import ListQueryBudgetMixin, as_json_datetime
+from users.models import User, Doctor, Patient
+from . import generation
+from .generation import generate_invoices
+from .models import Invoice
+from .signals import invoices_bulk_created
+
+
+class InvoiceListQueryBudgetTests(ListQueryBudgetMixin, APITestCase):
+    url = '/api/billing/'
+
+    @classmethod
+    def create_row(cls, appointment):
+        return Invoice.objects.create(appointment=appointment, amount=500)
+
+    def expected_row(self, invoice):
+        return {
+            'id': invoice.pk, 'appointment': invoice.appointment_id, 'amount': '500.00', 'status': 'pending',
+            'issued_at': as_json_datetime(invoice.issued_at), 'paid_at': None,
+            'doctor_name': 'Gregory House', 'patient_name': 'Anna Rao',
+            'appointment_date': as_json_datetime(invoice.appointment.appointment_date),
+        }
+
+
+class InvoiceGenerationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        doctor_user = User.objects.create_user(username='dr_g', password='x', role='doctor')
+        doctor = Doctor.objects.create(user=doctor_user, specialization='general', consultation_fee=750)
+        patient_user = User.objects.create_user(username='patient_g', password='x', role='patient')
+        patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1))
+        now = timezone.now()
+        for i, status in enumerate(['completed'] * 5 + ['scheduled']):
+            Appointment.objects.create(doctor=doctor, patient=patient, status=status,
+                                       appointment_date=now - timedelta(days=i + 1))
+        cls.admin = User.objects.create_user(username='admin_g', password='x', role='admin')
+
+    def setUp(self):
+        self.sent = []
+
+        def receiver(sender, instances, **kwargs):
+            self.sent.extend(instances)
+
+        invoices_bulk_created.connect(receiver, sender=Invoice, weak=False)
+        self.addCleanup(invoices_bulk_created.disconnect, receiver, sender=Invoice)
+
+    def test_rerun_invoices_nothing_twice(self):
+        self.assertEqual(generate_invoices(chunk_size=2)['invoiced'], 5)
+        self.assertEqual(Invoice.objects.filter(amount=750).count(), 5)
+        self.assertEqual(generate_invoices(chunk_size=2)['invoiced'], 0)
+        self.assertEqual(len(self.sent), 5)
+
+    def test_rows_a_concurrent_run_inserted_are_not_counted(self):
+        generate_invoices()
+        appointment = Appointment.objects.filter(status='scheduled').get()
+        appointment.status = 'completed'
+        appointment.save()
+        self.sent.clear()
+        # as if another run invoiced the first five after this one read them
+        read_all = Appointment.objects.filter(status='completed').order_by().values_list(
+            'id', 'doctor__consultation_fee')
+        with mock.patch.object(generation, 'uninvoiced_appointments', lambda: read_all):
+            report = generate_invoices(chunk_size=4)
+        self.assertEqual(report['invoiced'], 1)
+        self.assertEqual([invoice.appointment_id for invoice in self.sent], [appointment.pk])
+
+    def test_endpoint_is_capped_per_request(self):
+        self.client.force_authenticate(self.admin)
+        with mock.patch('billing.views.REQUEST_LIMIT', 3):
+            first = self.client.post('/api/billing/generate/').json()
+            second = self.client.post('/api/billing/generate/').json()
+        self.assertEqual((first['invoiced'], first['more']), (3, True))
+        self.assertEqual((second['invoiced'], second['more']), (2, False))
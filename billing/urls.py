@@ -1,6 +1,10 @@
 from django.urls import path
-from .views import InvoiceListCreateView
+from hospital_management.exports import ExportView
+from hospital_management.async_views import read_view
+from .views import InvoiceListCreateView, InvoiceGenerateView, AsyncInvoiceListView
 
 urlpatterns = [
-    path('', InvoiceListCreateView.as_view()),
+    path('', read_view(InvoiceListCreateView.as_view(), AsyncInvoiceListView)),
+    path('generate/', InvoiceGenerateView.as_view()),
+    path('export/', ExportView.as_view(dataset='invoices')),
 ]
\ No newline at end of file
@@ -1,25 +1,63 @@
 from rest_framework import generics, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .generation import DEFAULT_CHUNK_SIZE, REQUEST_LIMIT, generate_invoices
 from .models import Invoice
-from .serializers import InvoiceSerializer
+from .serializers import InvoiceSerializer, InvoiceRowSerializer
 from rest_framework.permissions import IsAuthenticated
+from users.permissions import IsAdmin
+from hospital_management.async_views import AsyncReadView, Validated
+from hospital_management.conditional import ConditionalListMixin, list_etag, row_validators
+from hospital_management.fieldsets import row_names, selected_fields
+from hospital_management.idempotency import IdempotentCreateMixin
+from hospital_management.instrumentation import serialized
 
-class InvoiceListCreateView(generics.ListCreateAPIView):
-    serializer_class = InvoiceSerializer
+class InvoiceListCreateView(IdempotentCreateMixin, ConditionalListMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
+    ordering = ('issued_at', 'id')
+
+    def get_serializer_class(self):
+        # lists are served from flat rows so the query count doesn't grow with the page
+        if self.request.method == 'GET':
+            return InvoiceRowSerializer
+        return InvoiceSerializer
 
     def get_queryset(self):
-        user = self.request.user
-        if user.role == 'admin':
-            return Invoice.objects.all()
-        elif user.role == 'doctor':
-            return Invoice.objects.filter(appointment__doctor__user=user)
-        elif user.role == 'patient':
-            return Invoice.objects.filter(appointment__patient__user=user)
-        return Invoice.objects.none()
+        queryset = self.get_validator_queryset()
+        if self.request.method != 'GET':
+            return queryset
+        fields = selected_fields(self)
+        if fields is not None:
+            fields = row_names(fields, keep=('updated_at', *self.ordering))
+        return queryset.list_rows(fields=fields)
+
+    def get_validator_queryset(self):
+        return Invoice.objects.visible_to(self.request.user)
 
     def perform_create(self, serializer):
         # only admin can create invoices
         if self.request.user.role != 'admin':
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("Only admins can create invoices.")
-        serializer.save()
\ No newline at end of file
+        serializer.save()
+
+
+
+class AsyncInvoiceListView(AsyncReadView):
+    async def get(self, request, user):
+        rows = [row async for row in Invoice.objects.visible_to(user).list_rows().aiterator()]
+        last_modified, count = row_validators(rows)
+        return Validated(serialized(InvoiceRowSerializer(rows, many=True)),
+                         list_etag(request, user, self.renderer.format, last_modified, count), last_modified)
+
+
+class InvoiceGenerateView(APIView):
+    """
+    Invoice completed appointments that don't have an invoice yet, at most
+    ``REQUEST_LIMIT`` per request. ``more`` in the response means POST again;
+    ``manage.py generate_invoices`` does a whole backlog in one go.
+    """
+    permission_classes = [IsAdmin]
+
+    def post(self, request):
+        return Response(generate_invoices(chunk_size=DEFAULT_CHUNK_SIZE, limit=REQUEST_LIMIT))
@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hospital_management.settings')
 
 application = get_asgi_application()
+
+if settings.ASGI_MODE:
+    # WhiteNoise is left out of the middleware in ASGI mode
+    application = ASGIStaticFilesHandler(application)
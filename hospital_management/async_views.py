@@ -0,0 +1,172 @@
+"""
+Async versions of the read-heavy endpoints, for the ASGI deployment.
+
+An ``AsyncReadView`` answers a plain authenticated JSON GET on the event loop
+with Django's async ORM and cache. The querysets and serializers are the ones
+the sync views use, so visibility and output are identical. Anything
+else goes to the sync DRF view through ``sync_to_async``: other methods,
+paging, search and field selection, the browsable API, and failed auth or
+lookups. Those responses stay byte-for-byte what they were. Which views are
+mounted is decided at startup by ``settings.ASYNC_READ_VIEWS`` (see
+``read_view``), because an async view under WSGI would only add an event loop
+per request.
+
+Serializers must not touch the database on this path. Anything they read has
+to be ``select_related`` or loaded beforehand; a lazy query raises
+``SynchronousOnlyOperation`` instead of blocking the loop.
+"""
+import json
+from datetime import datetime
+from typing import Any, NamedTuple, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import classonlymethod
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+
+from hospital_management import events
+from hospital_management.conditional import CONDITIONAL_HEADERS, set_validators
+from hospital_management.instrumentation import timed
+from hospital_management.throttling import acheck
+from users.authentication import ClaimsJWTAuthentication
+
+# query parameters only the sync views implement
+SYNC_ONLY_PARAMS = ('cursor', 'page_size', 'search', 'limit', 'offset', 'fields', 'exclude', 'format', 'from', 'to')
+
+
+class Validated(NamedTuple):
+    """What ``AsyncReadView.get`` returns for data that has validators (see ``hospital_management.conditional``)."""
+    data: Any
+    etag: str
+    last_modified: Optional[datetime] = None
+
+
+class AsyncReadView:
+    sync_view = None
+    roles = None  # roles allowed to use the endpoint; None means any authenticated user
+    renderer = JSONRenderer()
+    authenticator = ClaimsJWTAuthentication()
+
+    @classonlymethod
+    def as_view(cls, sync_view):
+        self = cls()
+        self.sync_view = sync_view
+        delegate = sync_to_async(sync_view)
+        sync_class = getattr(sync_view, 'cls', object)  # the DRF view, for its endpoint class
+
+        async def view(request, *args, **kwargs):
+            if self.must_delegate(request):
+                return await delegate(request, *args, **kwargs)
+            try:
+                auth = await self.authenticator.aauthenticate(request)
+            except (InvalidToken, AuthenticationFailed):
+                auth = None
+            if auth is None or (self.roles is not None and auth[0].role not in self.roles):
+                return await delegate(request, *args, **kwargs)
+            throttled = await acheck(request, auth[0], sync_class)
+            if throttled is not None:
+                return throttled
+            try:
+                data = await self.get(request, auth[0], *args, **kwargs)
+            except ObjectDoesNotExist:
+                return await delegate(request, *args, **kwargs)
+            validated = data if isinstance(data, Validated) else None
+            with timed('render'):
+                response = HttpResponse(self.renderer.render(validated.data if validated else data),
+                                        content_type='application/json')
+            if validated:
+                set_validators(response, validated.etag, validated.last_modified)
+            return response
+
+        view.view_class = cls
+        return csrf_exempt(view)
+
+    def must_delegate(self, request):
+        if request.method != 'GET':
+            return True
+        if any(param in request.GET for param in SYNC_ONLY_PARAMS):
+            return True
+        if any(header in request.headers for header in CONDITIONAL_HEADERS):
+            return True  # the sync view answers a 304 with at most one aggregate query
+        return 'text/html' in request.headers.get('Accept', '')
+
+    async def get(self, request, user, *args, **kwargs):
+        """The response data, or ``Validated(data, etag, last_modified)``."""
+        raise NotImplementedError
+
+
+def read_view(sync_view, async_view_class):
+    """The view to mount for a read endpoint: the async one when ASGI serves async views."""
+    if getattr(settings, 'ASYNC_READ_VIEWS', False):
+        return async_view_class.as_view(sync_view=sync_view)
+    return sync_view
+
+
+EVENT_HEARTBEAT = 15     # seconds between keep-alive comments, so proxies keep the connection open
+EVENT_RETRY_MS = 3000    # reconnect delay suggested to EventSource
+
+
+async def _stream_user(request):
+    """
+    The user for an event stream. ``EventSource`` can't send headers, so the
+    access token may also come as ``?access_token=``.
+    """
+    authenticator = AsyncReadView.authenticator
+    try:
+        auth = await authenticator.aauthenticate(request)
+        if auth is None and 'access_token' in request.GET:
+            token = authenticator.get_validated_token(request.GET['access_token'].encode())
+            auth = (await authenticator.aget_user(token), token)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    if auth is None:
+        return None
+    user = auth[0]
+    if not hasattr(user, 'doctor_id'):  # a token from before claims; give it the profile ids events carry
+        from users.models import Doctor, Patient
+        user.doctor_id = await Doctor.objects.filter(user=user).values_list('pk', flat=True).afirst()
+        user.patient_id = await Patient.objects.filter(user=user).values_list('pk', flat=True).afirst()
+    return user
+
+
+async def _event_stream(user, last_id):
+    yield f'retry: {EVENT_RETRY_MS}\n\n'
+    skipped = None
+    try:
+        async for entry in events.get_bus().listen(last_id, heartbeat=EVENT_HEARTBEAT):
+            if entry is None:
+                # an id-only message moves the client's Last-Event-ID past events it wasn't shown
+                yield f'id: {skipped}\n\n' if skipped else ': keep-alive\n\n'
+                skipped = None
+                continue
+            event_id, event = entry
+            if events.visible_to(event, user):
+                skipped = None
+                yield f'id: {event_id}\nevent: {event["type"]}\ndata: {json.dumps(event)}\n\n'
+            else:
+                skipped = event_id
+    except events.EventsLost as e:
+        yield f'event: reset\ndata: {json.dumps({"detail": str(e)})}\n\n'
+
+
+async def event_stream(request):
+    """
+    Server-sent events for appointment and invoice changes the user can see
+    (``appointment.created``, ``appointment.status_changed``,
+    ``prescription.added``, ``invoice.paid``). A reconnecting client sends
+    ``Last-Event-ID`` and gets what it missed from the backlog first.
+    """
+    if not isinstance(request, ASGIRequest):
+        # a WSGI worker would be tied up for as long as the stream stays open
+        return JsonResponse({'detail': 'The event stream is only served in ASGI mode.'}, status=501)
+    user = await _stream_user(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided or are invalid.'}, status=401)
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    return StreamingHttpResponse(_event_stream(user, last_id), content_type='text/event-stream',
+                                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
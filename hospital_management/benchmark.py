@@ -0,0 +1,271 @@
+"""
+Endpoint benchmark against the local database.
+
+Each scenario is one request shape, e.g. "a doctor lists their appointments".
+It runs ``requests`` times across ``concurrency`` threads, and every thread
+uses its own test ``Client`` and database connection. The client goes through
+the full middleware stack and the real URLconf. Latency is measured around
+the whole client call. SQL queries are counted with an execute wrapper on the
+thread's connection.
+
+With ``server='asgi'`` the requests go through Django's ASGI handler instead:
+``concurrency`` asyncio tasks share one event loop, each with its own
+``AsyncClient``. The async ORM runs queries in worker threads, so the counts
+come from the ``Server-Timing`` header that ``PerformanceMiddleware`` sets.
+"""
+import asyncio
+import json
+import platform
+import re
+import statistics
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test import AsyncClient, Client, override_settings
+
+from appointments.models import Appointment
+from billing.models import Invoice
+from users.models import Doctor, Patient, User
+from users.serializers import ClaimsTokenObtainPairSerializer
+
+BASELINE_VERSION = 1
+# p95 differences below this many milliseconds are noise, whatever the ratio
+NOISE_FLOOR_MS = 2.0
+SERVERS = ('wsgi', 'asgi')
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+@dataclass
+class Scenario:
+    name: str
+    role: str  # 'admin', 'doctor', 'patient' or None for anonymous
+    path: str
+    method: str = 'get'
+    data: dict = field(default_factory=dict)
+    expect: int = 200
+
+
+def default_scenarios(login=None):
+    scenarios = [
+        Scenario('me.patient', 'patient', '/api/users/me/'),
+        Scenario('doctors.list', 'patient', '/api/users/doctors/'),
+        Scenario('doctors.list.paged', 'patient', '/api/users/doctors/?page_size=50'),
+        Scenario('doctors.slots', 'patient', '/api/users/doctors/{doctor_id}/slots/'),
+        Scenario('appointments.admin.paged', 'admin', '/api/appointments/?page_size=50'),
+        Scenario('appointments.doctor.paged', 'doctor', '/api/appointments/?page_size=50'),
+        Scenario('appointments.patient', 'patient', '/api/appointments/'),
+        Scenario('billing.admin.paged', 'admin', '/api/billing/?page_size=50'),
+        Scenario('billing.patient', 'patient', '/api/billing/'),
+        Scenario('prescriptions.doctor.paged', 'doctor', '/api/prescriptions/?page_size=50'),
+        Scenario('reports.revenue', 'admin', '/api/reports/revenue/'),
+    ]
+    if login:
+        username, password = login
+        scenarios.append(Scenario('login', None, '/api/users/login/', method='post',
+                                  data={'username': username, 'password': password}))
+    return scenarios
+
+
+def pick_identities():
+    """One user per role, plus the ids scenario paths refer to."""
+    identities = {}
+    for role in ('admin', 'doctor', 'patient'):
+        user = User.objects.filter(role=role, is_active=True).order_by('pk').first()
+        if user is not None:
+            token = ClaimsTokenObtainPairSerializer.get_token(user).access_token
+            identities[role] = {'Authorization': f'Bearer {token}'}
+    doctor = Doctor.objects.order_by('pk').values_list('pk', flat=True).first()
+    return identities, {'doctor_id': doctor}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def _run_one(client, scenario, path, headers):
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    with connection.execute_wrapper(count):
+        if scenario.method == 'get':
+            response = client.get(path, headers=headers)
+        else:
+            response = getattr(client, scenario.method)(path, json.dumps(scenario.data),
+                                                        content_type='application/json', headers=headers)
+        if getattr(response, 'streaming', False):
+            b''.join(response.streaming_content)
+    elapsed = (time.perf_counter() - started) * 1000
+    return elapsed, queries, response.status_code
+
+
+async def _arun_one(client, scenario, path, headers):
+    started = time.perf_counter()
+    if scenario.method == 'get':
+        response = await client.get(path, headers=headers)
+    else:
+        response = await getattr(client, scenario.method)(path, json.dumps(scenario.data),
+                                                          content_type='application/json', headers=headers)
+    elapsed = (time.perf_counter() - started) * 1000
+    match = SERVER_TIMING_QUERIES.search(response.get('Server-Timing', ''))
+    return elapsed, int(match[1]) if match else 0, response.status_code
+
+
+def _summary(scenario, samples, requests, wall):
+    latencies = [elapsed for elapsed, _, _ in samples]
+    errors = sum(1 for _, _, status in samples if status != scenario.expect)
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(statistics.fmean(latencies), 2),
+        'rps': round(requests / wall, 1) if wall else 0.0,
+        'queries': round(statistics.fmean(q for _, q, _ in samples), 2),
+    }
+
+
+def run_scenario(scenario, identities, ids, requests=200, concurrency=8, warmup=5):
+    if scenario.role is not None and scenario.role not in identities:
+        return None
+    headers = identities.get(scenario.role, {})
+    path = scenario.path.format(**ids)
+    samples = []
+    remaining = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker():
+        client = Client()
+        try:
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                sample = _run_one(client, scenario, path, headers)
+                with lock:
+                    samples.append(sample)
+        finally:
+            connections.close_all()  # this thread's connections only
+
+    client = Client()
+    for _ in range(warmup):
+        _run_one(client, scenario, path, headers)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    return _summary(scenario, samples, requests, wall)
+
+
+async def arun_scenario(scenario, identities, ids, requests=200, concurrency=8, warmup=5):
+    if scenario.role is not None and scenario.role not in identities:
+        return None
+    headers = identities.get(scenario.role, {})
+    path = scenario.path.format(**ids)
+    samples = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        client = AsyncClient()
+        while next(remaining, None) is not None:
+            samples.append(await _arun_one(client, scenario, path, headers))
+
+    client = AsyncClient()
+    for _ in range(warmup):
+        await _arun_one(client, scenario, path, headers)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    return _summary(scenario, samples, requests, wall)
+
+
+def run(scenarios, requests=200, concurrency=8, progress=None, server='wsgi'):
+    identities, ids = pick_identities()
+    results = {}
+    # one client hammering one endpoint is exactly what throttling stops; measure the endpoint instead.
+    # Server-Timing carries the ASGI query counts, whatever the deployment's setting
+    with override_settings(THROTTLE_ENABLED=False, PERF_SERVER_TIMING=True):
+        for scenario in scenarios:
+            if server == 'asgi':
+                result = asyncio.run(arun_scenario(scenario, identities, ids,
+                                                   requests=requests, concurrency=concurrency))
+            else:
+                result = run_scenario(scenario, identities, ids, requests=requests, concurrency=concurrency)
+            if result is None:
+                continue
+            results[scenario.name] = result
+            if progress:
+                progress(scenario.name, result)
+    return {
+        'version': BASELINE_VERSION,
+        'environment': {
+            'database': connection.vendor,
+            'server': server,
+            'async_views': getattr(settings, 'ASYNC_READ_VIEWS', False),
+            'python': platform.python_version(),
+            'requests': requests,
+            'concurrency': concurrency,
+            'rows': dataset_size(),
+        },
+        'results': results,
+    }
+
+
+def dataset_size():
+    return {
+        'doctors': Doctor.objects.count(),
+        'patients': Patient.objects.count(),
+        'appointments': Appointment.objects.count(),
+        'invoices': Invoice.objects.count(),
+    }
+
+
+def compare(current, baseline, threshold=0.2):
+    """
+    Regressions of ``current`` against ``baseline``, as readable strings.
+
+    A scenario regresses when its p95 latency grows by more than ``threshold``
+    (and by more than the noise floor), when it issues more queries per
+    request, or when it starts returning unexpected statuses.
+    """
+    regressions = []
+    for name, now in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            continue
+        limit = before['p95_ms'] * (1 + threshold)
+        if now['p95_ms'] > limit and now['p95_ms'] - before['p95_ms'] > NOISE_FLOOR_MS:
+            regressions.append(f"{name}: p95 {now['p95_ms']}ms > {before['p95_ms']}ms +{threshold:.0%}")
+        if now['queries'] > before['queries']:
+            regressions.append(f"{name}: {now['queries']} queries/request, baseline {before['queries']}")
+        if now['errors'] > before['errors']:
+            regressions.append(f"{name}: {now['errors']} unexpected responses, baseline {before['errors']}")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_results(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
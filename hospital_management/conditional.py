@@ -0,0 +1,165 @@
+"""
+Conditional requests (ETag / Last-Modified) for list and detail endpoints.
+
+A list's validators are ``MAX(updated_at)`` and the row count of the view's
+role-scoped queryset. An edit moves the first; a delete, or a row leaving the
+scope, moves the second. The ETag hashes both together with the request path,
+the response format and the caller's scope (``users.scoping.scope_key``), so
+one user's ETag never matches another user's list.
+
+A 200 takes the validators from the rows it has just read, so it costs
+nothing extra. A request with ``If-None-Match`` or ``If-Modified-Since`` first
+runs one aggregate, served by the ``(scope, updated_at)`` indexes, and gets a
+304 before any row is read when nothing changed. Only whole lists carry
+validators. Paged and search responses are served as before.
+
+Detail views use the row's ``updated_at`` for a strong ETag. On writes they
+honour ``If-Match`` / ``If-Unmodified-Since`` and answer 412 when the row
+changed after the client read it. Such a write locks the row before the
+check, so of two writes sent with the same ETag only the first succeeds.
+
+Related rows a response only displays, such as a doctor's name on an
+appointment, don't move these validators. ``Last-Modified`` has one-second
+resolution, so clients should prefer the ETag.
+"""
+import hashlib
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Max
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from users.scoping import scope_key
+from .instrumentation import serialized
+
+# part of every ETag; bump it when a serializer's output changes shape
+VALIDATOR_VERSION = 1
+CONDITIONAL_HEADERS = ('If-None-Match', 'If-Modified-Since', 'If-Match', 'If-Unmodified-Since')
+WRITE_PRECONDITION_HEADERS = ('If-Match', 'If-Unmodified-Since')
+
+
+def make_etag(*parts, weak=True):
+    digest = hashlib.blake2b('|'.join(map(str, (VALIDATOR_VERSION, *parts))).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+
+def list_etag(request, user, renderer_format, last_modified, count):
+    stamp = last_modified.isoformat() if last_modified else ''
+    return make_etag(request.get_full_path(), renderer_format, scope_key(user), stamp, count)
+
+
+def object_etag(instance, renderer_format):
+    return make_etag(instance._meta.label, instance.pk, instance.updated_at.isoformat(), renderer_format, weak=False)
+
+
+def row_validators(rows):
+    """``(last_modified, count)`` of rows already read, as model instances or ``list_rows()`` dicts."""
+    stamps = [row['updated_at'] if isinstance(row, dict) else row.updated_at for row in rows]
+    return (max(stamps) if stamps else None), len(stamps)
+
+
+def queryset_validators(queryset):
+    result = queryset.order_by().aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+    return result['last_modified'], result['count']
+
+
+def lock_row(instance):
+    """Hold ``instance``'s row until the surrounding transaction ends."""
+    rows = type(instance)._default_manager.filter(pk=instance.pk)
+    if connection.features.has_select_for_update:
+        list(rows.select_for_update().values_list('pk'))
+    else:
+        # SQLite has no row locks; a no-op write takes the database write lock instead
+        pk = instance._meta.pk.attname
+        rows.update(**{pk: F(pk)})
+
+
+def is_conditional(request):
+    return any(header in request.headers for header in CONDITIONAL_HEADERS)
+
+
+def check_preconditions(request, etag, last_modified):
+    """The 304 or 412 response ``request``'s conditional headers call for, or None to carry on."""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        return None
+    if response.status_code == 412:
+        response = JsonResponse({'detail': 'The resource has changed since it was read.'}, status=412)
+    set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # per-user data: browsers may keep it, but must revalidate every time
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+class ConditionalListMixin:
+    """Validators and 304s for a ``ListAPIView``'s whole-list responses."""
+
+    def get_validator_queryset(self):
+        """The scoped rows the list is made of, without the ``list_rows()`` projection."""
+        return self.get_queryset()
+
+    def list(self, request, *args, **kwargs):
+        paginator = self.paginator
+        if paginator is not None and getattr(paginator, 'is_requested', lambda request: True)(request):
+            return super().list(request, *args, **kwargs)
+
+        renderer_format = request.accepted_renderer.format
+        if is_conditional(request):
+            last_modified, count = queryset_validators(self.filter_queryset(self.get_validator_queryset()))
+            response = check_preconditions(
+                request, list_etag(request, request.user, renderer_format, last_modified, count), last_modified)
+            if response is not None:
+                return response
+
+        rows = list(self.filter_queryset(self.get_queryset()))
+        last_modified, count = row_validators(rows)
+        response = Response(serialized(self.get_serializer(rows, many=True)))
+        etag = list_etag(request, request.user, renderer_format, last_modified, count)
+        return set_validators(response, etag, last_modified)
+
+
+class ConditionalDetailMixin:
+    """Strong validators for a retrieve/update view: 304 on unchanged reads, 412 on stale writes."""
+
+    def get_object(self):
+        # update() fetches the object again after the precondition check
+        if getattr(self, '_conditional_object', None) is None:
+            self._conditional_object = super().get_object()
+        return self._conditional_object
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = object_etag(instance, request.accepted_renderer.format)
+        response = check_preconditions(request, etag, instance.updated_at)
+        if response is not None:
+            return response
+        return set_validators(Response(serialized(self.get_serializer(instance))), etag, instance.updated_at)
+
+    def update(self, request, *args, **kwargs):
+        if not any(header in request.headers for header in WRITE_PRECONDITION_HEADERS):
+            return self._update(request, *args, **kwargs)
+        with transaction.atomic():
+            # no other write can land between the check and the save
+            lock_row(self.get_object())
+            self._conditional_object = None
+            return self._update(request, *args, **kwargs)
+
+    def _update(self, request, *args, **kwargs):
+        instance = self.get_object()
+        renderer_format = request.accepted_renderer.format
+        response = check_preconditions(request, object_etag(instance, renderer_format), instance.updated_at)
+        if response is not None:
+            return response
+        response = super().update(request, *args, **kwargs)
+        instance = self.get_object()  # saved in place, with the new updated_at
+        return set_validators(response, object_etag(instance, renderer_format), instance.updated_at)
@@ -0,0 +1,309 @@
+"""
+Change events for the ``/api/events/`` stream.
+
+``publish()`` is called from each app's model signal receivers (``<app>.signals``)
+once the transaction commits. It appends the event to a bounded backlog and
+fans it out to every open stream in the process. Two buses implement this:
+
+- ``RedisEventBus``: the backlog is a capped Redis stream, so every worker
+  sees every event and ids survive restarts. Each process runs one reader
+  per event loop that ``XREAD``s the stream and fans out locally, so the
+  number of Redis connections doesn't grow with the number of open streams.
+- ``MemoryEventBus``: an in-process deque. It's used for tests and
+  single-process setups, and whenever the cache isn't Redis.
+
+Publishers never wait for consumers. Each subscription buffers at most
+``EVENTS_SUBSCRIBER_BUFFER`` events. A consumer that falls further behind is
+dropped, and so is one whose ``Last-Event-ID`` is older than the backlog.
+Either way the stream ends with a ``reset`` event, which tells the client to
+refetch and reconnect without the id.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = 'events:changes'
+
+
+class EventsLost(Exception):
+    """The subscriber missed events it can't be sent; it has to refetch."""
+
+
+class Subscription:
+    """One open stream's buffer. Lives on, and is only touched from, its event loop."""
+
+    def __init__(self, limit):
+        self.loop = asyncio.get_running_loop()
+        self.limit = limit
+        self.pending = deque()
+        self.wakeup = asyncio.Event()
+        self.dropped = False
+
+    def push(self, entry):
+        if self.dropped:
+            return
+        if len(self.pending) >= self.limit:
+            self.dropped = True
+            self.pending.clear()
+        else:
+            self.pending.append(entry)
+        self.wakeup.set()
+
+    async def next_batch(self, timeout):
+        """Buffered ``(id, event)`` entries, or ``[]`` after ``timeout`` seconds without any."""
+        if not self.pending and not self.dropped:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self.wakeup.clear()
+        if self.dropped:
+            raise EventsLost('subscriber fell too far behind')
+        batch = list(self.pending)
+        self.pending.clear()
+        return batch
+
+
+class EventBus:
+    def __init__(self, backlog, buffer):
+        self.backlog = backlog
+        self.buffer = buffer
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event):
+        raise NotImplementedError
+
+    async def replay(self, after):
+        """Backlog entries after id ``after``; raises ``EventsLost`` if some have been trimmed."""
+        raise NotImplementedError
+
+    def sort_key(self, event_id):
+        raise NotImplementedError
+
+    async def position(self):
+        """The id of the newest event so far."""
+        raise NotImplementedError
+
+    def _fan_out(self, entry):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, entry)
+            except RuntimeError:
+                self._unsubscribed(subscription)  # its loop has closed
+
+    def _subscribed(self, subscription, start):
+        """Start pushing events to ``subscription``; any published after ``start`` may arrive."""
+        with self._lock:
+            self._subscriptions.add(subscription)
+
+    def _unsubscribed(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    async def listen(self, last_id=None, heartbeat=15):
+        """
+        Yield ``(id, event)`` entries published after ``last_id`` (or from now on),
+        and ``None`` every ``heartbeat`` seconds without one.
+        """
+        # taken before subscribing, and replayed from, so an event published in between isn't lost
+        start = await self.position()
+        subscription = Subscription(self.buffer)
+        self._subscribed(subscription, start)
+        try:
+            seen = last_id or start
+            for entry in await self.replay(seen):
+                seen = entry[0]
+                yield entry
+            while True:
+                batch = await subscription.next_batch(heartbeat)
+                if not batch:
+                    yield None
+                for entry in batch:
+                    # skip what the replay already sent
+                    if self.sort_key(entry[0]) > self.sort_key(seen):
+                        yield entry
+        finally:
+            self._unsubscribed(subscription)
+
+
+class MemoryEventBus(EventBus):
+    def __init__(self, backlog, buffer):
+        super().__init__(backlog, buffer)
+        self._events = deque(maxlen=backlog)
+        self._last_id = 0
+
+    def publish(self, event):
+        with self._lock:
+            self._last_id += 1
+            entry = (str(self._last_id), event)
+            self._events.append(entry)
+        self._fan_out(entry)
+        return entry[0]
+
+    def sort_key(self, event_id):
+        return int(event_id)
+
+    async def position(self):
+        with self._lock:
+            return str(self._last_id)
+
+    async def replay(self, after):
+        try:
+            after = int(after)
+        except ValueError:
+            raise EventsLost(f'unknown event id {after!r}')
+        with self._lock:
+            events = list(self._events)
+            last_id = self._last_id
+        if after > last_id or (events and after < int(events[0][0]) - 1):
+            raise EventsLost(f'event {after} is no longer in the backlog')
+        return [entry for entry in events if int(entry[0]) > after]
+
+
+class RedisEventBus(EventBus):
+    block_ms = 5000
+
+    def __init__(self, backlog, buffer, url):
+        super().__init__(backlog, buffer)
+        self.url = url
+        self._readers = {}  # event loop -> reader task
+
+    def publish(self, event):
+        from django_redis import get_redis_connection
+        return get_redis_connection('default').xadd(
+            STREAM_KEY, {'data': json.dumps(event)}, maxlen=self.backlog, approximate=True).decode()
+
+    def sort_key(self, event_id):
+        millis, _, sequence = event_id.partition('-')
+        return int(millis), int(sequence or 0)
+
+    async def position(self):
+        client = self._client()
+        try:
+            latest = await client.xrevrange(STREAM_KEY, count=1)
+        finally:
+            await client.aclose()
+        return latest[0][0].decode() if latest else '0-0'
+
+    def _client(self):
+        import redis.asyncio
+        return redis.asyncio.Redis.from_url(self.url)
+
+    @staticmethod
+    def _decode(entry_id, fields):
+        return entry_id.decode(), json.loads(fields[b'data'])
+
+    async def replay(self, after):
+        try:
+            after_key = self.sort_key(after)
+        except ValueError:
+            raise EventsLost(f'unknown event id {after!r}')
+        client = self._client()
+        try:
+            first = await client.xrange(STREAM_KEY, count=1)
+            if first and after_key < self.sort_key(first[0][0].decode()):
+                raise EventsLost(f'event {after} is no longer in the backlog')
+            entries = await client.xrange(STREAM_KEY, min=f'({after}', count=self.backlog)
+        finally:
+            await client.aclose()
+        return [self._decode(*entry) for entry in entries]
+
+    def _subscribed(self, subscription, start):
+        super()._subscribed(subscription, start)
+        loop = subscription.loop
+        if loop not in self._readers or self._readers[loop].done():
+            self._readers[loop] = loop.create_task(self._read(start))
+
+    def _fan_out(self, entry):
+        # only called by the reader, on its own loop
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            subscriptions = [s for s in self._subscriptions if s.loop is loop]
+        for subscription in subscriptions:
+            subscription.push(entry)
+
+    async def _read(self, last_id):
+        """Forward stream entries after ``last_id`` to this loop's subscriptions until none are left."""
+        loop = asyncio.get_running_loop()
+        client = self._client()
+        try:
+            while True:
+                with self._lock:
+                    if not any(s.loop is loop for s in self._subscriptions):
+                        del self._readers[loop]  # before any await, so the next subscriber starts a new reader
+                        return
+                try:
+                    response = await client.xread({STREAM_KEY: last_id}, block=self.block_ms, count=self.buffer)
+                except Exception:
+                    logger.exception('Reading %s failed', STREAM_KEY)
+                    await asyncio.sleep(1)
+                    continue
+                for _, entries in response:
+                    for entry in entries:
+                        entry = self._decode(*entry)
+                        last_id = entry[0]
+                        self._fan_out(entry)
+        finally:
+            await client.aclose()
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_bus():
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            backend = getattr(settings, 'EVENTS_BACKEND', None)
+            if backend is None:
+                backend = 'redis' if 'django_redis' in settings.CACHES['default']['BACKEND'] else 'memory'
+            backlog = getattr(settings, 'EVENTS_BACKLOG', 10000)
+            buffer = getattr(settings, 'EVENTS_SUBSCRIBER_BUFFER', 500)
+            if backend == 'redis':
+                _bus = RedisEventBus(backlog, buffer, settings.CACHES['default']['LOCATION'])
+            else:
+                _bus = MemoryEventBus(backlog, buffer)
+        return _bus
+
+
+def reset_bus():
+    """Forget the bus so the next ``get_bus()`` re-reads the settings (tests)."""
+    global _bus
+    with _bus_lock:
+        _bus = None
+
+
+def publish(event_type, appointment, **fields):
+    """Publish an event about ``appointment`` once the current transaction commits."""
+    event = {
+        'type': event_type,
+        'appointment': appointment.pk,
+        'doctor': appointment.doctor_id,
+        'patient': appointment.patient_id,
+        'at': timezone.now().isoformat(),
+        **fields,
+    }
+    # robust: a bus outage is logged, not raised into the request that made the change
+    transaction.on_commit(lambda: get_bus().publish(event), robust=True)
+
+
+def visible_to(event, user):
+    """Whether ``user`` may see ``event``; the same rules as ``users.scoping``."""
+    role = getattr(user, 'role', None)
+    if role == 'admin':
+        return True
+    if role in ('doctor', 'patient'):
+        return event[role] == getattr(user, f'{role}_id', None)
+    return False
@@ -0,0 +1,144 @@
+"""
+Streaming CSV / NDJSON exports.
+
+Rows come from each model's ``list_rows()`` projection, read through
+``.iterator(chunk_size=...)`` (a server-side cursor on Postgres) and encoded
+one at a time, so memory stays flat however large the table is and the first
+bytes go out as soon as the first chunk is fetched. The same generators back
+the HTTP endpoints and the ``export`` management command. Responses that
+aren't streamed, such as a 401, are rendered in the requested format by the
+renderers themselves.
+
+Under ASGI, Django would drain a plain generator into a list before sending
+anything, so there the lines are handed over through ``alines``: one thread
+hop per ``EXPORT_CHUNK_SIZE`` lines, on the thread that holds the cursor.
+"""
+import csv
+import datetime
+import itertools
+import json
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.views import APIView
+
+from users.permissions import HasRole
+from users.scoping import scope_to_user
+
+EXPORT_CHUNK_SIZE = 2000
+
+# dataset -> (model label, path from the model to its appointment, for role scoping)
+DATASETS = {
+    'appointments': ('appointments.Appointment', ''),
+    'invoices': ('billing.Invoice', 'appointment__'),
+    'prescriptions': ('prescriptions.Prescription', 'appointment__'),
+}
+
+
+def export_queryset(dataset, user=None):
+    """Projection queryset for ``dataset``, scoped to ``user`` when given."""
+    label, prefix = DATASETS[dataset]
+    queryset = apps.get_model(label).objects.all()
+    if user is not None:
+        queryset = scope_to_user(queryset, user, prefix=prefix)
+    return queryset.list_rows().order_by('id')
+
+
+class _Echo:
+    """File-like object whose write() hands the line back, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def csv_lines(queryset):
+    fields = queryset.row_fields
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield writer.writerow([_csv_value(row[field]) for field in fields])
+
+
+def ndjson_lines(queryset):
+    for row in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+async def alines(lines):
+    """The ``lines`` generator as an async iterator, ``EXPORT_CHUNK_SIZE`` lines at a time."""
+    take = sync_to_async(lambda: ''.join(itertools.islice(lines, EXPORT_CHUNK_SIZE)))
+    try:
+        while chunk := await take():
+            yield chunk
+    finally:
+        await sync_to_async(lines.close)()  # releases the cursor if the client went away
+
+
+def _records(data):
+    """A response payload as a list of flat dicts: error details and the like, which aren't streamed."""
+    if isinstance(data, dict):
+        return [data]
+    if isinstance(data, list):
+        return [row if isinstance(row, dict) else {'detail': row} for row in data]
+    return [{'detail': data}]
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        records = _records(data)
+        fields = list(dict.fromkeys(key for record in records for key in record))
+        writer = csv.writer(_Echo())
+        lines = [writer.writerow(fields)]
+        lines += [writer.writerow([_csv_value(record.get(field)) for field in fields]) for record in records]
+        return ''.join(lines).encode()
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return ''.join(json.dumps(record, cls=DjangoJSONEncoder) + '\n' for record in _records(data)).encode()
+
+
+ENCODERS = {'csv': csv_lines, 'ndjson': ndjson_lines}
+
+
+class ExportView(APIView):
+    """
+    Stream every row of ``dataset`` the caller can see. Pick the encoding with
+    ``?format=csv`` (default) or ``?format=ndjson``, or the Accept header.
+    A user without a role can see no rows, and is refused rather than handed
+    an empty file.
+    """
+    permission_classes = [HasRole]
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+    dataset = None
+
+    def get(self, request):
+        fmt = request.accepted_renderer.format
+        lines = ENCODERS[fmt](export_queryset(self.dataset, request.user))
+        if isinstance(request._request, ASGIRequest):
+            lines = alines(lines)
+        response = StreamingHttpResponse(lines, content_type=request.accepted_media_type)
+        response['Content-Disposition'] = f'attachment; filename="{self.dataset}.{fmt}"'
+        return response
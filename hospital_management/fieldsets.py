@@ -0,0 +1,97 @@
+"""
+Sparse fieldsets: ``?fields=`` and ``?exclude=`` on read endpoints.
+
+Both take comma-separated serializer field names, e.g.
+``/api/appointments/?fields=id,doctor_name,appointment_date``. A serializer
+with ``SparseFieldsMixin`` drops the other fields on GET; an unknown name is a
+400. The view then narrows its queryset to what the remaining fields read, so
+large text columns (appointment notes, patient addresses, prescription text)
+are neither fetched nor serialized when nobody asked for them:
+
+- model querysets go through ``load_only``: ``.only()`` the columns the
+  fields' sources reach, and ``select_related`` just the joins they cross,
+- ``list_rows()`` querysets take ``row_names`` as their ``fields``, and skip
+  the columns and name annotations (with their joins) outside it.
+
+Views pass their validator and ordering columns as ``keep``. ETags already
+hash the full path, so each selection has its own.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXCLUDE_PARAM = 'exclude'
+
+
+def _names(request, param):
+    return [name.strip() for name in request.query_params.get(param, '').split(',') if name.strip()]
+
+
+def is_requested(request):
+    return request.method in SAFE_METHODS and bool(_names(request, FIELDS_PARAM) or _names(request, EXCLUDE_PARAM))
+
+
+class SparseFieldsMixin:
+    """Serializer mixin: keep only the fields the request's ``?fields=`` / ``?exclude=`` select."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or not hasattr(request, 'query_params') or not is_requested(request):
+            return
+        only, exclude = _names(request, FIELDS_PARAM), _names(request, EXCLUDE_PARAM)
+        unknown = sorted(set(only + exclude) - set(self.fields))
+        if unknown:
+            raise ValidationError(f"Unknown field(s): {', '.join(unknown)}.")
+        for name in list(self.fields):
+            if (only and name not in only) or name in exclude:
+                self.fields.pop(name)
+
+
+def selected_fields(view):
+    """The fields of ``view``'s serializer that the request selected, or None for all of them."""
+    if not is_requested(view.request):
+        return None
+    return view.get_serializer().fields
+
+
+def row_names(fields, keep=()):
+    """The ``list_rows()`` names behind ``fields`` of a row serializer, plus ``keep``."""
+    return {field.source for field in fields.values()} | set(keep)
+
+
+def load_only(queryset, fields, keep=()):
+    """
+    ``queryset`` restricted to the columns and joins ``fields`` read.
+
+    A source that ends in a method or property (``doctor.user.get_full_name``)
+    loads the whole row it is called on. Reverse relations are left to the
+    view's ``prefetch_related``.
+    """
+    columns, joins = {name.lstrip('-') for name in keep}, set()
+    for field in fields.values():
+        if not field.source_attrs:
+            return queryset  # source='*': the whole row
+        model, path = queryset.model, []
+        for position, attr in enumerate(field.source_attrs, 1):
+            try:
+                model_field = model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                if not path:
+                    return queryset  # a method or property of the row itself
+                columns.add('__'.join(path))
+                break
+            if model_field.one_to_many or model_field.many_to_many:
+                break
+            path.append(attr)
+            if model_field.is_relation and position < len(field.source_attrs):
+                model = model_field.related_model
+                joins.add('__'.join(path))
+                continue
+            columns.add('__'.join(path))
+            break
+    queryset = queryset.select_related(None)
+    if joins:
+        queryset = queryset.select_related(*joins)
+    return queryset.only(*columns)
@@ -0,0 +1,122 @@
+"""
+``Idempotency-Key`` support for the create endpoints.
+
+A client that retries a POST after a timeout can't tell whether the first
+attempt went through. With an ``Idempotency-Key`` header, the first 2xx
+response is kept in the cache for ``IDEMPOTENCY_TTL`` seconds, keyed by the
+user and the key. A retry with the same key gets that response back, marked
+``Idempotent-Replayed: true``, for the price of one cache read. Nothing is
+booked, invoiced or prescribed twice.
+
+- A key is the caller's own: another user's identical key is a different one.
+- The stored response remembers a fingerprint of the method, path and body.
+  The same key on a different request is answered ``422``.
+- While the first request is still running, a duplicate waits up to
+  ``IDEMPOTENCY_WAIT_SECONDS`` for its response, then gets ``409`` with
+  ``Retry-After``. The request holding the lock checks for a stored
+  response once more before running the view, and releases only its own lock.
+- Errors are not stored. A 4xx means nothing was created, and a 5xx should
+  be retried for real, so both run the view again on a retry.
+
+Anonymous requests and requests without the header run as before. A response
+is stored after the view's writes committed; if the worker dies in between,
+a retry runs the view again.
+"""
+import hashlib
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+REPLAYED_HEADERS = ('Location', 'ETag', 'Last-Modified')  # kept with the stored response
+POLL_INTERVAL = 0.05  # seconds between checks while waiting on a duplicate in flight
+
+
+def _cache_key(user, key, suffix):
+    digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    return f'idempotency:{user.pk}:{digest}:{suffix}'
+
+
+def fingerprint(request):
+    digest = hashlib.blake2b(f'{request.method} {request.path}\n'.encode(), digest_size=16)
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _replay(stored, request_fingerprint):
+    if stored['fingerprint'] != request_fingerprint:
+        return Response({'detail': f'This {HEADER} was already used for a different request.'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return Response(stored['data'], status=stored['status'],
+                    headers={**stored['headers'], 'Idempotent-Replayed': 'true'})
+
+
+def _wait_for(result_key):
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        stored = cache.get(result_key)
+        if stored is not None:
+            return stored
+    return None
+
+
+def idempotent(handler):
+    """Honour ``Idempotency-Key`` on a view's create handler (``post`` or ``create``)."""
+
+    @wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None or not request.user.is_authenticated:
+            return handler(view, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({'detail': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        result_key = _cache_key(request.user, key, 'response')
+        request_fingerprint = fingerprint(request._request)
+        stored = cache.get(result_key)
+        if stored is not None:
+            return _replay(stored, request_fingerprint)
+
+        lock_key = _cache_key(request.user, key, 'lock')
+        holder = f'{request_fingerprint}:{uuid.uuid4().hex}'
+        if not cache.add(lock_key, holder, settings.IDEMPOTENCY_LOCK_SECONDS):
+            stored = _wait_for(result_key)
+            if stored is not None:
+                return _replay(stored, request_fingerprint)
+            return Response({'detail': f'A request with this {HEADER} is still in progress.'},
+                            status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+        try:
+            # the first request may have stored its response and let go of the lock since the read above
+            stored = cache.get(result_key)
+            if stored is not None:
+                return _replay(stored, request_fingerprint)
+            response = handler(view, request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                cache.set(result_key, {
+                    'fingerprint': request_fingerprint,
+                    'status': response.status_code,
+                    'data': response.data,
+                    'headers': {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)},
+                }, settings.IDEMPOTENCY_TTL)
+            return response
+        finally:
+            # past IDEMPOTENCY_LOCK_SECONDS the lock may have expired and been taken by a retry; leave that one be
+            if cache.get(lock_key) == holder:
+                cache.delete(lock_key)
+
+    return wrapper
+
+
+class IdempotentCreateMixin:
+    """``idempotent`` for a generic view's ``create``."""
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
@@ -0,0 +1,71 @@
+"""
+Per-request timing state shared by the performance middleware and the code it measures.
+
+The middleware puts a ``RequestMetrics`` in a context variable for the
+duration of a request. ``timed(phase)`` adds wall time to that request's
+phase total, and costs one context-variable lookup when no request is being
+measured (management commands, tests without the middleware). Views build
+their response data with ``serialized(serializer)`` so that it counts as the
+``serialize`` phase; data DRF's generic mixins serialize for themselves
+(paged lists, create and update responses) is part of ``view``.
+"""
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = Counter()  # phase -> seconds
+        self.active = set()
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()  # SQL with placeholders -> executions
+
+    def record_query(self, sql, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        self.statements[sql] += 1
+
+    def duplicates(self, threshold):
+        """Statements run at least ``threshold`` times, most repeated first."""
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+
+def current():
+    return _current.get()
+
+
+def start():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+@contextmanager
+def timed(phase):
+    metrics = _current.get()
+    # nested calls for the same phase (a serializer inside a serializer) are counted once
+    if metrics is None or phase in metrics.active:
+        yield
+        return
+    metrics.active.add(phase)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.phases[phase] += time.perf_counter() - started
+        metrics.active.discard(phase)
+
+
+def serialized(serializer):
+    """``serializer.data``, timed as the request's ``serialize`` phase."""
+    with timed('serialize'):
+        return serializer.data
@@ -0,0 +1,269 @@
+"""
+Per-request performance instrumentation.
+
+``PerformanceMiddleware`` records the following for every request:
+
+- SQL query count and DB time, through an execute wrapper on every connection.
+- Time in authentication, the view, serialization and rendering.
+- Statements repeated often enough to suggest an N+1.
+
+It logs them as one JSON line on the ``hospital_management.performance``
+logger and, with ``PERF_SERVER_TIMING`` (on under ``DEBUG``), reports them in
+a ``Server-Timing`` header. Serialization is timed where views build their
+data (``instrumentation.serialized``). Requests slower than
+``PERF_SLOW_REQUEST_MS`` are logged at WARNING with the stacks a background
+sampler saw while they were running. A ``PERF_PROFILE_SAMPLE_RATE`` fraction
+of requests runs under cProfile.
+
+With both of those off, the cost is a few counters per request and per query.
+
+The middleware runs natively under both WSGI and ASGI. Metrics live in a
+context variable, which ``sync_to_async`` carries into the worker thread, so
+queries the async ORM runs there are still counted against the request. Under
+ASGI the stack sampler is skipped: every request shares the event loop thread,
+so its stacks cannot be attributed to one request.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import instrumentation
+
+logger = logging.getLogger('hospital_management.performance')
+
+PHASES = ('auth', 'view', 'serialize', 'render')
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = instrumentation.current()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, time.perf_counter() - started)
+
+
+def _install_query_recorder(connection, **kwargs):
+    # first in the list, so a caller's own ``execute_wrapper()`` still pops its wrapper on exit
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+def install_query_recording():
+    """Record queries on every connection, including ones opened later in other threads (idempotent)."""
+    connection_created.connect(_install_query_recorder, dispatch_uid='performance-query-recorder')
+    for connection in connections.all(initialized_only=True):
+        _install_query_recorder(connection)
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stacks of requests that have run longer than ``threshold``.
+
+    A single daemon thread serves every request. It wakes each ``interval``
+    and samples only the threads whose request is already over the threshold,
+    so fast requests are never touched.
+    """
+
+    def __init__(self, threshold, interval):
+        super().__init__(name='perf-stack-sampler', daemon=True)
+        self.threshold = threshold
+        self.interval = interval
+        self.running = {}  # thread id -> (started, Counter of collapsed stacks)
+        self.lock = threading.Lock()
+
+    def begin(self):
+        samples = Counter()
+        with self.lock:
+            self.running[threading.get_ident()] = (time.perf_counter(), samples)
+        return samples
+
+    def end(self):
+        with self.lock:
+            self.running.pop(threading.get_ident(), None)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            with self.lock:
+                slow = {tid: samples for tid, (started, samples) in self.running.items()
+                        if now - started >= self.threshold}
+            if not slow:
+                continue
+            frames = sys._current_frames()
+            for tid, samples in slow.items():
+                frame = frames.get(tid)
+                if frame is not None:
+                    stack = traceback.extract_stack(frame, limit=30)
+                    samples[';'.join(f'{f.name} ({os.path.basename(f.filename)}:{f.lineno})'
+                                     for f in stack)] += 1
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+    _sampler = None
+    _sampler_lock = threading.Lock()
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'PERF_SERVER_TIMING', settings.DEBUG)
+        self.sample_rate = getattr(settings, 'PERF_PROFILE_SAMPLE_RATE', 0.0)
+        self.profile_dir = getattr(settings, 'PERF_PROFILE_DIR', None)
+        self.slow_ms = getattr(settings, 'PERF_SLOW_REQUEST_MS', 0)
+        self.duplicate_threshold = getattr(settings, 'PERF_DUPLICATE_QUERY_THRESHOLD', 5)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            self.process_view = self._aprocess_view
+            self.process_template_response = self._aprocess_template_response
+        install_query_recording()
+        if self.slow_ms and not self.async_mode:
+            self.sampler = self._start_sampler(self.slow_ms / 1000,
+                                               getattr(settings, 'PERF_STACK_SAMPLE_INTERVAL_MS', 20) / 1000)
+        else:
+            self.sampler = None
+
+    @classmethod
+    def _start_sampler(cls, threshold, interval):
+        with cls._sampler_lock:
+            if cls._sampler is None:
+                cls._sampler = StackSampler(threshold, interval)
+                cls._sampler.start()
+            return cls._sampler
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics, token, samples, profiler = self._begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            self._end(token, profiler)
+        return self._respond(request, response, metrics, samples, profiler)
+
+    async def __acall__(self, request):
+        # a profile taken here also covers whatever else the event loop ran meanwhile
+        metrics, token, samples, profiler = self._begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._end(token, profiler)
+        return self._respond(request, response, metrics, samples, profiler)
+
+    def _begin(self):
+        metrics, token = instrumentation.start()
+        samples = self.sampler.begin() if self.sampler else None
+        profiler = cProfile.Profile() if self.sample_rate and random.random() < self.sample_rate else None
+        if profiler:
+            profiler.enable()
+        return metrics, token, samples, profiler
+
+    def _end(self, token, profiler):
+        if profiler:
+            profiler.disable()
+        instrumentation.finish(token)
+        if self.sampler:
+            self.sampler.end()
+
+    def _respond(self, request, response, metrics, samples, profiler):
+        total = time.perf_counter() - metrics.started
+        if self.server_timing:
+            response['Server-Timing'] = self._server_timing(metrics, total)
+        self._log(request, response, metrics, total, samples, profiler)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = instrumentation.current()
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF responses render after every middleware has seen them; time that via a callback
+        metrics = instrumentation.current()
+        if metrics is not None:
+            self._end_view(metrics)
+            render_started = time.perf_counter()
+
+            def rendered(response):
+                metrics.phases['render'] += time.perf_counter() - render_started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    # the handler awaits these under ASGI; plain methods would each cost a thread hop
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        type(self).process_view(self, request, view_func, view_args, view_kwargs)
+
+    async def _aprocess_template_response(self, request, response):
+        return type(self).process_template_response(self, request, response)
+
+    @staticmethod
+    def _end_view(metrics):
+        started = getattr(metrics, 'view_started', None)
+        if started is not None:
+            metrics.phases['view'] += time.perf_counter() - started
+            metrics.view_started = None
+
+    def _server_timing(self, metrics, total):
+        self._end_view(metrics)  # plain HttpResponses skip process_template_response
+        entries = [f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"']
+        entries += [f'{phase};dur={metrics.phases[phase] * 1000:.1f}'
+                    for phase in PHASES if phase in metrics.phases]
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+    def _log(self, request, response, metrics, total, samples, profiler):
+        self._end_view(metrics)
+        total_ms = total * 1000
+        slow = bool(self.slow_ms) and total_ms >= self.slow_ms
+        duplicates = metrics.duplicates(self.duplicate_threshold)
+        level = logging.WARNING if slow or duplicates else logging.INFO
+        if not logger.isEnabledFor(level) and not profiler:
+            return
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 1),
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 1),
+            **{f'{phase}_ms': round(metrics.phases[phase] * 1000, 1) for phase in PHASES},
+        }
+        if duplicates:
+            record['duplicate_queries'] = [{'sql': sql[:300], 'count': n} for sql, n in duplicates[:5]]
+        if slow and samples:
+            record['stacks'] = [{'stack': stack, 'samples': n} for stack, n in samples.most_common(5)]
+        if profiler:
+            record['profile'] = self._dump_profile(profiler, request)
+
+        logger.log(level, json.dumps(record), extra={'performance': record})
+
+    def _dump_profile(self, profiler, request):
+        """Write the profile to ``PERF_PROFILE_DIR`` if set, otherwise return the top entries."""
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            name = f"{time.strftime('%Y%m%dT%H%M%S')}-{request.method}-{request.path.strip('/').replace('/', '.') or 'root'}.prof"
+            path = os.path.join(self.profile_dir, name)
+            profiler.dump_stats(path)
+            return path
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(20)
+        return out.getvalue()
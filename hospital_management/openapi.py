@@ -0,0 +1,98 @@
+"""
+The OpenAPI schema and its Swagger UI / ReDoc pages, built ahead of time.
+
+Generating the schema introspects every view and serializer, so doing it on
+each ``/swagger/`` hit is wasteful, and importing drf_yasg slows every worker's
+boot. ``manage.py build_openapi`` generates it once, at image build time, into
+``OPENAPI_DIR``:
+
+- ``swagger.json``, plus ``swagger.json.gz`` for clients that accept gzip,
+- ``swagger.html`` and ``redoc.html``, the UI pages, which load that file.
+
+Settings list ``OPENAPI_DIR`` in ``STATICFILES_DIRS`` under the ``openapi/``
+prefix, so ``collectstatic`` picks the files up. WhiteNoise then serves them
+with an ETag and Last-Modified, like any other static file. ``/swagger/`` and
+``/redoc/`` redirect there. ``/swagger/?format=openapi`` still answers with
+the schema.
+
+With ``OPENAPI_LIVE`` (the default under ``DEBUG``) the drf_yasg views
+regenerate the schema per request instead. Only then, or while building, is
+drf_yasg imported.
+"""
+import gzip
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpRequest, HttpResponseRedirect
+from django.templatetags.static import static
+from rest_framework import permissions
+from rest_framework.request import Request
+
+INFO = {
+    'title': "Hospital Management API",
+    'default_version': 'v1',
+    'description': "API documentation for Hospital Management System",
+    'contact_email': "admin@hospital.com",
+}
+PAGES = {'swagger': 'swagger.html', 'redoc': 'redoc.html'}
+SCHEMA_FILE = 'swagger.json'
+
+
+def _info():
+    from drf_yasg import openapi
+
+    info = dict(INFO)
+    return openapi.Info(contact=openapi.Contact(email=info.pop('contact_email')), **info)
+
+
+def live_schema_view():
+    """The drf_yasg view that generates the schema on every request (``OPENAPI_LIVE``)."""
+    from drf_yasg.views import get_schema_view
+
+    return get_schema_view(_info(), public=True, permission_classes=[permissions.AllowAny])
+
+
+def build(directory=None):
+    """Write the schema and the UI pages into ``directory`` (``OPENAPI_DIR``); returns the paths."""
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+    from drf_yasg.renderers import ReDocRenderer, SwaggerUIRenderer
+
+    class StaticPage:
+        """A UI renderer pointed at the static schema, without the session login (the API uses tokens)."""
+
+        def set_context(self, renderer_context, swagger=None):
+            super().set_context(renderer_context, swagger)
+            renderer_context['USE_SESSION_AUTH'] = False
+
+        def get_swagger_ui_settings(self):
+            return {**super().get_swagger_ui_settings(), 'url': static(f'openapi/{SCHEMA_FILE}')}
+
+        def get_redoc_settings(self):
+            return {**super().get_redoc_settings(), 'url': static(f'openapi/{SCHEMA_FILE}')}
+
+    directory = Path(directory or settings.OPENAPI_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    # an anonymous GET, as the live view sees it; url='' leaves out the build host
+    request = HttpRequest()
+    request.method = 'GET'
+    request = Request(request)
+    request.user = AnonymousUser()
+    schema = OpenAPISchemaGenerator(_info(), url='').get_schema(request=request, public=True)
+    content = OpenAPICodecJson(validators=[]).encode(schema)
+
+    written = {SCHEMA_FILE: content, f'{SCHEMA_FILE}.gz': gzip.compress(content, mtime=0)}
+    for renderer, name in ((SwaggerUIRenderer, PAGES['swagger']), (ReDocRenderer, PAGES['redoc'])):
+        page = type(renderer.__name__, (StaticPage, renderer), {})()
+        written[name] = page.render(schema, renderer_context={'request': request}).encode()
+    for name, data in written.items():
+        (directory / name).write_bytes(data)
+    return [directory / name for name in written]
+
+
+def static_page(request, page):
+    """Redirect ``/swagger/`` and ``/redoc/`` to the pages ``build`` wrote."""
+    if page == 'swagger' and request.GET.get('format') == 'openapi':
+        return HttpResponseRedirect(static(f'openapi/{SCHEMA_FILE}'))
+    return HttpResponseRedirect(static(f'openapi/{PAGES[page]}'))
@@ -0,0 +1,161 @@
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, LimitOffsetPagination, _reverse_ordering
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Opt-in cursor pagination for list endpoints.
+
+    Responses stay a plain array unless the client sends ``cursor`` or
+    ``page_size``, so existing clients are unaffected. The ordering is taken
+    from the view's ``ordering`` attribute and should always end in ``id`` and
+    be backed by a matching composite index.
+
+    The cursor holds the whole ordering key of the row at the page edge, and
+    the next page is the rows after it in tuple order: for ``(appointment_date,
+    id)``, ``appointment_date > x OR (appointment_date = x AND id > y)``, under
+    a leading ``appointment_date >= x`` so it is one range scan of the index.
+    There is no OFFSET, so page N costs what page 1 does however many rows
+    share a timestamp, and rows added behind the cursor don't shift its pages.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('id',)
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_ordering(self, request, queryset, view):
+        return tuple(getattr(view, 'ordering', self.ordering))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(self._after(queryset.model, ordering, self.cursor.position))
+        rows = list(queryset[:self.page_size + 1])
+        self.page = rows[:self.page_size]
+        more = len(rows) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, more
+        else:
+            self.has_next, self.has_previous = more, self.cursor is not None
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _after(self, model, ordering, position):
+        """Rows after ``position`` in ``ordering``, as a tuple comparison."""
+        values = []
+        for order, value in zip(ordering, position):
+            name = order.lstrip('-')
+            try:
+                values.append(model._meta.get_field(name).to_python(value))
+            except (FieldDoesNotExist, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        after, equal = Q(), Q()
+        for order, value in zip(ordering, values):
+            name = order.lstrip('-')
+            after |= equal & Q(**{f'{name}__{"lt" if order.startswith("-") else "gt"}': value})
+            equal &= Q(**{name: value})
+        first = ordering[0]
+        return Q(**{f'{first.lstrip("-")}__{"lte" if first.startswith("-") else "gte"}': values[0]}) & after
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self._position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self._position(self.page[0])))
+
+    def _position(self, row):
+        names = [order.lstrip('-') for order in self.ordering]
+        return [str(row[name] if isinstance(row, dict) else getattr(row, name)) for name in names]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            tokens = parse.parse_qs(b64decode(encoded.encode('ascii')).decode('ascii'), keep_blank_values=True)
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        position = tokens.get('p', [])
+        if len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=0, reverse=reverse, position=position)
+
+    def encode_cursor(self, cursor):
+        tokens = {'p': cursor.position}
+        if cursor.reverse:
+            tokens['r'] = '1'
+        encoded = b64encode(parse.urlencode(tokens, doseq=True).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+
+class RankedPagination(LimitOffsetPagination):
+    """
+    Limit/offset pages for relevance-ordered results, without a COUNT.
+
+    Search results are ordered by rank, which has no index to seek on, so a
+    cursor buys nothing. Counting every match would cost more than ranking
+    the first page. ``limit + 1`` rows are fetched instead, and the extra row
+    says whether there is a next page.
+    """
+    default_limit = 20
+    max_limit = 100
+    template = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+        rows = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        return rows[:self.limit]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = replace_query_param(self.request.build_absolute_uri(), self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response = super().get_paginated_response_schema(schema)
+        del response['properties']['count']
+        response['required'].remove('count')
+        return response
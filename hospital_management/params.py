@@ -0,0 +1,50 @@
+"""
+Query parameters shared by several views.
+
+``date_param`` reads ``?from=`` / ``?to=`` style bounds: an ISO datetime, or
+an ISO date meaning its midnight, in the current time zone when no offset is
+given. ``day_param`` reads a plain ISO date, for views that count whole days.
+A malformed or impossible value (``2026-02-30``) is a 400 from either.
+"""
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+def _invalid(param, value):
+    return ValidationError(f"Invalid date for '{param}': {value!r}")
+
+
+def date_param(request, param):
+    """``?param=`` as an aware datetime, or None when absent or empty."""
+    value = request.query_params.get(param)
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+        day = parse_date(value) if parsed is None else None
+    except ValueError:  # well formed, but not a real date
+        day = parsed = None
+    if parsed is None:
+        if day is None:
+            raise _invalid(param, value)
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def day_param(request, param, default=None):
+    """``?param=`` as a date, or ``default`` when absent or empty."""
+    value = request.query_params.get(param)
+    if not value:
+        return default
+    try:
+        day = parse_date(value)
+    except ValueError:  # well formed, but not a real date
+        day = None
+    if day is None:
+        raise _invalid(param, value)
+    return day
@@ -0,0 +1,233 @@
+"""
+Read replicas.
+
+With ``DATABASE_REPLICA_URLS`` set, settings adds each replica as
+``replica_<n>`` and installs ``ReplicaRouter`` and ``ReplicaMiddleware``.
+Views don't change; the middleware decides per request where reads go:
+
+- GET, HEAD and OPTIONS requests read from a replica, taking turns between
+  the healthy ones.
+- Other requests, and everything outside a request (management commands,
+  the scheduler), use the primary.
+- Once a request writes, its remaining reads go to the primary. Reads inside
+  a transaction on the primary stay there too.
+- After a write, the client's reads stay on the primary for
+  ``REPLICA_STICKY_SECONDS``, so a patient who just booked sees the
+  booking. The client is the user id of the bearer token, or else the
+  session. The mark lives in the shared cache, so it holds across workers.
+
+Each process checks its replicas at most every ``REPLICA_CHECK_INTERVAL``
+seconds. A replica that fails the check, or on Postgres replays more than
+``REPLICA_MAX_LAG_SECONDS`` behind, drops out until a later check passes.
+With no healthy replica, reads use the primary.
+
+Code that fills a shared cache reads inside ``primary()``. A replica a moment
+behind would otherwise store pre-write data right after an invalidation, and
+it would be served until the entry expired.
+"""
+import hashlib
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import jwt
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework_simplejwt.settings import api_settings
+
+logger = logging.getLogger('hospital_management.replicas')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# 0 when the standby has replayed everything it received; NULL (not a standby) counts as 0 too
+PG_LAG_SQL = """
+    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+"""
+
+_state = ContextVar('replica_routing', default=None)
+
+
+class RoutingState:
+    """Where the current request may read from."""
+
+    def __init__(self, request):
+        self.request = request
+        self.wrote = request.method not in SAFE_METHODS
+        self.pinned = 0
+        self._sticky = None
+
+    def client_key(self):
+        return client_key(self.request)
+
+    def may_use_replica(self):
+        if self.wrote or self.pinned:
+            return False
+        if self._sticky is None:
+            key = self.client_key()
+            self._sticky = key is not None and cache.get(sticky_key(key)) is not None
+        return not self._sticky
+
+
+def client_key(request):
+    """Who made ``request``: the token's user id, else a digest of the session cookie, else None."""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if token and scheme in api_settings.AUTH_HEADER_TYPES:
+        try:
+            # the signature is checked by the view; here the id only picks a database
+            claims = jwt.decode(token, options={'verify_signature': False})
+        except jwt.InvalidTokenError:
+            return None
+        user_id = claims.get(api_settings.USER_ID_CLAIM)
+        return f'user:{user_id}' if user_id is not None else None
+    session = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session:
+        return 'session:' + hashlib.blake2b(session.encode(), digest_size=12).hexdigest()
+    return None
+
+
+def sticky_key(client):
+    return f'replicas:sticky:{client}'
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside this block."""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    state.pinned += 1
+    try:
+        yield
+    finally:
+        state.pinned -= 1
+
+
+class ReplicaHealth:
+    """Per-process view of which replicas can take reads."""
+
+    def __init__(self):
+        self.status = {}  # alias -> (checked_at, healthy, lag)
+        self.lock = threading.Lock()
+        self.turn = itertools.count()
+
+    def record(self, alias, lag=0.0, error=None):
+        healthy = error is None and lag <= settings.REPLICA_MAX_LAG_SECONDS
+        previous = self.status.get(alias)
+        if previous is None or previous[1] != healthy:
+            if healthy:
+                logger.info('replica %s in rotation (lag %.1fs)', alias, lag)
+            else:
+                logger.warning('replica %s out of rotation: %s', alias, error or f'lag {lag:.1f}s')
+        self.status[alias] = (time.monotonic(), healthy, lag)
+
+    def check(self, alias):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(PG_LAG_SQL if connection.vendor == 'postgresql' else 'SELECT 0')
+                lag = float(cursor.fetchone()[0] or 0)
+        except DatabaseError as exc:
+            try:
+                connection.close()
+            except DatabaseError:
+                pass
+            self.record(alias, error=exc)
+        else:
+            self.record(alias, lag)
+
+    def healthy(self, aliases):
+        now = time.monotonic()
+        due = [alias for alias in aliases
+               if now - self.status.get(alias, (float('-inf'),))[0] >= settings.REPLICA_CHECK_INTERVAL]
+        # one thread checks; the others go on with the last known status meanwhile
+        if due and self.lock.acquire(blocking=False):
+            try:
+                for alias in due:
+                    self.check(alias)
+            finally:
+                self.lock.release()
+        return [alias for alias in aliases if self.status.get(alias, (0, False))[1]]
+
+    def pick(self, aliases):
+        healthy = self.healthy(aliases)
+        return healthy[next(self.turn) % len(healthy)] if healthy else None
+
+
+health = ReplicaHealth()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.may_use_replica() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return health.pick(settings.DATABASE_REPLICAS) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """Routing state for ``ReplicaRouter``, and the sticky mark after a write."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = RoutingState(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        key = self._sticky_key(state)
+        if key:
+            cache.set(key, 1, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        state = RoutingState(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        key = self._sticky_key(state)
+        if key:
+            await cache.aset(key, 1, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    @staticmethod
+    def _sticky_key(state):
+        if not state.wrote:
+            return None
+        client = state.client_key()
+        return sticky_key(client) if client else None
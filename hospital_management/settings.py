@@ -27,6 +27,8 @@ INSTALLED_APPS = [
     'appointments',
     'billing',
     'prescriptions',
+    'archive',
+    'reports',
     'drf_yasg',
 ]
 
@@ -43,19 +45,27 @@ CACHES = {
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'users.authentication.ClaimsJWTAuthentication',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'hospital_management.pagination.KeysetPagination',
+    'DEFAULT_THROTTLE_CLASSES': ('hospital_management.throttling.BucketThrottle',),
+    # proxies in front of the app; X-Forwarded-For is only read past 0, so clients can't pick their throttle address
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
 }
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=10),
-    "REFRESH_TOKEN_LIFETIME": timedelta(days=1)
+    "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.ClaimsTokenRefreshSerializer",
 }
 
 MIDDLEWARE = [
+    'hospital_management.middleware.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'hospital_management.throttling.AdmissionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -64,6 +74,61 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# ASGI deployment (uvicorn, see dockerfile). WhiteNoise only runs sync, which would
+# push every request through a thread; asgi.py serves static files instead.
+ASGI_MODE = os.getenv('ASGI_MODE', 'False') == 'True'
+if ASGI_MODE:
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+# async versions of the read endpoints (hospital_management/async_views.py)
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', str(ASGI_MODE)) == 'True'
+
+# /api/events/ stream (hospital_management/events.py). The backend defaults to a Redis
+# stream when the cache is Redis, otherwise an in-process bus ('redis' or 'memory').
+EVENTS_BACKEND = os.getenv('EVENTS_BACKEND') or None
+EVENTS_BACKLOG = int(os.getenv('EVENTS_BACKLOG', '10000'))               # events kept for Last-Event-ID resumes
+EVENTS_SUBSCRIBER_BUFFER = int(os.getenv('EVENTS_SUBSCRIBER_BUFFER', '500'))  # undelivered events before a stream is dropped
+
+# Reminders and no-shows (appointments/reminders.py, `manage.py run_scheduler`)
+# only prints outside DEBUG if asked to: the scheduler stamps whatever the backend accepted as sent
+NOTIFICATION_BACKEND = os.getenv(
+    'NOTIFICATION_BACKEND', f"appointments.notifications.{'ConsoleBackend' if DEBUG else 'EmailBackend'}")
+NOTIFICATION_FILE_PATH = os.getenv('NOTIFICATION_FILE_PATH', str(BASE_DIR / 'notifications.log'))  # FileBackend
+NO_SHOW_GRACE_MINUTES = int(os.getenv('NO_SHOW_GRACE_MINUTES', '30'))  # after the slot ends
+# EmailBackend sends through Django's mail connection
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'False') == 'True'
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'webmaster@localhost')
+
+# Admission control (hospital_management/throttling.py). Rates are 'requests/period' (s, min, hour, day)
+# per endpoint class and role ('anon' without a token, '*' for any other role).
+ADMISSION_MAX_CONCURRENCY = int(os.getenv('ADMISSION_MAX_CONCURRENCY', '64'))  # requests in progress per worker; 0: no cap
+THROTTLE_ENABLED = os.getenv('THROTTLE_ENABLED', 'True') == 'True'
+THROTTLE_BACKEND = os.getenv('THROTTLE_BACKEND') or None  # 'redis' or 'memory'; by default Redis when the cache is
+THROTTLE_RATES = {  # each client's own buckets
+    'list': {'patient': '60/min', 'doctor': '120/min', 'admin': '600/min'},
+    'read': {'*': '600/min'},
+    'booking': {'patient': '20/min', 'admin': '300/min'},
+    'write': {'*': '120/min', 'anon': '30/min'},
+    'login': {'anon': '10/min'},
+    'register': {'anon': '5/hour'},
+}
+THROTTLE_ROLE_RATES = {  # buckets shared by everyone with the role
+    'list': {'patient': '3000/min'},
+    'booking': {'patient': '1200/min'},
+}
+THROTTLE_LOGIN_USERNAME_RATE = '5/min'  # login attempts per username, from any address
+
+# Idempotency-Key on create endpoints (hospital_management/idempotency.py)
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '86400'))                      # seconds a response is kept for retries
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', '60'))       # longest a first attempt holds the key
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '2'))      # a duplicate in flight waits this long, then 409
+
+# Closed appointments older than this move to the archive tables (`manage.py archive_appointments`)
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '730'))
+
 ROOT_URLCONF = 'hospital_management.urls'
 
 TEMPLATES = [
@@ -91,6 +156,23 @@ DATABASES = {
     )
 }
 
+# Read replicas (hospital_management/replicas.py): comma-separated URLs, added as replica_1, replica_2, ...
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '5'))  # replicas further behind get no reads
+REPLICA_CHECK_INTERVAL = float(os.getenv('REPLICA_CHECK_INTERVAL', '5'))    # seconds between checks, per process
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '15'))     # reads stay on the primary after a write
+DATABASE_REPLICAS = []
+for n, url in enumerate(DATABASE_REPLICA_URLS, 1):
+    replica = dj_database_url.parse(url, conn_max_age=600)
+    if replica['ENGINE'].endswith('postgresql'):
+        replica.setdefault('OPTIONS', {}).setdefault('connect_timeout', 2)  # a dead replica must fail fast
+    replica['TEST'] = {'MIRROR': 'default'}
+    DATABASES[f'replica_{n}'] = replica
+    DATABASE_REPLICAS.append(f'replica_{n}')
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['hospital_management.replicas.ReplicaRouter']
+    MIDDLEWARE.insert(1, 'hospital_management.replicas.ReplicaMiddleware')
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -104,4 +186,31 @@ USE_I18N = True
 USE_TZ = True
 
 STATIC_URL = 'static/'
-STATIC_ROOT = BASE_DIR / 'staticfiles'
\ No newline at end of file
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+# OpenAPI schema (hospital_management/openapi.py): `manage.py build_openapi` writes it here, served as static/openapi/
+OPENAPI_DIR = BASE_DIR / 'openapi'
+STATICFILES_DIRS = [('openapi', OPENAPI_DIR)] if OPENAPI_DIR.is_dir() else []
+OPENAPI_LIVE = os.getenv('OPENAPI_LIVE', str(DEBUG)) == 'True'  # regenerate per request with drf_yasg instead
+# Per-request instrumentation (hospital_management.middleware.PerformanceMiddleware)
+PERF_SERVER_TIMING = os.getenv('PERF_SERVER_TIMING', str(DEBUG)) == 'True'  # exposes DB time and query counts
+PERF_PROFILE_SAMPLE_RATE = float(os.getenv('PERF_PROFILE_SAMPLE_RATE', '0'))  # fraction run under cProfile
+PERF_PROFILE_DIR = os.getenv('PERF_PROFILE_DIR')  # .prof files go here; otherwise the top entries are logged
+PERF_SLOW_REQUEST_MS = int(os.getenv('PERF_SLOW_REQUEST_MS', '0'))  # 0 disables slow logging and stack sampling
+PERF_STACK_SAMPLE_INTERVAL_MS = 20
+PERF_DUPLICATE_QUERY_THRESHOLD = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # INFO logs every request; WARNING only slow requests and likely N+1s
+        'hospital_management.performance': {
+            'handlers': ['console'],
+            'level': os.getenv('PERF_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
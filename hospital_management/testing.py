@@ -0,0 +1,76 @@
+"""Shared test fixtures."""
+from datetime import date, timedelta
+
+from django.utils import timezone
+from rest_framework import serializers
+
+from appointments.models import Appointment
+from users.models import User, Doctor, Patient
+
+# Queries a single list request may issue, regardless of the number of rows.
+# Authentication is forced in these tests, so this is the view's own budget.
+LIST_QUERY_BUDGET = 1
+
+
+def as_json_datetime(value):
+    return serializers.DateTimeField().to_representation(value)
+
+
+class ListQueryBudgetMixin:
+    """
+    One doctor, one patient and ``row_count`` completed appointments between
+    them, each given a row by ``create_row``. The list at ``url`` must come back
+    in one query for every role, with rows shaped like ``expected_row``.
+    """
+    url = None
+    row_count = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='x', role='admin')
+        doctor_user = User.objects.create_user(
+            username='dr_house', password='x', role='doctor', first_name='Gregory', last_name='House')
+        cls.doctor = Doctor.objects.create(user=doctor_user, specialization='general', consultation_fee=500)
+        patient_user = User.objects.create_user(
+            username='patient_a', password='x', role='patient', first_name='Anna', last_name='Rao')
+        cls.patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1))
+
+        now = timezone.now()
+        cls.rows = []
+        for i in range(cls.row_count):
+            appointment = Appointment.objects.create(
+                doctor=cls.doctor, patient=cls.patient,
+                appointment_date=now - timedelta(days=i), status='completed')
+            cls.rows.append(cls.create_row(appointment))
+
+    @classmethod
+    def create_row(cls, appointment):
+        raise NotImplementedError
+
+    def expected_row(self, row):
+        """``row`` (from ``create_row``) as the list serializes it."""
+        raise NotImplementedError
+
+    def assert_list_within_budget(self, user, params=''):
+        self.client.force_authenticate(user)
+        with self.assertNumQueries(LIST_QUERY_BUDGET):
+            response = self.client.get(f'{self.url}{params}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_admin_list_is_constant_query_count(self):
+        rows = self.assert_list_within_budget(self.admin)
+        self.assertEqual(rows, [self.expected_row(row) for row in self.rows])
+
+    def test_doctor_list_is_constant_query_count(self):
+        rows = self.assert_list_within_budget(self.doctor.user)
+        self.assertEqual(len(rows), self.row_count)
+
+    def test_patient_list_is_constant_query_count(self):
+        rows = self.assert_list_within_budget(self.patient.user)
+        self.assertEqual(len(rows), self.row_count)
+
+    def test_paginated_list_is_constant_query_count(self):
+        page = self.assert_list_within_budget(self.admin, '?page_size=5')
+        self.assertEqual(page['results'], [self.expected_row(row) for row in self.rows[:5]])
+        self.assertIsNotNone(page['next'])
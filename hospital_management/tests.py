@@ -0,0 +1,120 @@
+import time
+from datetime import date, timedelta
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from appointments.models import Appointment
+from users.models import User, Doctor, Patient
+from users.serializers import ClaimsTokenObtainPairSerializer
+from . import replicas
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'], REPLICA_CHECK_INTERVAL=3600,
+                   REPLICA_MAX_LAG_SECONDS=5, REPLICA_STICKY_SECONDS=15)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Routing decisions only; the test database has no replicas to read from."""
+    users = (1, 2)
+
+    def setUp(self):
+        self.addCleanup(cache.delete_many, [replicas.sticky_key(f'user:{user}') for user in self.users])
+        now = time.monotonic()
+        replicas.health.status = {'replica_1': (now, True, 0.0), 'replica_2': (now, True, 0.0)}
+        self.addCleanup(setattr, replicas.health, 'status', {})
+        self.router = replicas.ReplicaRouter()
+
+    def request(self, user_id, method='get', write=False):
+        """Run a request through the middleware; returns the databases its reads went to."""
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(Appointment))
+            if write:
+                self.router.db_for_write(Appointment)
+                reads.append(self.router.db_for_read(Appointment))
+            return HttpResponse()
+
+        token = AccessToken()
+        token['user_id'] = str(user_id)
+        request = getattr(RequestFactory(), method)('/', headers={'Authorization': f'Bearer {token}'})
+        replicas.ReplicaMiddleware(view)(request)
+        return reads
+
+    def test_safe_requests_read_from_the_replicas_in_turn(self):
+        reads = self.request(self.users[0]) + self.request(self.users[0])
+        self.assertEqual(set(reads), {'replica_1', 'replica_2'})
+        self.assertEqual(self.request(self.users[0], method='post'), ['default'])
+        self.assertEqual(self.router.db_for_read(Appointment), 'default')  # outside a request
+
+    def test_a_client_reads_its_own_writes(self):
+        self.assertEqual(self.request(self.users[0], write=True)[1], 'default')
+        self.assertEqual(self.request(self.users[0]), ['default'])
+        self.assertNotEqual(self.request(self.users[1]), ['default'])
+        cache.delete(replicas.sticky_key(f'user:{self.users[0]}'))  # the sticky window has passed
+        self.assertNotEqual(self.request(self.users[0]), ['default'])
+
+    def test_lagging_or_failing_replicas_leave_the_rotation(self):
+        replicas.health.record('replica_1', lag=30.0)
+        self.assertEqual({self.request(self.users[0])[0] for _ in range(4)}, {'replica_2'})
+        replicas.health.record('replica_2', error=DatabaseError('connection refused'))
+        self.assertEqual(self.request(self.users[0]), ['default'])
+
+
+@skipUnless(settings.DATABASE_REPLICAS, 'needs DATABASE_REPLICA_URLS, e.g. a copy of the SQLite database')
+@override_settings(THROTTLE_ENABLED=False, REPLICA_CHECK_INTERVAL=3600)
+class ReplicaDatabaseTests(APITransactionTestCase):
+    """
+    Against the first configured replica, which mirrors the test database. Not a
+    TestCase: the router keeps reads inside a transaction on the primary.
+    """
+    databases = {'default', *settings.DATABASE_REPLICAS[:1]}
+
+    def setUp(self):
+        replicas.health.status = {}
+        self.addCleanup(setattr, replicas.health, 'status', {})
+        self.admin = User.objects.create_user(username='admin', password='x', role='admin')
+        doctor = Doctor.objects.create(user=User.objects.create_user(username='doc', password='x', role='doctor'),
+                                       specialization='general', consultation_fee=500)
+        patient = Patient.objects.create(user=User.objects.create_user(username='pat', password='x', role='patient'),
+                                         date_of_birth=date(1990, 1, 1))
+        self.appointment = Appointment.objects.create(
+            doctor=doctor, patient=patient, appointment_date=timezone.now() + timedelta(days=1))
+        token = ClaimsTokenObtainPairSerializer.get_token(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.addCleanup(cache.delete, replicas.sticky_key(f'user:{self.admin.pk}'))
+
+    def request(self, method, url, data=None):
+        """Returns the response and the number of queries each database ran for it."""
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[settings.DATABASE_REPLICAS[0]]) as replica:
+            response = getattr(self.client, method)(url, data, format='json')
+        return response, len(primary), len(replica)
+
+    def test_reads_go_to_the_replica(self):
+        response, primary, replica = self.request('get', '/api/appointments/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data], [self.appointment.pk])
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_reads_stay_on_the_primary_after_a_write(self):
+        url = f'/api/appointments/{self.appointment.pk}/'
+        response, primary, replica = self.request('patch', url, {'notes': 'bring the referral'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replica, 0)
+        response, primary, replica = self.request('get', url)
+        self.assertEqual(response.data['notes'], 'bring the referral')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        cache.delete(replicas.sticky_key(f'user:{self.admin.pk}'))  # the sticky window has passed
+        response, primary, replica = self.request('get', url)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
@@ -0,0 +1,298 @@
+"""
+Admission control: a per-worker concurrency cap and token-bucket throttling.
+
+``AdmissionMiddleware`` counts the requests a worker process is handling.
+Past ``ADMISSION_MAX_CONCURRENCY`` it answers ``429`` with ``Retry-After``
+right away, before sessions, authentication or any query. A surge then
+queues at the clients instead of inside the worker, where it would slow down
+every request in progress.
+
+``BucketThrottle`` is DRF's default throttle. The async read views call
+``acheck`` with the same buckets. Each request falls in an endpoint class:
+
+- ``list``: an unpaged list GET, the most expensive read,
+- ``read``: any other GET,
+- ``booking``, ``login``, ``register``: writes to views whose
+  ``throttle_scope`` says so,
+- ``write``: any other write.
+
+It then takes a token from every bucket that applies, all or none:
+
+- the client's own bucket for the class: the user, or the address when
+  anonymous, with the rate ``THROTTLE_RATES`` gives the client's role. The
+  address is ``REMOTE_ADDR``, or with ``NUM_PROXIES`` trusted proxies the
+  ``X-Forwarded-For`` entry the last of them added,
+- a bucket shared by everyone with the role, if ``THROTTLE_ROLE_RATES`` has
+  one, so one role's surge can't take the whole capacity,
+- for ``login``, one per username, against guessing one account's password
+  from many addresses.
+
+A rate ``'20/min'`` is a bucket of 20 tokens that refills at 20 a minute.
+With a Redis cache the buckets live in Redis and a Lua script checks and
+takes them atomically, so the budget is shared by every worker. Otherwise,
+and whenever Redis can't be reached, ``MemoryBuckets`` keeps per-process
+buckets instead (``THROTTLE_BACKEND`` overrides the choice).
+"""
+import logging
+import math
+import threading
+import time
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework.mixins import ListModelMixin
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger('hospital_management.throttling')
+
+PAGING_PARAMS = ('cursor', 'page_size', 'limit', 'offset')
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """``'20/min'`` -> ``(20, 20 / 60)``: bucket capacity and tokens added per second."""
+    count, _, period = rate.partition('/')
+    count = int(count)
+    return count, count / PERIODS[period[0]]
+
+
+# KEYS: the buckets; ARGV: capacity and refill rate per bucket, in KEYS order.
+# Returns '0' after taking a token from every bucket, or the seconds until all have one.
+TAKE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local tokens, wait = {}, 0
+for i, key in ipairs(KEYS) do
+    local capacity, rate = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local bucket = redis.call('HMGET', key, 'tokens', 'at')
+    local level = tonumber(bucket[1]) or capacity
+    local at = tonumber(bucket[2]) or now
+    level = math.min(capacity, level + math.max(0, now - at) * rate)
+    if level < 1 then
+        wait = math.max(wait, (1 - level) / rate)
+    end
+    tokens[i] = level
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    local capacity, rate = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 'tokens', tokens[i] - 1, 'at', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000))
+end
+return '0'
+"""
+
+
+class MemoryBuckets:
+    """Token buckets in this process."""
+    prune_every = 10000  # takes between sweeps of full (idle) buckets
+
+    def __init__(self):
+        self._buckets = {}  # key -> (tokens, at)
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    def take(self, buckets):
+        """Take a token from each ``(key, rate)`` bucket; returns 0, or the seconds to wait."""
+        now = time.monotonic()
+        with self._lock:
+            levels, wait = [], 0.0
+            for key, rate in buckets:
+                capacity, refill = parse_rate(rate)
+                tokens, at = self._buckets.get(key, (capacity, now))
+                level = min(capacity, tokens + (now - at) * refill)
+                if level < 1:
+                    wait = max(wait, (1 - level) / refill)
+                levels.append(level)
+            if wait:
+                return wait
+            for (key, _), level in zip(buckets, levels):
+                self._buckets[key] = (level - 1, now)
+            self._takes += 1
+            if self._takes % self.prune_every == 0:
+                self._prune(now)
+        return 0.0
+
+    def _prune(self, now):
+        # after a day idle a bucket is full again under any rate, which is the same as no bucket
+        for key, (tokens, at) in list(self._buckets.items()):
+            if now - at > 86400:
+                del self._buckets[key]
+
+
+class RedisBuckets:
+    """Token buckets in Redis, shared by every worker, with ``fallback`` while Redis is unreachable."""
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+        self._script = None
+        self._down = False
+
+    def take(self, buckets):
+        from django_redis import get_redis_connection
+        from redis.exceptions import RedisError
+
+        try:
+            if self._script is None:
+                self._script = get_redis_connection('default').register_script(TAKE_SCRIPT)
+            args = [value for _, rate in buckets for value in parse_rate(rate)]
+            wait = float(self._script(keys=[key for key, _ in buckets], args=args))
+        except RedisError as exc:
+            if not self._down:
+                logger.warning('throttling falls back to per-process buckets: %s', exc)
+                self._down = True
+            return self.fallback.take(buckets)
+        if self._down:
+            logger.info('throttling is back on Redis')
+            self._down = False
+        return wait
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = getattr(settings, 'THROTTLE_BACKEND', None)
+            if backend is None:
+                backend = 'redis' if 'django_redis' in settings.CACHES['default']['BACKEND'] else 'memory'
+            _store = RedisBuckets(MemoryBuckets()) if backend == 'redis' else MemoryBuckets()
+        return _store
+
+
+def reset_store():
+    """Forget the buckets and the backend, so the next take re-reads the settings (tests)."""
+    global _store
+    with _store_lock:
+        _store = None
+
+
+def endpoint_class(request, view_class):
+    if request.method in SAFE_METHODS:
+        if issubclass(view_class, ListModelMixin) and not any(p in request.GET for p in PAGING_PARAMS):
+            return 'list'
+        return 'read'
+    return getattr(view_class, 'throttle_scope', None) or 'write'
+
+
+def _rate(table, endpoint, role):
+    rates = table.get(endpoint, {})
+    return rates.get(role, rates.get('*'))
+
+
+def buckets_for(user, endpoint, ident, username=None):
+    """The ``(key, rate)`` buckets a request in ``endpoint`` takes from."""
+    if user is not None and user.is_authenticated:
+        role, client = user.role, f'user:{user.pk}'
+    else:
+        role, client = 'anon', f'ip:{ident}'
+    buckets = []
+    rate = _rate(settings.THROTTLE_RATES, endpoint, role)
+    if rate:
+        buckets.append((f'throttle:{endpoint}:{client}', rate))
+    shared = _rate(settings.THROTTLE_ROLE_RATES, endpoint, role)
+    if shared:
+        buckets.append((f'throttle:{endpoint}:role:{role}', shared))
+    if endpoint == 'login' and username:
+        buckets.append((f'throttle:login:username:{username.lower()}', settings.THROTTLE_LOGIN_USERNAME_RATE))
+    return buckets
+
+
+class BucketThrottle(BaseThrottle):
+    def allow_request(self, request, view):
+        self.delay = 0.0
+        if not settings.THROTTLE_ENABLED or getattr(request, 'throttle_checked', False):
+            return True  # the async view in front of this one already took the tokens
+        endpoint = endpoint_class(request, type(view))
+        username = None
+        if endpoint == 'login' and hasattr(request.data, 'get'):
+            username = request.data.get('username')
+        buckets = buckets_for(request.user, endpoint, self.get_ident(request), username)
+        if buckets:
+            self.delay = get_store().take(buckets)
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+
+async def acheck(request, user, view_class):
+    """``BucketThrottle`` for the async views: None, or a ``429`` response."""
+    if not settings.THROTTLE_ENABLED:
+        return None
+    buckets = buckets_for(user, endpoint_class(request, view_class), BaseThrottle().get_ident(request))
+    if not buckets:
+        return None
+    store = get_store()
+    if isinstance(store, MemoryBuckets):
+        delay = store.take(buckets)  # no I/O, so no thread hop
+    else:
+        delay = await sync_to_async(store.take, thread_sensitive=False)(buckets)
+    request.throttle_checked = True
+    if not delay:
+        return None
+    return too_many_requests(f'Request was throttled. Expected available in {math.ceil(delay)} seconds.', delay)
+
+
+def too_many_requests(detail, retry_after):
+    return JsonResponse({'detail': detail}, status=429, headers={'Retry-After': str(math.ceil(retry_after))})
+
+
+class AdmissionMiddleware:
+    """Turns requests away with ``429`` while the worker is at ``ADMISSION_MAX_CONCURRENCY``."""
+    sync_capable = True
+    async_capable = True
+    retry_after = 1
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limit = settings.ADMISSION_MAX_CONCURRENCY
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self._enter():
+            return self._busy()
+        try:
+            return self.get_response(request)
+        finally:
+            self._leave()
+
+    async def __acall__(self, request):
+        if not self._enter():
+            return self._busy()
+        try:
+            return await self.get_response(request)
+        finally:
+            self._leave()
+
+    def _enter(self):
+        if not self.limit:
+            return True
+        with self.lock:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def _leave(self):
+        if self.limit:
+            with self.lock:
+                self.in_flight -= 1
+
+    def _busy(self):
+        return too_many_requests('The server is busy, please retry shortly.', self.retry_after)
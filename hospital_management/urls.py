@@ -1,19 +1,9 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Hospital Management API",
-        default_version='v1',
-        description="API documentation for Hospital Management System",
-        contact=openapi.Contact(email="admin@hospital.com"),
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
+from . import openapi
+from .async_views import event_stream
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -21,8 +11,19 @@ urlpatterns = [
     path('api/appointments/', include('appointments.urls')),
     path('api/prescriptions/', include('prescriptions.urls')),
     path('api/billing/', include('billing.urls')),
+    path('api/reports/', include('reports.urls')),
+    path('api/events/', event_stream, name='event-stream'),
+]
 
-    # Swagger URLs
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='redoc'),
-]
\ No newline at end of file
+# Swagger URLs: the prebuilt static schema (`manage.py build_openapi`), or generated per request
+if settings.OPENAPI_LIVE:
+    schema_view = openapi.live_schema_view()
+    urlpatterns += [
+        path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='swagger-ui'),
+        path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='redoc'),
+    ]
+else:
+    urlpatterns += [
+        path('swagger/', openapi.static_page, {'page': 'swagger'}, name='swagger-ui'),
+        path('redoc/', openapi.static_page, {'page': 'redoc'}, name='redoc'),
+    ]
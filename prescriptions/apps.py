@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def restore_search_triggers(using, **kwargs):
+    from .search import ensure_sqlite_triggers
+    ensure_sqlite_triggers(connections[using])
 
 
 class PrescriptionsConfig(AppConfig):
     name = 'prescriptions'
+
+    def ready(self):
+        post_migrate.connect(restore_search_triggers, sender=self)
+        from . import signals  # noqa: F401
@@ -0,0 +1,77 @@
+"""
+Parsing of ``Prescription.medicines`` into structured line items.
+
+The free text has one medicine per line, written as
+``"<drug> [<strength>] [- <frequency>]"``:
+
+    Amlodipine 5mg - once daily
+    Aspirin 75mg - once daily
+
+Drug names are stored lower-cased so lookups and per-drug aggregates can use
+the ``(drug, prescribed_on)`` index without case folding.
+"""
+import re
+
+from django.utils import timezone
+
+UNITS = r'(?:mg|mcg|µg|g|ml|iu|units?|%)'
+LINE = re.compile(
+    rf'^(?P<drug>.+?)'
+    rf'(?:\s+(?P<strength>\d+(?:\.\d+)?\s*{UNITS}(?:/\s*\d*\s*(?:ml|g|dose|tab))?))?'
+    rf'(?:(?:\s*[:,]|\s+[-–])\s*(?P<frequency>.*))?$',
+    re.IGNORECASE,
+)
+
+
+def normalize_drug(name):
+    return ' '.join(name.split()).lower()
+
+
+def parse_line(line):
+    line = line.strip(' \t-•*')
+    if not line:
+        return None
+    match = LINE.match(line)
+    drug = normalize_drug(match['drug'])
+    if not drug:
+        return None
+    return {
+        'drug': drug[:100],
+        'strength': (match['strength'] or '').replace(' ', '')[:50],
+        'frequency': ' '.join((match['frequency'] or '').split())[:100],
+    }
+
+
+def parse_medicines(text):
+    """List of ``{drug, strength, frequency}`` dicts, in the order written."""
+    items = []
+    for line in re.split(r'[\n;]', text or ''):
+        item = parse_line(line)
+        if item is not None:
+            items.append(item)
+    return items
+
+
+def format_items(items):
+    """Inverse of ``parse_medicines``, used when the API sends items without ``medicines``."""
+    lines = []
+    for item in items:
+        line = ' '.join(part for part in (item['drug'].capitalize(), item.get('strength', '')) if part)
+        if item.get('frequency'):
+            line += f" - {item['frequency']}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def build_items(prescription, items):
+    """Unsaved ``PrescriptionItem`` rows for ``prescription`` (which must have a pk and created_at)."""
+    from .models import PrescriptionItem
+    prescribed_on = timezone.localdate(prescription.created_at)
+    return [
+        PrescriptionItem(
+            prescription_id=prescription.pk, position=position, prescribed_on=prescribed_on,
+            drug=normalize_drug(item['drug']), strength=item.get('strength', ''),
+            frequency=item.get('frequency', ''),
+        )
+        for position, item in enumerate(items)
+    ]
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from prescriptions.items import build_items, parse_medicines
+from prescriptions.models import Prescription, PrescriptionItem
+
+
+class Command(BaseCommand):
+    help = 'Parse medicines into line items for prescriptions that have none (safe to re-run)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        pending = Prescription.objects.filter(items__isnull=True).order_by('pk')
+        last_pk = 0
+        prescriptions = items = 0
+        started = time.monotonic()
+        while True:
+            # walk by pk so each batch is an index range, and a restart picks up where it stopped
+            batch = list(pending.filter(pk__gt=last_pk).values('pk', 'medicines', 'created_at')
+                         [:options['batch_size']])
+            if not batch:
+                break
+            rows = []
+            for row in batch:
+                rows += build_items(Prescription(pk=row['pk'], created_at=row['created_at']),
+                                    parse_medicines(row['medicines']))
+            with transaction.atomic():
+                PrescriptionItem.objects.bulk_create(rows)
+            last_pk = batch[-1]['pk']
+            prescriptions += len(batch)
+            items += len(rows)
+            rate = prescriptions / (time.monotonic() - started)
+            self.stdout.write(f'  {prescriptions} prescriptions, {items} items ({rate:,.0f} prescriptions/s)')
+        self.stdout.write(self.style.SUCCESS(f'✅ {items} items for {prescriptions} prescriptions'))
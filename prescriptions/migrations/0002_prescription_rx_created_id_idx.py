@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_appointment_keyset_indexes'),
+        ('prescriptions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['created_at', 'id'], name='rx_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.2 on 2026-10-18 06:10
+
+from django.db import migrations
+
+from prescriptions import search
+
+
+def install(apps, schema_editor):
+    search.install(schema_editor)
+
+
+def uninstall(apps, schema_editor):
+    search.uninstall(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescriptions', '0002_prescription_rx_created_id_idx'),
+    ]
+
+    operations = [
+        # tsvector column + GIN index on Postgres, FTS5 table + triggers on SQLite
+        migrations.RunPython(install, uninstall),
+    ]
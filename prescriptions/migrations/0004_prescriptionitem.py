@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-18 03:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescriptions', '0003_prescription_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrescriptionItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('drug', models.CharField(max_length=100)),
+                ('strength', models.CharField(blank=True, max_length=50)),
+                ('frequency', models.CharField(blank=True, max_length=100)),
+                ('prescribed_on', models.DateField()),
+                ('prescription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='prescriptions.prescription')),
+            ],
+            options={
+                'ordering': ['prescription', 'position'],
+                'indexes': [models.Index(fields=['drug', 'prescribed_on'], name='rx_item_drug_day_idx'), models.Index(fields=['prescribed_on', 'drug'], name='rx_item_day_drug_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-18 03:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescriptions', '0004_prescriptionitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prescription',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['updated_at'], name='rx_updated_idx'),
+        ),
+    ]
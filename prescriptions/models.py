@@ -1,5 +1,28 @@
-from django.db import models
+from django.db import models, transaction
 from appointments.models import Appointment
+from users.models import full_name
+
+
+class PrescriptionQuerySet(models.QuerySet):
+    row_fields = (
+        'id', 'appointment_id', 'diagnosis', 'medicines', 'instructions', 'created_at',
+        'updated_at', 'doctor_name', 'patient_name',
+    )
+
+    def list_rows(self, *extra, fields=None):
+        """
+        Flat dict rows for list responses; names are joined in the same query.
+
+        ``fields`` limits the rows to those names (see ``hospital_management.fieldsets``).
+        """
+        annotations = {
+            'doctor_name': full_name('appointment__doctor__user'),
+            'patient_name': full_name('appointment__patient__user'),
+        }
+        names = [name for name in self.row_fields if fields is None or name in fields]
+        return self.annotate(**{name: annotations[name] for name in names if name in annotations}).values(
+            *names, *extra)
+
 
 class Prescription(models.Model):
     appointment = models.OneToOneField(Appointment, on_delete=models.CASCADE, related_name='prescription')
@@ -7,6 +30,65 @@ class Prescription(models.Model):
     medicines = models.TextField()       # e.g. "Paracetamol 500mg - twice daily"
     instructions = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = PrescriptionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='rx_created_id_idx'),
+            # conditional GET validators: MAX(updated_at) per scope
+            models.Index(fields=['updated_at'], name='rx_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"Prescription for {self.appointment}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_medicines = instance.__dict__.get('medicines')
+        return instance
+
+    def save(self, *args, items=None, **kwargs):
+        """
+        Save and keep ``items`` in step with ``medicines``.
+
+        ``items`` (dicts with drug, strength, frequency) replace whatever would
+        be parsed from the text; ``medicines`` is written from them when blank.
+        """
+        from .items import build_items, format_items, parse_medicines
+        if items is not None and not self.medicines:
+            self.medicines = format_items(items)
+        changed = items is not None or self.medicines != getattr(self, '_saved_medicines', None)
+        # one transaction, so a failed item insert never leaves the row without its items
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if changed:
+                self.items.all().delete()
+                PrescriptionItem.objects.bulk_create(
+                    build_items(self, parse_medicines(self.medicines) if items is None else items))
+        if changed:
+            self._saved_medicines = self.medicines
+
+
+class PrescriptionItem(models.Model):
+    """One medicine line of a prescription, normalised for per-drug lookups."""
+    prescription = models.ForeignKey(Prescription, on_delete=models.CASCADE, related_name='items')
+    position = models.PositiveSmallIntegerField(default=0)
+    drug = models.CharField(max_length=100)      # lower-cased, e.g. "amlodipine"
+    strength = models.CharField(max_length=50, blank=True)    # e.g. "5mg"
+    frequency = models.CharField(max_length=100, blank=True)  # e.g. "once daily"
+    prescribed_on = models.DateField()            # the prescription's date, copied for the indexes below
+
+    class Meta:
+        ordering = ['prescription', 'position']
+        indexes = [
+            # "active prescriptions for drug X" and per-drug usage by day
+            models.Index(fields=['drug', 'prescribed_on'], name='rx_item_drug_day_idx'),
+            # usage of all drugs over a date range
+            models.Index(fields=['prescribed_on', 'drug'], name='rx_item_day_drug_idx'),
+        ]
 
     def __str__(self):
-        return f"Prescription for {self.appointment}"
\ No newline at end of file
+        return ' '.join(part for part in (self.drug, self.strength, self.frequency) if part)
\ No newline at end of file
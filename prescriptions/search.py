@@ -0,0 +1,146 @@
+"""
+Full-text search over a prescription's diagnosis, medicines and instructions.
+
+The index lives outside the ORM, so it is created by migration
+``0003_prescription_search`` and only reached through ``search()``:
+
+- Postgres: a stored generated ``search_vector`` tsvector column with a GIN
+  index. Diagnosis is weighted A, medicines B, instructions C. Queries use
+  ``websearch_to_tsquery`` and ``ts_rank_cd``.
+- SQLite: an external-content FTS5 table kept in sync by triggers. Queries use
+  ``MATCH`` and ``bm25`` with the same weighting.
+- Anything else falls back to unranked ``icontains``.
+
+``rank`` is higher-is-better on every backend.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+TABLE = 'prescriptions_prescription'
+FTS_TABLE = 'prescriptions_prescription_fts'
+CONFIG = 'english'
+
+POSTGRES_INSTALL = [
+    f"""
+    ALTER TABLE {TABLE} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('{CONFIG}', coalesce(diagnosis, '')), 'A') ||
+        setweight(to_tsvector('{CONFIG}', coalesce(medicines, '')), 'B') ||
+        setweight(to_tsvector('{CONFIG}', coalesce(instructions, '')), 'C')
+    ) STORED
+    """,
+    f"CREATE INDEX rx_search_idx ON {TABLE} USING gin (search_vector)",
+]
+POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS rx_search_idx",
+    f"ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS rx_fts_insert AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, diagnosis, medicines, instructions)
+        VALUES (new.id, new.diagnosis, new.medicines, new.instructions);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS rx_fts_delete AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, diagnosis, medicines, instructions)
+        VALUES ('delete', old.id, old.diagnosis, old.medicines, old.instructions);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS rx_fts_update AFTER UPDATE OF diagnosis, medicines, instructions ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, diagnosis, medicines, instructions)
+        VALUES ('delete', old.id, old.diagnosis, old.medicines, old.instructions);
+        INSERT INTO {FTS_TABLE}(rowid, diagnosis, medicines, instructions)
+        VALUES (new.id, new.diagnosis, new.medicines, new.instructions);
+    END
+    """,
+]
+SQLITE_INSTALL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        diagnosis, medicines, instructions,
+        content='{TABLE}', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    *SQLITE_TRIGGERS,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS rx_fts_insert",
+    "DROP TRIGGER IF EXISTS rx_fts_delete",
+    "DROP TRIGGER IF EXISTS rx_fts_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def install(schema_editor):
+    vendor = schema_editor.connection.vendor
+    for sql in {'postgresql': POSTGRES_INSTALL, 'sqlite': SQLITE_INSTALL}.get(vendor, []):
+        schema_editor.execute(sql)
+
+
+def uninstall(schema_editor):
+    vendor = schema_editor.connection.vendor
+    for sql in {'postgresql': POSTGRES_UNINSTALL, 'sqlite': SQLITE_UNINSTALL}.get(vendor, []):
+        schema_editor.execute(sql)
+
+
+def ensure_sqlite_triggers(connection):
+    """
+    Recreate the FTS triggers if a migration dropped them.
+
+    The SQLite schema editor rebuilds a table (copy, drop, rename) for most
+    column changes, and dropping the old table drops its triggers with it.
+    Runs after every ``migrate``. If any trigger was missing, the index is
+    rebuilt, because writes since the rebuild were not indexed.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE 'rx_fts_%%' "
+                       "OR name = %s", [FTS_TABLE])
+        present = {name for name, in cursor.fetchall()}
+        if FTS_TABLE not in present or len(present) == len(SQLITE_TRIGGERS) + 1:
+            return
+        for sql in SQLITE_TRIGGERS:
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def terms(text):
+    return re.findall(r'\w+', text or '')
+
+
+def search(queryset, text):
+    """Filter ``queryset`` to prescriptions matching ``text`` and annotate ``rank``."""
+    words = terms(text)
+    if not words:
+        return queryset.none()
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = "websearch_to_tsquery(%s::regconfig, %s)"
+        return queryset.filter(
+            RawSQL(f'"{TABLE}"."search_vector" @@ {tsquery}', [CONFIG, text], output_field=BooleanField())
+        ).annotate(
+            rank=RawSQL(f'ts_rank_cd("{TABLE}"."search_vector", {tsquery})', [CONFIG, text],
+                        output_field=FloatField()),
+        )
+    if vendor == 'sqlite':
+        # every word must match; quoting makes FTS5 treat punctuation and keywords literally.
+        # bm25() only works in the query that does the MATCH, hence a join rather than a subquery.
+        match = ' '.join(f'"{word}"' for word in words)
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = "{TABLE}"."id"', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+            select={'rank': f'-bm25({FTS_TABLE}, 10.0, 5.0, 1.0)'},
+        )
+    condition = Q()
+    for word in words:
+        condition &= Q(diagnosis__icontains=word) | Q(medicines__icontains=word) | Q(instructions__icontains=word)
+    return queryset.filter(condition).annotate(rank=Value(0.0, output_field=FloatField()))
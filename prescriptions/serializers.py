@@ -1,10 +1,55 @@
 from rest_framework import serializers
-from .models import Prescription
+from hospital_management.fieldsets import SparseFieldsMixin
+from .models import Prescription, PrescriptionItem
 
-class PrescriptionSerializer(serializers.ModelSerializer):
+
+class PrescriptionItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PrescriptionItem
+        fields = ['drug', 'strength', 'frequency']
+
+
+class PrescriptionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     doctor_name = serializers.CharField(source='appointment.doctor.user.get_full_name', read_only=True)
     patient_name = serializers.CharField(source='appointment.patient.user.get_full_name', read_only=True)
+    # optional on write: parsed from ``medicines`` when omitted, and ``medicines`` is written from them when blank
+    items = PrescriptionItemSerializer(many=True, required=False)
 
     class Meta:
         model = Prescription
-        fields = ['id', 'appointment', 'diagnosis', 'medicines', 'instructions', 'created_at', 'doctor_name', 'patient_name']
\ No newline at end of file
+        fields = ['id', 'appointment', 'diagnosis', 'medicines', 'items', 'instructions', 'created_at',
+                  'doctor_name', 'patient_name']
+        extra_kwargs = {'medicines': {'required': False, 'allow_blank': True}}
+
+    def validate(self, attrs):
+        if not attrs.get('medicines') and not attrs.get('items') and self.instance is None:
+            raise serializers.ValidationError({'medicines': 'Provide medicines or items.'})
+        return attrs
+
+    def create(self, validated_data):
+        items = validated_data.pop('items', None)
+        prescription = Prescription(**validated_data)
+        prescription.save(items=items)
+        return prescription
+
+    def update(self, instance, validated_data):
+        items = validated_data.pop('items', None)
+        if items is not None and 'medicines' not in validated_data:
+            validated_data['medicines'] = ''  # rewritten from the new items
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(items=items)
+        return instance
+
+
+class PrescriptionRowSerializer(SparseFieldsMixin, serializers.Serializer):
+    """Read-only twin of PrescriptionSerializer for ``Prescription.objects.list_rows()`` dicts."""
+    id = serializers.IntegerField()
+    appointment = serializers.IntegerField(source='appointment_id')
+    diagnosis = serializers.CharField()
+    medicines = serializers.CharField()
+    instructions = serializers.CharField()
+    created_at = serializers.DateTimeField()
+    doctor_name = serializers.CharField()
+    patient_name = serializers.CharField()
+    rank = serializers.FloatField(read_only=True)  # only present in search results
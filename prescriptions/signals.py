@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from hospital_management import events
+from .models import Prescription
+
+
+# ── Change events (/api/events/) ────────────────────────
+
+@receiver(post_save, sender=Prescription)
+def publish_prescription_event(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        events.publish('prescription.added', instance.appointment, prescription=instance.pk)
@@ -1,3 +1,173 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from appointments.models import Appointment
+from hospital_management.testing import ListQueryBudgetMixin, as_json_datetime
+from users.models import User, Doctor, Patient
+from .items import parse_medicines
+from .models import Prescription, PrescriptionItem
+
+
+class PrescriptionListQueryBudgetTests(ListQueryBudgetMixin, APITestCase):
+    url = '/api/prescriptions/'
+
+    @classmethod
+    def create_row(cls, appointment):
+        return Prescription.objects.create(
+            appointment=appointment, diagnosis='Seasonal flu',
+            medicines='Paracetamol 500mg - thrice daily', instructions='Rest')
+
+    def expected_row(self, prescription):
+        return {
+            'id': prescription.pk, 'appointment': prescription.appointment_id,
+            'diagnosis': 'Seasonal flu', 'medicines': 'Paracetamol 500mg - thrice daily', 'instructions': 'Rest',
+            'created_at': as_json_datetime(prescription.created_at),
+            'doctor_name': 'Gregory House', 'patient_name': 'Anna Rao',
+        }
+
+    def test_search_is_constant_query_count(self):
+        page = self.assert_list_within_budget(self.admin, '?search=paracetamol&limit=5')
+        self.assertEqual(len(page['results']), 5)
+        self.assertIsNotNone(page['next'])
+        self.assertNotIn('count', page)
+
+    def test_sparse_fields_skip_text_columns_and_joins(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.assert_list_within_budget(self.admin, '?exclude=diagnosis,medicines,instructions')
+        self.assertEqual(set(rows[0]), {'id', 'appointment', 'created_at', 'doctor_name', 'patient_name'})
+        self.assertNotIn('diagnosis', queries[0]['sql'])
+
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.assert_list_within_budget(self.admin, '?fields=id,diagnosis')
+        self.assertEqual(rows[0], {'id': self.rows[0].pk, 'diagnosis': 'Seasonal flu'})
+        self.assertNotIn('JOIN', queries[0]['sql'])
+
+
+class PrescriptionSearchTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        patient_user = User.objects.create_user(username='patient_b', password='x', role='patient')
+        patient = Patient.objects.create(user=patient_user, date_of_birth=date(1980, 5, 1))
+        cls.doctors = []
+        for i, (diagnosis, medicines, instructions) in enumerate([
+            ('Type 2 diabetes', 'Metformin 500mg - twice daily', 'Low sugar diet'),
+            ('Routine checkup', 'Multivitamin - once daily', 'Watch for diabetes symptoms'),
+            ('Seasonal flu', 'Paracetamol 500mg', 'Rest'),
+        ]):
+            user = User.objects.create_user(username=f'dr_{i}', password='x', role='doctor')
+            doctor = Doctor.objects.create(user=user, specialization='general', consultation_fee=500)
+            cls.doctors.append(doctor)
+            appointment = Appointment.objects.create(
+                doctor=doctor, patient=patient, appointment_date=now - timedelta(days=i), status='completed')
+            Prescription.objects.create(
+                appointment=appointment, diagnosis=diagnosis, medicines=medicines, instructions=instructions)
+        cls.admin = User.objects.create_user(username='admin', password='x', role='admin')
+
+    def search(self, user, text):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/prescriptions/', {'search': text})
+        self.assertEqual(response.status_code, 200)
+        return [row['diagnosis'] for row in response.json()['results']]
+
+    def test_diagnosis_matches_rank_above_instruction_matches(self):
+        self.assertEqual(self.search(self.admin, 'diabetes'), ['Type 2 diabetes', 'Routine checkup'])
+
+    def test_search_is_scoped_to_the_doctor(self):
+        self.assertEqual(self.search(self.doctors[1].user, 'diabetes'), ['Routine checkup'])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search(self.admin, 'metformin diabetes'), ['Type 2 diabetes'])
+        self.assertEqual(self.search(self.admin, 'metformin flu'), [])
+
+    def test_index_follows_edits(self):
+        prescription = Prescription.objects.get(diagnosis='Seasonal flu')
+        prescription.medicines = 'Oseltamivir 75mg'
+        prescription.save()
+        self.assertEqual(self.search(self.admin, 'oseltamivir'), ['Seasonal flu'])
+        self.assertEqual(self.search(self.admin, 'paracetamol'), [])
+
+
+class PrescriptionItemTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        doctor_user = User.objects.create_user(username='dr_items', password='x', role='doctor')
+        cls.doctor = Doctor.objects.create(user=doctor_user, specialization='general', consultation_fee=500)
+        other_user = User.objects.create_user(username='dr_other', password='x', role='doctor')
+        other = Doctor.objects.create(user=other_user, specialization='general', consultation_fee=500)
+        patient_user = User.objects.create_user(username='patient_c', password='x', role='patient')
+        patient = Patient.objects.create(user=patient_user, date_of_birth=date(1970, 3, 1))
+        now = timezone.now()
+        cls.appointments = [
+            Appointment.objects.create(doctor=doctor, patient=patient, status='completed',
+                                       appointment_date=now - timedelta(days=i + 1))
+            for i, doctor in enumerate([cls.doctor, cls.doctor, other])
+        ]
+        Prescription.objects.create(appointment=cls.appointments[1], diagnosis='Hypertension',
+                                    medicines='Amlodipine 5mg - once daily', instructions='')
+        Prescription.objects.create(appointment=cls.appointments[2], diagnosis='Hypertension',
+                                    medicines='Amlodipine 10mg - once daily', instructions='')
+
+    def test_parse_medicines(self):
+        self.assertEqual(parse_medicines('Amlodipine 5mg - once daily\nAspirin 75 mg: after lunch\nSteam'), [
+            {'drug': 'amlodipine', 'strength': '5mg', 'frequency': 'once daily'},
+            {'drug': 'aspirin', 'strength': '75mg', 'frequency': 'after lunch'},
+            {'drug': 'steam', 'strength': '', 'frequency': ''},
+        ])
+
+    def test_items_are_parsed_on_write_and_replaced_on_edit(self):
+        prescription = Prescription.objects.get(appointment=self.appointments[1])
+        self.assertEqual(list(prescription.items.values_list('drug', 'strength')), [('amlodipine', '5mg')])
+        prescription.medicines = 'Losartan 50mg - once daily'
+        prescription.save()
+        self.assertEqual(list(prescription.items.values_list('drug', flat=True)), ['losartan'])
+
+    def test_failed_item_insert_rolls_back_the_edit(self):
+        prescription = Prescription.objects.get(appointment=self.appointments[1])
+        prescription.medicines = 'Losartan 50mg - once daily'
+        with mock.patch.object(PrescriptionItem.objects, 'bulk_create', side_effect=DatabaseError), \
+                self.assertRaises(DatabaseError):
+            prescription.save()
+        prescription.refresh_from_db()
+        self.assertEqual(prescription.medicines, 'Amlodipine 5mg - once daily')
+        self.assertEqual(list(prescription.items.values_list('drug', flat=True)), ['amlodipine'])
+
+    def test_items_accepted_from_the_api(self):
+        self.client.force_authenticate(self.doctor.user)
+        response = self.client.post('/api/prescriptions/', {
+            'appointment': self.appointments[0].pk, 'diagnosis': 'Cough', 'instructions': 'Rest',
+            'items': [{'drug': 'Dextromethorphan', 'strength': '10mg', 'frequency': 'thrice daily'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['medicines'], 'Dextromethorphan 10mg - thrice daily')
+        self.assertEqual(PrescriptionItem.objects.filter(drug='dextromethorphan').count(), 1)
+
+    def test_active_prescriptions_for_drug_are_scoped(self):
+        self.client.force_authenticate(self.doctor.user)
+        rows = self.client.get('/api/prescriptions/drugs/Amlodipine/active/').json()
+        self.assertEqual([row['appointment'] for row in rows], [self.appointments[1].pk])
+
+    def test_drug_usage_per_day(self):
+        admin = User.objects.create_user(username='admin', password='x', role='admin')
+        self.client.force_authenticate(admin)
+        results = self.client.get('/api/prescriptions/drugs/usage/', {'drug': 'amlodipine'}).json()['results']
+        self.assertEqual(sum(row['prescriptions'] for row in results), 2)
+        self.assertEqual({row['drug'] for row in results}, {'amlodipine'})
+
+    def test_bad_usage_and_window_params(self):
+        self.client.force_authenticate(self.doctor.user)
+        for param in ('from', 'to'):
+            response = self.client.get('/api/prescriptions/drugs/usage/', {param: '2026-02-30'})
+            self.assertEqual(response.status_code, 400)
+        for days in ('99999999999', '3651', '-1', 'week'):
+            response = self.client.get('/api/prescriptions/drugs/Amlodipine/active/', {'days': days})
+            self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/prescriptions/drugs/Amlodipine/active/', {'days': '3650'})
+        self.assertEqual(response.status_code, 200)
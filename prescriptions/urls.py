@@ -1,6 +1,10 @@
 from django.urls import path
-from .views import PrescriptionListCreateView
+from hospital_management.exports import ExportView
+from .views import PrescriptionListCreateView, ActiveDrugPrescriptionsView, DrugUsageView
 
 urlpatterns = [
     path('', PrescriptionListCreateView.as_view()),
+    path('export/', ExportView.as_view(dataset='prescriptions')),
+    path('drugs/usage/', DrugUsageView.as_view()),
+    path('drugs/<str:drug>/active/', ActiveDrugPrescriptionsView.as_view()),
 ]
\ No newline at end of file
@@ -1,22 +1,63 @@
+from datetime import timedelta
+
+from django.db.models import Count
+from django.utils import timezone
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import PermissionDenied, ValidationError
-from .models import Prescription
-from .serializers import PrescriptionSerializer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .items import normalize_drug
+from .models import Prescription, PrescriptionItem
+from .serializers import PrescriptionSerializer, PrescriptionRowSerializer
+from .search import search
+from hospital_management.conditional import ConditionalListMixin
+from hospital_management.fieldsets import row_names, selected_fields
+from hospital_management.idempotency import IdempotentCreateMixin
+from hospital_management.pagination import RankedPagination
+from hospital_management.params import day_param
+from users.permissions import IsAdminOrDoctor
+from users.scoping import scope_to_user
 
-class PrescriptionListCreateView(generics.ListCreateAPIView):
-    serializer_class = PrescriptionSerializer
+class PrescriptionListCreateView(IdempotentCreateMixin, ConditionalListMixin, generics.ListCreateAPIView):
+    """
+    GET lists prescriptions in ``ordering``. ``?search=`` switches to
+    full-text search, ranked best first and paged with ``limit``/``offset``.
+    """
     permission_classes = [IsAuthenticated]
+    ordering = ('created_at', 'id')
+
+    @property
+    def search_text(self):
+        if self.request.method != 'GET':
+            return None
+        return self.request.query_params.get('search')
+
+    @property
+    def pagination_class(self):
+        if self.search_text is not None:
+            return RankedPagination
+        return super().pagination_class
+
+    def get_serializer_class(self):
+        # lists are served from flat rows so the query count doesn't grow with the page
+        if self.request.method == 'GET':
+            return PrescriptionRowSerializer
+        return PrescriptionSerializer
+
+    def get_validator_queryset(self):
+        return scope_to_user(Prescription.objects.all(), self.request.user, prefix='appointment__')
 
     def get_queryset(self):
-        user = self.request.user
-        if user.role == 'admin':
-            return Prescription.objects.all()
-        elif user.role == 'doctor':
-            return Prescription.objects.filter(appointment__doctor__user=user)
-        elif user.role == 'patient':
-            return Prescription.objects.filter(appointment__patient__user=user)
-        return Prescription.objects.none()
+        queryset = self.get_validator_queryset()
+        if self.request.method != 'GET':
+            return queryset
+        fields = selected_fields(self)
+        if fields is not None:
+            fields = row_names(fields, keep=('updated_at', *self.ordering))
+        if self.search_text is not None:
+            return search(queryset, self.search_text).list_rows('rank', fields=fields).order_by('-rank', 'id')
+        return queryset.list_rows(fields=fields)
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -26,11 +67,60 @@ class PrescriptionListCreateView(generics.ListCreateAPIView):
         appointment = serializer.validated_data.get('appointment')
         
         # Ensure the doctor is writing a prescription for their own appointment
-        if user.role == 'doctor' and appointment.doctor.user != user:
+        if user.role == 'doctor' and appointment.doctor.user_id != user.id:
             raise PermissionDenied("You can only write prescriptions for your own appointments.")
             
         # Check if prescription already exists
         if hasattr(appointment, 'prescription'):
             raise ValidationError("A prescription already exists for this appointment.")
             
-        serializer.save()
\ No newline at end of file
+        serializer.save()
+
+class ActiveDrugPrescriptionsView(generics.ListAPIView):
+    """
+    Prescriptions containing ``drug`` written in the last ``?days=`` days
+    (default 30, at most ``max_days``), scoped like the prescription list.
+    """
+    permission_classes = [IsAdminOrDoctor]
+    serializer_class = PrescriptionRowSerializer
+    ordering = ('created_at', 'id')
+    max_days = 3650
+
+    def get_queryset(self):
+        days = self.request.query_params.get('days', '30')
+        if not days.isdigit() or int(days) > self.max_days:
+            raise ValidationError({'days': f'Must be a whole number of days, at most {self.max_days}.'})
+        since = timezone.localdate() - timedelta(days=int(days))
+        matching = PrescriptionItem.objects.filter(
+            drug=normalize_drug(self.kwargs['drug']), prescribed_on__gte=since,
+        ).values('prescription_id')
+        queryset = Prescription.objects.filter(pk__in=matching)
+        return scope_to_user(queryset, self.request.user, prefix='appointment__').list_rows()
+
+
+class DrugUsageView(APIView):
+    """
+    Prescriptions per drug per day, over ``?from=`` / ``?to=`` (inclusive,
+    default: the last 30 days). Use ``?drug=`` for a single drug.
+    """
+    permission_classes = [IsAdminOrDoctor]
+
+    def get(self, request):
+        today = timezone.localdate()
+        start = day_param(request, 'from', today - timedelta(days=30))
+        end = day_param(request, 'to', today)
+        items = PrescriptionItem.objects.filter(prescribed_on__gte=start, prescribed_on__lte=end)
+        if request.query_params.get('drug'):
+            items = items.filter(drug=normalize_drug(request.query_params['drug']))
+        items = scope_to_user(items, request.user, prefix='prescription__appointment__')
+        rows = (items.values('prescribed_on', 'drug')
+                .annotate(prescriptions=Count('prescription_id', distinct=True))
+                .order_by('prescribed_on', 'drug'))
+        return Response({
+            'from': start,
+            'to': end,
+            'results': [
+                {'day': row['prescribed_on'], 'drug': row['drug'], 'prescriptions': row['prescriptions']}
+                for row in rows
+            ],
+        })
@@ -0,0 +1,5 @@
+from django.contrib import admin
+
+from .models import DailyAppointments, DailyRevenue
+admin.site.register(DailyAppointments)
+admin.site.register(DailyRevenue)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.models import DailyAppointments, DailyRevenue
+from reports.summary import diff, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily revenue and appointment summary tables, then verify them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify-only', action='store_true',
+                            help='Only compare the tables against the source data')
+
+    def handle(self, *args, **options):
+        drifted = False
+        for model in (DailyAppointments, DailyRevenue):
+            name = model._meta.verbose_name_plural
+            if not options['verify_only']:
+                rebuild(model)
+                self.stdout.write(f'✅ {name} rebuilt')
+            mismatches = diff(model)
+            for key, (stored, computed) in sorted(mismatches.items(), key=str)[:20]:
+                self.stdout.write(f'  {key}: stored={stored} computed={computed}')
+            if mismatches:
+                drifted = True
+                self.stdout.write(self.style.ERROR(f'❌ {name}: {len(mismatches)} buckets differ'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✅ {name} match the source tables'))
+        if drifted:
+            raise CommandError('Summary tables are out of date')
@@ -0,0 +1,45 @@
+# Generated by Django 6.0.2 on 2026-10-18 03:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('users', '0003_doctor_working_hours'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAppointments',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.doctor')),
+            ],
+            options={
+                'verbose_name_plural': 'daily appointments',
+                'constraints': [models.UniqueConstraint(fields=('day', 'doctor', 'status'), name='daily_appointments_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.doctor')),
+            ],
+            options={
+                'verbose_name_plural': 'daily revenue',
+                'constraints': [models.UniqueConstraint(fields=('day', 'doctor', 'status'), name='daily_revenue_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import models
+from users.models import Doctor
+
+
+class DailyAppointments(models.Model):
+    """Number of appointments per (day, doctor, status); maintained by reports.signals."""
+    day = models.DateField()
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'daily appointments'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'doctor', 'status'], name='daily_appointments_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} doctor={self.doctor_id} {self.status}: {self.count}"
+
+
+class DailyRevenue(models.Model):
+    """Invoice count and amount per (issue day, doctor, status); maintained by reports.signals."""
+    day = models.DateField()
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = 'daily revenue'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'doctor', 'status'], name='daily_revenue_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} doctor={self.doctor_id} {self.status}: {self.amount}"
@@ -0,0 +1,94 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from appointments.models import Appointment
+from appointments.signals import appointments_bulk_created, appointments_bulk_updated
+from billing.models import Invoice
+from billing.signals import invoices_bulk_created
+from .models import DailyAppointments, DailyRevenue
+from .summary import bump, refresh
+
+
+# ── Appointments ────────────────────────────────────────
+
+def _appointment_key(appointment_date, doctor_id, status):
+    return timezone.localdate(appointment_date), doctor_id, status
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_appointment(sender, instance, raw=False, **kwargs):
+    instance._report_previous = None
+    if instance.pk and not raw:
+        previous = Appointment.objects.filter(pk=instance.pk).values_list(
+            'appointment_date', 'doctor_id', 'status').first()
+        if previous:
+            instance._report_previous = _appointment_key(*previous)
+
+
+@receiver(post_save, sender=Appointment)
+def count_appointment(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_report_previous', None)
+    current = _appointment_key(instance.appointment_date, instance.doctor_id, instance.status)
+    if previous == current:
+        return
+    if previous:
+        bump(DailyAppointments, *previous, -1)
+    bump(DailyAppointments, *current, 1)
+
+
+@receiver(post_delete, sender=Appointment)
+def uncount_appointment(sender, instance, **kwargs):
+    bump(DailyAppointments, *_appointment_key(instance.appointment_date, instance.doctor_id, instance.status), -1)
+
+
+@receiver([appointments_bulk_created, appointments_bulk_updated], sender=Appointment)
+def refresh_appointment_buckets(sender, instances, **kwargs):
+    refresh(DailyAppointments, {(timezone.localdate(a.appointment_date), a.doctor_id) for a in instances})
+
+
+# ── Invoices ────────────────────────────────────────────
+
+@receiver(pre_save, sender=Invoice)
+def remember_invoice(sender, instance, raw=False, **kwargs):
+    instance._report_previous = None
+    if instance.pk and not raw:
+        previous = Invoice.objects.filter(pk=instance.pk).values_list(
+            'issued_at', 'appointment__doctor_id', 'status', 'amount').first()
+        if previous:
+            issued_at, doctor_id, status, amount = previous
+            instance._report_previous = (timezone.localdate(issued_at), doctor_id, status, amount)
+
+
+def _invoice_contribution(invoice):
+    doctor_id = Appointment.objects.values_list('doctor_id', flat=True).get(pk=invoice.appointment_id)
+    return timezone.localdate(invoice.issued_at), doctor_id, invoice.status, invoice.amount
+
+
+@receiver(post_save, sender=Invoice)
+def count_invoice(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_report_previous', None)
+    day, doctor_id, status, amount = _invoice_contribution(instance)
+    if previous == (day, doctor_id, status, amount):
+        return
+    if previous:
+        bump(DailyRevenue, *previous[:3], -1, -previous[3])
+    bump(DailyRevenue, day, doctor_id, status, 1, amount)
+
+
+@receiver(post_delete, sender=Invoice)
+def uncount_invoice(sender, instance, **kwargs):
+    day, doctor_id, status, amount = _invoice_contribution(instance)
+    bump(DailyRevenue, day, doctor_id, status, -1, -amount)
+
+
+@receiver(invoices_bulk_created, sender=Invoice)
+def refresh_invoice_buckets(sender, instances, **kwargs):
+    appointment_ids = [invoice.appointment_id for invoice in instances]
+    doctors = dict(Appointment.objects.filter(pk__in=appointment_ids).values_list('id', 'doctor_id'))
+    refresh(DailyRevenue, {
+        (timezone.localdate(invoice.issued_at), doctors[invoice.appointment_id]) for invoice in instances})
@@ -0,0 +1,113 @@
+"""
+Summary-table maintenance.
+
+Single-row saves apply deltas: the row's old contribution is subtracted and
+the new one added, each as an ``UPDATE ... SET count = count + n``. Bulk
+writes recompute only the (day, doctor) buckets they touched, from the
+source tables. ``rebuild`` recomputes everything and ``diff`` reports drift.
+
+The source tables are read through the hot + archive views
+(``archive.models.AppointmentRecord`` / ``InvoiceRecord``), so archiving
+rows doesn't change any total.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from archive.models import AppointmentRecord, InvoiceRecord
+from .models import DailyAppointments, DailyRevenue
+
+
+def bump(model, day, doctor_id, status, count, amount=None):
+    key = {'day': day, 'doctor_id': doctor_id, 'status': status}
+    changes = {'count': F('count') + count}
+    if amount is not None:
+        changes['amount'] = F('amount') + amount
+    if model.objects.filter(**key).update(**changes) or count < 0:
+        # a missing bucket can't be decremented (e.g. it was cascade-deleted with its doctor)
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, count=count, **({'amount': amount} if amount is not None else {}))
+    except IntegrityError:
+        # another writer created the bucket first
+        model.objects.filter(**key).update(**changes)
+
+
+def appointment_rows(queryset=None):
+    """``{(day, doctor_id, status): {'count': n}}`` computed from the appointments, archived ones included."""
+    queryset = AppointmentRecord.objects.all() if queryset is None else queryset
+    rows = queryset.annotate(day=TruncDate('appointment_date')).values(
+        'day', 'doctor_id', 'status').annotate(count=Count('id')).order_by()
+    return {(row['day'], row['doctor_id'], row['status']): {'count': row['count']} for row in rows}
+
+
+def revenue_rows(queryset=None):
+    """``{(day, doctor_id, status): {'count': n, 'amount': x}}`` computed from the invoices, archived ones included."""
+    queryset = InvoiceRecord.objects.all() if queryset is None else queryset
+    rows = queryset.annotate(day=TruncDate('issued_at')).values(
+        'day', 'doctor_id', 'status').annotate(count=Count('id'), amount=Sum('amount')).order_by()
+    return {
+        (row['day'], row['doctor_id'], row['status']): {'count': row['count'], 'amount': row['amount']}
+        for row in rows
+    }
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def refresh(model, buckets):
+    """Recompute the given ``(day, doctor_id)`` buckets of ``model`` from the source table."""
+    by_day = defaultdict(set)
+    for day, doctor_id in buckets:
+        by_day[day].add(doctor_id)
+    with transaction.atomic():
+        for day, doctor_ids in by_day.items():
+            start, end = _day_bounds(day)
+            if model is DailyAppointments:
+                fresh = appointment_rows(AppointmentRecord.objects.filter(
+                    doctor_id__in=doctor_ids, appointment_date__gte=start, appointment_date__lt=end))
+            else:
+                fresh = revenue_rows(InvoiceRecord.objects.filter(
+                    doctor_id__in=doctor_ids, issued_at__gte=start, issued_at__lt=end))
+            model.objects.filter(day=day, doctor_id__in=doctor_ids).delete()
+            model.objects.bulk_create(
+                model(day=key[0], doctor_id=key[1], status=key[2], **values) for key, values in fresh.items())
+
+
+def stored_rows(model):
+    fields = ['count', 'amount'] if model is DailyRevenue else ['count']
+    return {
+        (row['day'], row['doctor_id'], row['status']): {field: row[field] for field in fields}
+        for row in model.objects.exclude(count=0).values('day', 'doctor_id', 'status', *fields).iterator()
+    }
+
+
+def computed_rows(model):
+    return appointment_rows() if model is DailyAppointments else revenue_rows()
+
+
+def rebuild(model, batch_size=1000):
+    with transaction.atomic():
+        model.objects.all().delete()
+        model.objects.bulk_create(
+            (model(day=key[0], doctor_id=key[1], status=key[2], **values)
+             for key, values in computed_rows(model).items()),
+            batch_size=batch_size,
+        )
+
+
+def diff(model):
+    """Buckets whose stored value differs from the source tables: ``{key: (stored, computed)}``."""
+    stored, computed = stored_rows(model), computed_rows(model)
+    return {
+        key: (stored.get(key), computed.get(key))
+        for key in stored.keys() | computed.keys()
+        if stored.get(key) != computed.get(key)
+    }
@@ -0,0 +1,86 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from rest_framework.test import APITestCase
+
+from appointments import batch
+from appointments.models import Appointment
+from billing.generation import generate_invoices
+from billing.models import Invoice
+from users.models import User, Doctor, Patient
+from .models import DailyAppointments, DailyRevenue
+from .summary import diff, rebuild
+
+
+class SummaryTableTests(APITestCase):
+    """The incrementally maintained tables must always equal a full rebuild."""
+    day = datetime(2030, 3, 4, 9, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctors = []
+        for name in ('dr_r1', 'dr_r2'):
+            user = User.objects.create_user(username=name, password='x', role='doctor')
+            cls.doctors.append(Doctor.objects.create(user=user, specialization='general', consultation_fee=400))
+        patient_user = User.objects.create_user(username='patient_r', password='x', role='patient')
+        cls.patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1))
+        cls.admin = User.objects.create_user(username='admin_r', password='x', role='admin')
+
+    def book(self, doctor, days, hours=0, status='scheduled'):
+        return Appointment.objects.create(doctor=doctor, patient=self.patient, status=status,
+                                          appointment_date=self.day + timedelta(days=days, hours=hours))
+
+    def assert_in_step(self):
+        self.assertEqual(diff(DailyAppointments), {})
+        self.assertEqual(diff(DailyRevenue), {})
+
+    def test_single_saves_and_deletes(self):
+        first, second, third = (self.book(self.doctors[0], 0), self.book(self.doctors[0], 0, 1),
+                                self.book(self.doctors[1], 1))
+        first.status = 'completed'
+        first.save()
+        second.appointment_date += timedelta(days=2)  # moves to another day's bucket
+        second.save()
+        third.doctor = self.doctors[0]
+        third.save()
+        self.assert_in_step()
+
+        invoice = Invoice.objects.create(appointment=first, amount=Decimal('400.00'))
+        other = Invoice.objects.create(appointment=second, amount=Decimal('250.00'))
+        invoice.status = 'paid'
+        invoice.amount = Decimal('380.00')
+        invoice.save()
+        other.delete()
+        second.delete()
+        self.assert_in_step()
+        self.assertEqual(DailyRevenue.objects.get(status='paid').amount, Decimal('380.00'))
+
+    def test_bulk_paths(self):
+        results = batch.create_appointments([
+            {'doctor': doctor.pk, 'appointment_date': (self.day + timedelta(days=days)).isoformat(), 'status': status}
+            for doctor, days, status in ((self.doctors[0], 0, 'completed'), (self.doctors[1], 0, 'completed'),
+                                         (self.doctors[1], 1, 'scheduled'), (self.doctors[0], 3, 'cancelled'))
+        ], patient_id=self.patient.pk)
+        self.book(self.doctors[0], 1, status='completed')
+        self.assert_in_step()
+
+        batch.update_statuses([{'id': results[2]['id'], 'status': 'completed'},
+                               {'id': results[0]['id'], 'status': 'no_show'}], self.admin)
+        self.assert_in_step()
+
+        self.assertEqual(generate_invoices(chunk_size=2)['invoiced'], 3)
+        self.assert_in_step()
+
+        rebuild(DailyAppointments)
+        rebuild(DailyRevenue)
+        self.assertEqual(DailyAppointments.objects.filter(status='completed').count(), 3)
+        self.assert_in_step()
+
+    def test_invalid_dates_are_rejected(self):
+        self.client.force_authenticate(self.admin)
+        for url in ('/api/reports/revenue/', '/api/reports/appointments/'):
+            for param, bad in (('from', '2026-02-30'), ('to', '2026-13-01'), ('from', 'yesterday')):
+                response = self.client.get(url, {param: bad})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), [f"Invalid date for '{param}': {bad!r}"])
+        self.assertEqual(self.client.get('/api/reports/revenue/', {'from': '2030-03-01'}).status_code, 200)
@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import RevenueView, AppointmentVolumeView
+
+urlpatterns = [
+    path('revenue/', RevenueView.as_view()),
+    path('appointments/', AppointmentVolumeView.as_view()),
+]
@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.db.models import DecimalField, Q, Sum
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from hospital_management.params import day_param
+from users.permissions import IsAdmin
+from .models import DailyAppointments, DailyRevenue
+
+GROUPINGS = {
+    'day': 'day',
+    'doctor': 'doctor_id',
+    'specialization': 'doctor__specialization',
+}
+
+
+class SummaryView(APIView):
+    """
+    Aggregates over a summary table. ``?from=`` / ``?to=`` (inclusive dates,
+    default: the last 30 days) and ``?group_by=`` (comma-separated: day,
+    doctor, specialization; default: day).
+    """
+    permission_classes = [IsAdmin]
+    model = None
+    amount_field = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+    def get_aggregates(self):
+        raise NotImplementedError
+
+    def get(self, request):
+        today = timezone.localdate()
+        start = day_param(request, 'from', today - timedelta(days=30))
+        end = day_param(request, 'to', today)
+        group_by = [g for g in request.query_params.get('group_by', 'day').split(',') if g]
+        unknown = set(group_by) - GROUPINGS.keys()
+        if unknown:
+            raise ValidationError(f"Unknown group_by: {', '.join(sorted(unknown))}")
+
+        columns = [GROUPINGS[g] for g in group_by]
+        rows = (self.model.objects.filter(day__gte=start, day__lte=end).exclude(count=0)
+                .values(*columns).annotate(**self.get_aggregates()).order_by(*columns))
+        return Response({
+            'from': start,
+            'to': end,
+            'results': [
+                {**{g: row[GROUPINGS[g]] for g in group_by},
+                 **{name: self.format(name, row[name]) for name in self.get_aggregates()}}
+                for row in rows
+            ],
+        })
+
+    def format(self, name, value):
+        if name.endswith('_amount'):
+            return self.amount_field.to_representation(value or 0)
+        return value or 0
+
+
+def money(**kwargs):
+    return Sum('amount', output_field=DecimalField(max_digits=14, decimal_places=2), **kwargs)
+
+
+class RevenueView(SummaryView):
+    model = DailyRevenue
+
+    def get_aggregates(self):
+        billable = ~Q(status='cancelled')
+        return {
+            'invoice_count': Sum('count', filter=billable),
+            'invoiced_amount': money(filter=billable),
+            'paid_amount': money(filter=Q(status='paid')),
+            'pending_amount': money(filter=Q(status='pending')),
+        }
+
+
+class AppointmentVolumeView(SummaryView):
+    model = DailyAppointments
+
+    def get_aggregates(self):
+        return {
+            'total': Sum('count'),
+            'scheduled': Sum('count', filter=Q(status='scheduled')),
+            'completed': Sum('count', filter=Q(status='completed')),
+            'cancelled': Sum('count', filter=Q(status='cancelled')),
+            'no_show': Sum('count', filter=Q(status='no_show')),
+        }
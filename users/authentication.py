@@ -0,0 +1,179 @@
+"""
+Stateless JWT authentication.
+
+Access tokens carry the user's role, username and doctor/patient profile
+ids, so authenticating a request only verifies the signature: no
+``users_user`` lookup. Only access tokens carry them. ``ClaimsRefreshToken``
+reads them from the database each time it issues an access token, at login
+and at ``/api/users/token/refresh/``, and refreshing fails for a deactivated
+user. A role change or deactivation therefore takes effect when the current
+access token expires (``SIMPLE_JWT['ACCESS_TOKEN_LIFETIME']``).
+
+Code that genuinely needs the ``User`` row (e.g. ``/me`` for the email) gets
+it through ``ClaimsUser.get_full_user()``, which is cached in-process and in
+the shared cache for a short time.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from hospital_management.instrumentation import timed
+from hospital_management.replicas import primary
+
+from .models import User, Doctor, Patient
+
+ROLE_CLAIM = 'role'
+CLAIMS = (ROLE_CLAIM, 'username', 'doctor_id', 'patient_id')  # what ClaimsUser answers without the row
+FULL_USER_TTL = 60       # shared cache
+LOCAL_USER_TTL = 5       # per-process
+
+_local_users = {}
+
+
+def full_user_cache_key(user_id):
+    return f'users:row:{user_id}'
+
+
+def _local_user(user_id):
+    hit = _local_users.get(user_id)
+    if hit is not None and hit[0] > time.monotonic():
+        return hit[1]
+    return None
+
+
+def _remember(user_id, user):
+    _local_users[user_id] = (time.monotonic() + LOCAL_USER_TTL, user)
+    return user
+
+
+def get_cached_user(user_id):
+    """The ``User`` row for ``user_id`` via the process-local, then shared, cache."""
+    user = _local_user(user_id)
+    if user is not None:
+        return user
+    key = full_user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        with primary():
+            user = User.objects.filter(pk=user_id).first()
+        if user is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        cache.set(key, user, FULL_USER_TTL)
+    return _remember(user_id, user)
+
+
+async def aget_cached_user(user_id):
+    """Async twin of ``get_cached_user``."""
+    user = _local_user(user_id)
+    if user is not None:
+        return user
+    key = full_user_cache_key(user_id)
+    user = await cache.aget(key)
+    if user is None:
+        with primary():
+            user = await User.objects.filter(pk=user_id).afirst()
+        if user is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        await cache.aset(key, user, FULL_USER_TTL)
+    return _remember(user_id, user)
+
+
+def forget_cached_user(user_id):
+    _local_users.pop(user_id, None)
+    cache.delete(full_user_cache_key(user_id))
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """A refresh token whose access tokens get the claims as they are now, not as they were at login."""
+    no_copy_claims = (*RefreshToken.no_copy_claims, *CLAIMS)  # refresh tokens issued before this carry them
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        with primary():
+            user = User.objects.filter(pk=self[api_settings.USER_ID_CLAIM]).first()
+            if user is None:
+                raise AuthenticationFailed('User not found', code='user_not_found')
+            access[ROLE_CLAIM] = user.role
+            access['username'] = user.username
+            access['doctor_id'] = Doctor.objects.filter(user=user).values_list('pk', flat=True).first()
+            access['patient_id'] = Patient.objects.filter(user=user).values_list('pk', flat=True).first()
+        return access
+
+
+class ClaimsUser(TokenUser):
+    """Request user resolved from token claims; attributes not in the token come from the full row."""
+
+    @property
+    def id(self):
+        # simplejwt stores the claim as a string
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def role(self):
+        return self.token[ROLE_CLAIM]
+
+    @property
+    def doctor_id(self):
+        return self.token.get('doctor_id')
+
+    @property
+    def patient_id(self):
+        return self.token.get('patient_id')
+
+    def get_full_user(self):
+        return get_cached_user(self.id)
+
+    async def aget_full_user(self):
+        return await aget_cached_user(self.id)
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        if attr in self.token:
+            return self.token[attr]
+        return getattr(self.get_full_user(), attr)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that trusts role/profile claims instead of loading the user."""
+
+    def authenticate(self, request):
+        with timed('auth'):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if ROLE_CLAIM not in validated_token:
+            # issued before claims were added; fall back to the database
+            return super().get_user(validated_token)
+        return ClaimsUser(validated_token)
+
+    async def aauthenticate(self, request):
+        """
+        ``authenticate`` for async views, taking a plain Django request.
+
+        Verifying a claims token involves no I/O. Only older tokens without
+        claims reach the database, through the sync fallback.
+        """
+        with timed('auth'):
+            header = self.get_header(request)
+            raw_token = self.get_raw_token(header) if header is not None else None
+            if raw_token is None:
+                return None
+            validated_token = self.get_validated_token(raw_token)
+            return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if ROLE_CLAIM not in validated_token:
+            return await sync_to_async(super().get_user)(validated_token)
+        return ClaimsUser(validated_token)
@@ -0,0 +1,94 @@
+"""
+Redis cache of the serialized doctor directory.
+
+The list only depends on whether the caller may see unavailable doctors, so
+there are two entries: ``all`` and ``available``. Entries carry a soft expiry;
+once it passes, the first worker to grab the rebuild lock refreshes the entry
+while the others keep serving the stale copy, so an expiry never turns into a
+stampede of identical queries. ``users.signals`` drops both entries whenever a
+doctor or a doctor's user row changes.
+
+Each entry also stores a digest of its data, which the views use as the
+list's ETag, so a conditional request is answered without a query.
+"""
+import hashlib
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from hospital_management.replicas import primary
+
+DOCTOR_LIST_TTL = 300           # seconds an entry is served without a rebuild
+DOCTOR_LIST_STALE_GRACE = 60    # extra seconds a stale entry may be served during a rebuild
+REBUILD_LOCK_TTL = 10
+REBUILD_WAIT = 2.0              # how long a cold-cache request waits for another worker's rebuild
+
+VARIANTS = ('all', 'available')
+INVALIDATED_AT_KEY = 'doctors:list:invalidated_at'
+
+
+def _key(variant):
+    return f'doctors:list:{variant}'
+
+
+def _digest(data):
+    return hashlib.blake2b(json.dumps(data, sort_keys=True, default=str).encode(), digest_size=12).hexdigest()
+
+
+def _result(entry):
+    return entry['data'], entry.get('digest') or _digest(entry['data'])
+
+
+def get_doctor_list(variant, build):
+    """
+    ``(data, digest)`` of the cached list for ``variant``, calling ``build()``
+    only when this worker must rebuild.
+    """
+    key = _key(variant)
+    entry = cache.get(key)
+    if entry is not None and entry['fresh_until'] > time.time():
+        return _result(entry)
+
+    if cache.add(f'{key}:lock', 1, REBUILD_LOCK_TTL):
+        try:
+            return _rebuild(key, build)
+        finally:
+            cache.delete(f'{key}:lock')
+
+    if entry is not None:
+        return _result(entry)  # someone else is rebuilding; stale is fine for a few seconds
+
+    deadline = time.time() + REBUILD_WAIT
+    while time.time() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return _result(entry)
+    data = build()
+    return data, _digest(data)
+
+
+async def aget_doctor_list(variant, build):
+    """Async ``get_doctor_list``: a fresh hit never leaves the event loop."""
+    entry = await cache.aget(_key(variant))
+    if entry is not None and entry['fresh_until'] > time.time():
+        return _result(entry)
+    return await sync_to_async(get_doctor_list)(variant, build)
+
+
+def _rebuild(key, build):
+    started = time.time()
+    with primary():
+        data = build()
+    entry = {'data': data, 'digest': _digest(data), 'fresh_until': time.time() + DOCTOR_LIST_TTL}
+    # an invalidation that landed mid-build means `data` may already be stale; don't keep it
+    if cache.get(INVALIDATED_AT_KEY, 0) < started:
+        cache.set(key, entry, DOCTOR_LIST_TTL + DOCTOR_LIST_STALE_GRACE)
+    return _result(entry)
+
+
+def invalidate_doctor_list():
+    cache.set(INVALIDATED_AT_KEY, time.time(), DOCTOR_LIST_TTL + DOCTOR_LIST_STALE_GRACE)
+    cache.delete_many([_key(variant) for variant in VARIANTS])
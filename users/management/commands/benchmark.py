@@ -0,0 +1,99 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from hospital_management import benchmark
+
+DEFAULT_BASELINES = {
+    'wsgi': os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json'),
+    'asgi': os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline-asgi.json'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the API endpoints against the local database and compare with a stored baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=8, help='Simulated users per scenario')
+        parser.add_argument('--only', nargs='+', metavar='SCENARIO', help='Run just these scenarios')
+        parser.add_argument('--login', default='admin:admin123', metavar='USER:PASSWORD',
+                            help="Credentials for the login scenario ('' to skip it)")
+        parser.add_argument('--server', choices=benchmark.SERVERS, default='wsgi',
+                            help='Drive the WSGI handler from threads or the ASGI handler from asyncio tasks')
+        parser.add_argument('--compare-servers', action='store_true',
+                            help='Run the WSGI and ASGI deployment modes in subprocesses and print them side by side')
+        parser.add_argument('--baseline', help='Baseline file (default: benchmarks/baseline[-asgi].json)')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed p95 slowdown as a fraction of the baseline')
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+        parser.add_argument('--output', help='Also write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        login = tuple(options['login'].split(':', 1)) if options['login'] else None
+        scenarios = benchmark.default_scenarios(login=login)
+        if options['only']:
+            unknown = set(options['only']) - {s.name for s in scenarios}
+            if unknown:
+                raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+            scenarios = [s for s in scenarios if s.name in options['only']]
+        if options['compare_servers']:
+            return self.compare_servers(options)
+        baseline_path = options['baseline'] or DEFAULT_BASELINES[options['server']]
+
+        self.stdout.write(f"{'scenario':<30}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}{'queries':>9}{'errors':>8}")
+
+        def progress(name, r):
+            self.stdout.write(f"{name:<30}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}"
+                              f"{r['rps']:>9}{r['queries']:>9}{r['errors']:>8}")
+
+        results = benchmark.run(scenarios, requests=options['requests'],
+                                concurrency=options['concurrency'], progress=progress, server=options['server'])
+        if options['output']:
+            benchmark.save_results(results, options['output'])
+        if options['save_baseline']:
+            benchmark.save_results(results, baseline_path)
+            self.stdout.write(self.style.SUCCESS(f"✅ Baseline written to {baseline_path}"))
+            return
+
+        if not os.path.exists(baseline_path):
+            self.stdout.write(self.style.WARNING('No baseline to compare against; run with --save-baseline'))
+            return
+        baseline = benchmark.load_baseline(baseline_path)
+        if baseline.get('environment', {}).get('rows') != results['environment']['rows']:
+            self.stdout.write(self.style.WARNING('Dataset differs from the baseline; latency comparisons are rough'))
+        regressions = benchmark.compare(results, baseline, threshold=options['threshold'])
+        if regressions:
+            raise CommandError('Performance regressions:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('✅ No regressions against the baseline'))
+
+    def compare_servers(self, options):
+        """Each server runs in its own process, since ``ASGI_MODE`` decides the middleware and URLconf at startup."""
+        args = ['--requests', str(options['requests']), '--concurrency', str(options['concurrency']),
+                '--login', options['login']]
+        if options['only']:
+            args += ['--only', *options['only']]
+        results = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            for server in benchmark.SERVERS:
+                self.stdout.write(f'Running {server}...')
+                output = os.path.join(tmp, f'{server}.json')
+                env = {**os.environ, 'ASGI_MODE': str(server == 'asgi')}
+                env.pop('ASYNC_READ_VIEWS', None)
+                subprocess.run([sys.executable, sys.argv[0], 'benchmark', '--server', server, '--output', output,
+                                '--baseline', os.path.join(tmp, 'none.json'), *args],
+                               env=env, check=True, stdout=subprocess.DEVNULL)
+                with open(output) as f:
+                    results[server] = json.load(f)['results']
+
+        self.stdout.write(f"{'scenario':<30}{'p95 wsgi':>10}{'p95 asgi':>10}{'req/s wsgi':>12}{'req/s asgi':>12}")
+        for name, wsgi in results['wsgi'].items():
+            asgi = results['asgi'].get(name)
+            if asgi is None:
+                continue
+            self.stdout.write(f"{name:<30}{wsgi['p95_ms']:>10}{asgi['p95_ms']:>10}{wsgi['rps']:>12}{asgi['rps']:>12}")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from hospital_management.openapi import build
+
+
+class Command(BaseCommand):
+    help = ('Generate the OpenAPI schema and its Swagger UI / ReDoc pages into OPENAPI_DIR '
+            '(run before collectstatic; see hospital_management/openapi.py)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Directory to write to (default: OPENAPI_DIR)')
+
+    def handle(self, *args, **options):
+        for path in build(options['output']):
+            self.stdout.write(f'  {path} ({path.stat().st_size} bytes)')
+        self.stdout.write(self.style.SUCCESS('✅ OpenAPI schema built; run collectstatic to publish it'))
@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hospital_management.exports import DATASETS, ENCODERS, export_queryset
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Stream a full extract of appointments, invoices or prescriptions as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('--format', choices=sorted(ENCODERS), default='csv')
+        parser.add_argument('--output', help='File to write (default: stdout)')
+        parser.add_argument('--as-user', help='Only export rows this username can see')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['as_user']:
+            user = User.objects.filter(username=options['as_user']).first()
+            if user is None:
+                raise CommandError(f"No user named {options['as_user']!r}")
+
+        lines = ENCODERS[options['format']](export_queryset(options['dataset'], user))
+        out = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            for line in lines:
+                out.write(line)
+        finally:
+            if options['output']:
+                out.close()
@@ -1,16 +1,56 @@
-from django.core.management.base import BaseCommand
+import random
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
 from django.utils import timezone
-from datetime import timedelta
 from users.models import User, Doctor, Patient
 from appointments.models import Appointment
 from prescriptions.models import Prescription
 from billing.models import Invoice
 
+SPECIALIZATIONS = [choice for choice, _ in Doctor.SPECIALIZATION_CHOICES]
+BLOOD_GROUPS = [choice for choice, _ in Patient.BLOOD_GROUP_CHOICES]
+FIRST_NAMES = ['Aarav', 'Priya', 'Rahul', 'Sneha', 'Vikram', 'Anjali', 'Rohit', 'Nisha', 'Arjun', 'Kavya',
+               'John', 'Maria', 'Chen', 'Fatima', 'Omar', 'Elena', 'Kenji', 'Amara', 'Lucas', 'Zara']
+LAST_NAMES = ['Sharma', 'Verma', 'Reddy', 'Singh', 'Patel', 'Kumar', 'Mehta', 'Iyer', 'Nair', 'Gupta',
+              'Smith', 'Garcia', 'Wang', 'Khan', 'Haddad', 'Petrova', 'Sato', 'Okafor', 'Silva', 'Malik']
+CITIES = ['Mumbai', 'Delhi', 'Bangalore', 'Chennai', 'Hyderabad', 'Pune', 'Kolkata', 'Jaipur']
+NOTES = ['Regular checkup', 'Follow-up visit', 'Fever and cold', 'Back pain', 'Headache', 'Chest pain',
+         'Knee pain', 'Skin rash', 'Blood pressure review', 'Lab results review']
+RX = [
+    ('Mild hypertension', 'Amlodipine 5mg - once daily\nAspirin 75mg - once daily', 'Reduce salt intake.'),
+    ('Seasonal flu', 'Paracetamol 500mg - thrice daily\nCetirizine 10mg - at night', 'Rest for 3 days.'),
+    ('Tension headache', 'Ibuprofen 400mg - twice daily after meals', 'Avoid screen time.'),
+    ('Type 2 diabetes', 'Metformin 500mg - twice daily', 'Low sugar diet. Recheck HbA1c in 3 months.'),
+    ('Gastritis', 'Pantoprazole 40mg - once daily before breakfast', 'Avoid spicy food.'),
+    ('Lower back strain', 'Diclofenac 50mg - twice daily\nThiocolchicoside 4mg - twice daily', 'Physiotherapy.'),
+]
+
 
 class Command(BaseCommand):
-    help = 'Seed database with mock data'
+    help = 'Seed database with mock data (or, with --scale, a large deterministic dataset)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', action='store_true',
+                            help='Generate a large dataset with bulk inserts instead of the demo data')
+        parser.add_argument('--doctors', type=int, default=1_000)
+        parser.add_argument('--patients', type=int, default=1_000_000)
+        parser.add_argument('--appointments', type=int, default=10_000_000)
+        parser.add_argument('--batch-size', type=int, default=5_000)
+        parser.add_argument('--seed', type=int, default=42, help='RNG seed; same seed and anchor give the same data')
+        parser.add_argument('--anchor', type=date.fromisoformat, default=None,
+                            help="Date the schedule is built around (default: today)")
 
     def handle(self, *args, **kwargs):
+        if kwargs.get('scale'):
+            return self.seed_scale(**kwargs)
+
         # ── Safety check — skip if already seeded ────────
         if User.objects.filter(is_superuser=False).exists():
             self.stdout.write('⏭ Data already seeded, skipping...')
@@ -162,4 +202,165 @@ class Command(BaseCommand):
 ║            patient_nisha / patient123║
 ║            patient_vikram/ patient123║
 ╚══════════════════════════════════════╝
-        '''))
\ No newline at end of file
+        '''))
+
+    # ── Scale mode ───────────────────────────────────────
+
+    def seed_scale(self, doctors, patients, appointments, batch_size, seed, anchor, **kwargs):
+        if User.objects.filter(username__startswith='scale_').exists():
+            raise CommandError('Scale data already present (users named scale_*); use a fresh database.')
+
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.password = make_password('scale123')  # hashed once, shared by every generated user
+        anchor = anchor or timezone.localdate()
+        self.stdout.write(f'🌱 Scale seed: {doctors} doctors, {patients} patients, '
+                          f'{appointments} appointments (seed={seed}, anchor={anchor})')
+
+        started = time.monotonic()
+        doctor_rows = self._scale_doctors(doctors)
+        patient_ids = self._scale_patients(patients)
+        self._scale_appointments(appointments, doctor_rows, patient_ids, anchor)
+        self.stdout.write('💊 Parsing prescription items...')
+        call_command('backfill_prescription_items', stdout=self.stdout)
+        self.stdout.write('📊 Rebuilding report tables...')
+        call_command('rebuild_reports', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Scale seed finished in {time.monotonic() - started:.1f}s (password for all: scale123)'))
+
+    def _progress(self, label, done, total, started):
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(f'  {label}: {done}/{total} ({rate:,.0f} rows/s)')
+
+    def _person(self, prefix, i, role):
+        return User(
+            username=f'scale_{prefix}_{i}', email=f'{prefix}{i}@example.com', password=self.password,
+            role=role, first_name=self.rng.choice(FIRST_NAMES), last_name=self.rng.choice(LAST_NAMES),
+        )
+
+    def _scale_doctors(self, total):
+        rows = []
+        started = time.monotonic()
+        for offset in range(0, total, self.batch_size):
+            count = min(self.batch_size, total - offset)
+            with transaction.atomic():
+                users = User.objects.bulk_create(
+                    [self._person('dr', offset + i, 'doctor') for i in range(count)])
+                created = Doctor.objects.bulk_create([
+                    Doctor(
+                        user=user, specialization=self.rng.choice(SPECIALIZATIONS),
+                        experience_years=self.rng.randint(1, 35),
+                        consultation_fee=self.rng.randrange(300, 1500, 50),
+                        slot_minutes=self.rng.choice([15, 20, 30, 30, 30, 45]),
+                    )
+                    for user in users
+                ])
+            rows.extend(created)
+            self._progress('doctors', offset + count, total, started)
+        return rows
+
+    def _scale_patients(self, total):
+        ids = []
+        started = time.monotonic()
+        for offset in range(0, total, self.batch_size):
+            count = min(self.batch_size, total - offset)
+            with transaction.atomic():
+                users = User.objects.bulk_create(
+                    [self._person('pt', offset + i, 'patient') for i in range(count)])
+                created = Patient.objects.bulk_create([
+                    Patient(
+                        user=user,
+                        date_of_birth=date(1940, 1, 1) + timedelta(days=self.rng.randrange(365 * 80)),
+                        blood_group=self.rng.choice(BLOOD_GROUPS),
+                        phone=f'9{self.rng.randrange(10 ** 9):09d}',
+                        address=self.rng.choice(CITIES),
+                        emergency_contact=f'9{self.rng.randrange(10 ** 9):09d}',
+                    )
+                    for user in users
+                ])
+            ids.extend(patient.pk for patient in created)
+            if (offset // self.batch_size) % 20 == 0 or offset + count == total:
+                self._progress('patients', offset + count, total, started)
+        return ids
+
+    def _scale_appointments(self, total, doctors, patient_ids, anchor):
+        """
+        Appointment k goes to doctor k % D as that doctor's (k // D)-th
+        consecutive slot inside working hours, so no two ever overlap. The
+        schedule runs from the past into the future with about 10% still ahead.
+        Slots from the anchor day on are still scheduled; whether a slot is past
+        depends only on the anchor, not the clock, so a seed and anchor always
+        draw the same numbers.
+
+        bulk_create stamps created_at/issued_at with the current time, so each
+        batch backdates them with an update afterwards: appointments to when
+        they were booked, prescriptions and invoices to the end of the visit.
+        """
+        per_doctor = -(-total // len(doctors))
+        slots_per_day = {
+            doctor.pk: max(1, int((datetime.combine(anchor, doctor.work_end)
+                                   - datetime.combine(anchor, doctor.work_start)).total_seconds()
+                                  // 60 // doctor.slot_minutes))
+            for doctor in doctors
+        }
+        max_days = max(-(-per_doctor // n) for n in slots_per_day.values())
+        first_day = anchor - timedelta(days=int(max_days * 0.9))
+        cutoff = timezone.make_aware(datetime.combine(anchor, datetime.min.time()))
+        fees = {doctor.pk: doctor.consultation_fee for doctor in doctors}
+        visit_end = Subquery(Appointment.objects.filter(pk=OuterRef('appointment_id')).values('end_at'))
+
+        started = time.monotonic()
+        created_rx = created_invoices = 0
+        for offset in range(0, total, self.batch_size):
+            batch, booked_days_before = [], []
+            for k in range(offset, min(offset + self.batch_size, total)):
+                doctor = doctors[k % len(doctors)]
+                nth = k // len(doctors)
+                day, slot = divmod(nth, slots_per_day[doctor.pk])
+                start = timezone.make_aware(datetime.combine(
+                    first_day + timedelta(days=day), doctor.work_start)) + slot * doctor.slot_length
+                if start >= cutoff:
+                    status = 'scheduled'
+                else:
+                    status = self.rng.choices(['completed', 'cancelled', 'scheduled'], [85, 10, 5])[0]
+                batch.append(Appointment(
+                    doctor_id=doctor.pk, patient_id=self.rng.choice(patient_ids),
+                    appointment_date=start, end_at=start + doctor.slot_length, status=status,
+                    notes=self.rng.choice(NOTES),
+                ))
+                booked_days_before.append(self.rng.randint(1, 30))
+
+            with transaction.atomic():
+                batch = Appointment.objects.bulk_create(batch)
+                booked = defaultdict(list)
+                for appointment, days in zip(batch, booked_days_before):
+                    booked[days].append(appointment.pk)
+                for days, ids in booked.items():
+                    Appointment.objects.filter(pk__in=ids).update(
+                        created_at=F('appointment_date') - timedelta(days=days))
+                prescriptions, invoices = [], []
+                for appointment in batch:
+                    if appointment.status != 'completed':
+                        continue
+                    if self.rng.random() < 0.7:
+                        diagnosis, medicines, instructions = self.rng.choice(RX)
+                        prescriptions.append(Prescription(
+                            appointment_id=appointment.pk, diagnosis=diagnosis, medicines=medicines,
+                            instructions=instructions))
+                    paid = self.rng.random() < 0.8
+                    invoices.append(Invoice(
+                        appointment_id=appointment.pk, amount=fees[appointment.doctor_id],
+                        status='paid' if paid else 'pending',
+                        paid_at=appointment.end_at + timedelta(days=self.rng.randint(0, 14)) if paid else None))
+                Prescription.objects.bulk_create(prescriptions)
+                Invoice.objects.bulk_create(invoices)
+                completed = [appointment.pk for appointment in batch if appointment.status == 'completed']
+                Prescription.objects.filter(appointment_id__in=completed).update(created_at=visit_end)
+                Invoice.objects.filter(appointment_id__in=completed).update(issued_at=visit_end)
+            created_rx += len(prescriptions)
+            created_invoices += len(invoices)
+            done = offset + len(batch)
+            if (offset // self.batch_size) % 20 == 0 or done == total:
+                self._progress('appointments', done, total, started)
+        self.stdout.write(f'✅ {total} appointments, {created_rx} prescriptions, {created_invoices} invoices')
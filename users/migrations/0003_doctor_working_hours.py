@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-18 03:04
+
+import datetime
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_user_role_doctor_patient'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='work_start',
+            field=models.TimeField(default=datetime.time(9, 0)),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='work_end',
+            field=models.TimeField(default=datetime.time(17, 0)),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='slot_minutes',
+            field=models.PositiveSmallIntegerField(default=30, validators=[django.core.validators.MinValueValidator(5), django.core.validators.MaxValueValidator(240)]),
+        ),
+    ]
@@ -1,5 +1,16 @@
+from datetime import time, timedelta
+
 from django.contrib.auth.models import AbstractUser
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Concat, Trim
+
+
+def full_name(path):
+    """SQL equivalent of ``User.get_full_name()`` for the user reached through ``path``."""
+    return Trim(Concat(f'{path}__first_name', Value(' '), f'{path}__last_name'))
+
 
 class User(AbstractUser):
     ROLE_CHOICES = (
@@ -12,7 +23,18 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.username} ({self.role})"
     
+class DoctorQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Admins and doctors see the whole directory; everyone else only available doctors."""
+        queryset = self.select_related('user')
+        if getattr(user, 'role', None) in ('admin', 'doctor'):
+            return queryset
+        return queryset.filter(is_available=True)
+
+
 class Doctor(models.Model):
+    MAX_SLOT_MINUTES = 240  # bounds the look-behind of slot range scans
+
     SPECIALIZATION_CHOICES = [
         ('cardiologist', 'Cardiologist'),
         ('neurologist', 'Neurologist'),
@@ -24,10 +46,21 @@ class Doctor(models.Model):
     experience_years = models.PositiveIntegerField(default=0)
     consultation_fee = models.DecimalField(max_digits=8, decimal_places=2)
     is_available = models.BooleanField(default=True)
+    work_start = models.TimeField(default=time(9, 0))
+    work_end = models.TimeField(default=time(17, 0))
+    slot_minutes = models.PositiveSmallIntegerField(
+        default=30, validators=[MinValueValidator(5), MaxValueValidator(MAX_SLOT_MINUTES)])
+    updated_at = models.DateTimeField(auto_now=True)  # also bumped when the user's name changes
+
+    objects = DoctorQuerySet.as_manager()
 
     def __str__(self):
         return f"Dr. {self.user.get_full_name()} - {self.specialization}"
 
+    @property
+    def slot_length(self):
+        return timedelta(minutes=self.slot_minutes)
+
 
 class Patient(models.Model):
     BLOOD_GROUP_CHOICES = [
@@ -42,6 +75,12 @@ class Patient(models.Model):
     phone = models.CharField(max_length=15)
     address = models.TextField()
     emergency_contact = models.CharField(max_length=15)
+    updated_at = models.DateTimeField(auto_now=True)  # also bumped when the user's name changes
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], name='patient_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Patient: {self.user.get_full_name()}"
\ No newline at end of file
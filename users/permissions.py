@@ -18,4 +18,9 @@ class IsAdminOrDoctor(BasePermission):
 
 class IsAdminOrPatient(BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.role in ['admin', 'patient']
\ No newline at end of file
+        return request.user.is_authenticated and request.user.role in ['admin', 'patient']
+
+
+class HasRole(BasePermission):
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.role in ['admin', 'doctor', 'patient']
@@ -0,0 +1,34 @@
+"""
+Role-based row visibility, shared by every view that lists appointment data.
+
+Admins see everything, doctors see their own appointments and patients see
+their own. ``prefix`` is the path from the queried model to its appointment,
+e.g. ``'appointment__'`` for invoices and prescriptions. When the request user
+carries profile ids (``ClaimsUser``) the filter is a plain indexed column
+comparison; otherwise it joins through the profile to the user.
+"""
+
+
+def scope_to_user(queryset, user, prefix=''):
+    role = getattr(user, 'role', None)
+    if role == 'admin':
+        return queryset
+    if role in ('doctor', 'patient'):
+        profile_id = getattr(user, f'{role}_id', None)
+        if profile_id is not None:
+            return queryset.filter(**{f'{prefix}{role}_id': profile_id})
+        return queryset.filter(**{f'{prefix}{role}__user_id': user.pk})
+    return queryset.none()
+
+
+def scope_key(user):
+    """A short name for the rows ``scope_to_user`` leaves ``user``, for cache keys and ETags."""
+    role = getattr(user, 'role', None)
+    if role == 'admin':
+        return 'admin'
+    if role in ('doctor', 'patient'):
+        profile_id = getattr(user, f'{role}_id', None)
+        if profile_id is not None:
+            return f'{role}:{profile_id}'
+        return f'{role}-user:{user.pk}'
+    return 'none'
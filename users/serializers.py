@@ -1,5 +1,11 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from .authentication import ClaimsRefreshToken
 from .models import User, Doctor, Patient
+from appointments.models import Appointment
+from billing.models import Invoice
+from prescriptions.models import Prescription
+from hospital_management.fieldsets import SparseFieldsMixin
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)  # never returned in response
@@ -23,20 +29,74 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 
-class DoctorSerializer(serializers.ModelSerializer):
+class DoctorSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     full_name = serializers.CharField(source='user.get_full_name', read_only=True)
     email = serializers.CharField(source='user.email', read_only=True)
 
     class Meta:
         model = Doctor
-        fields = ['id', 'username', 'full_name', 'email', 'specialization', 'experience_years', 'consultation_fee', 'is_available']
+        fields = ['id', 'username', 'full_name', 'email', 'specialization', 'experience_years', 'consultation_fee', 'is_available',
+                  'work_start', 'work_end', 'slot_minutes']
 
 
-class PatientSerializer(serializers.ModelSerializer):
+class PatientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.CharField(source='user.email', read_only=True)
 
     class Meta:
         model = Patient
-        fields = ['id', 'username', 'email', 'date_of_birth', 'blood_group', 'phone', 'address', 'emergency_contact']
\ No newline at end of file
+        fields = ['id', 'username', 'email', 'date_of_birth', 'blood_group', 'phone', 'address', 'emergency_contact']
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Login serializer whose access token carries what permission checks and scoping need."""
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh serializer that re-reads the claims, so a role change can't outlive the access token."""
+    token_class = ClaimsRefreshToken
+
+
+class TimelinePrescriptionSerializer(serializers.ModelSerializer):
+    items = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Prescription
+        fields = ['id', 'diagnosis', 'medicines', 'items', 'instructions', 'created_at']
+
+    def get_items(self, prescription):
+        # prefetched by PatientTimelineView; .all() keeps using the prefetch cache
+        return [
+            {'drug': item.drug, 'strength': item.strength, 'frequency': item.frequency}
+            for item in prescription.items.all()
+        ]
+
+
+class TimelineInvoiceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Invoice
+        fields = ['id', 'amount', 'status', 'issued_at', 'paid_at']
+
+
+class TimelineEntrySerializer(serializers.ModelSerializer):
+    """An appointment with its prescription and invoice (each may be null)."""
+    doctor_name = serializers.CharField(source='doctor.user.get_full_name', read_only=True)
+    specialization = serializers.CharField(source='doctor.specialization', read_only=True)
+    prescription = serializers.SerializerMethodField()
+    invoice = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Appointment
+        fields = ['id', 'appointment_date', 'end_at', 'status', 'notes', 'doctor', 'doctor_name',
+                  'specialization', 'prescription', 'invoice']
+
+    def get_prescription(self, appointment):
+        # reverse one-to-one: a missing row raises an AttributeError subclass
+        prescription = getattr(appointment, 'prescription', None)
+        return TimelinePrescriptionSerializer(prescription).data if prescription else None
+
+    def get_invoice(self, appointment):
+        invoice = getattr(appointment, 'invoice', None)
+        return TimelineInvoiceSerializer(invoice).data if invoice else None
@@ -0,0 +1,74 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from appointments.models import Appointment
+from appointments.signals import appointments_bulk_created, appointments_bulk_updated
+from archive.signals import appointments_archived
+from billing.models import Invoice
+from billing.signals import invoices_bulk_created
+from prescriptions.models import Prescription
+from .authentication import forget_cached_user
+from .cache import invalidate_doctor_list
+from .models import User, Doctor, Patient
+from .timeline import invalidate_timeline
+
+# User columns that DoctorSerializer and PatientSerializer expose
+DIRECTORY_USER_FIELDS = {'username', 'first_name', 'last_name', 'email'}
+
+
+@receiver([post_save, post_delete], sender=Doctor)
+def doctor_changed(sender, instance, **kwargs):
+    invalidate_doctor_list()
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    forget_cached_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=User)
+def doctor_user_changed(sender, instance, update_fields=None, **kwargs):
+    if instance.role != 'doctor':
+        return
+    if update_fields is not None and not DIRECTORY_USER_FIELDS.intersection(update_fields):
+        return  # e.g. last_login bumps
+    invalidate_doctor_list()
+
+
+@receiver(post_save, sender=User)
+def profile_user_changed(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """Move the profile's ``updated_at`` (and with it the list ETags) when the name it shows changes."""
+    if created or raw or instance.role not in ('doctor', 'patient'):
+        return
+    if update_fields is not None and not DIRECTORY_USER_FIELDS.intersection(update_fields):
+        return
+    profiles = Doctor.objects if instance.role == 'doctor' else Patient.objects
+    profiles.filter(user_id=instance.pk).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=Appointment)
+def appointment_changed(sender, instance, **kwargs):
+    invalidate_timeline(instance.patient_id)
+
+
+@receiver([post_save, post_delete], sender=Prescription)
+@receiver([post_save, post_delete], sender=Invoice)
+def appointment_record_changed(sender, instance, **kwargs):
+    try:
+        patient_id = instance.appointment.patient_id
+    except Appointment.DoesNotExist:
+        return  # deleted along with its appointment, whose own signal covers the timeline
+    invalidate_timeline(patient_id)
+
+
+@receiver([appointments_bulk_created, appointments_bulk_updated, appointments_archived], sender=Appointment)
+def appointments_bulk_changed(sender, instances, **kwargs):
+    invalidate_timeline(*(appointment.patient_id for appointment in instances))
+
+
+@receiver(invoices_bulk_created, sender=Invoice)
+def invoices_bulk_changed(sender, instances, **kwargs):
+    appointment_ids = {invoice.appointment_id for invoice in instances}
+    invalidate_timeline(*Appointment.objects.filter(pk__in=appointment_ids).values_list('patient_id', flat=True))
+
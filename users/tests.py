@@ -1,3 +1,402 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+from django.utils import timezone
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from appointments.models import Appointment
+from appointments.views import (AppointmentDetailView, AppointmentListCreateView,
+                                AsyncAppointmentDetailView, AsyncAppointmentListView)
+from billing.models import Invoice
+from hospital_management import openapi, throttling
+from prescriptions.models import Prescription
+from . import cache as doctor_cache
+from .models import User, Doctor, Patient
+from .serializers import ClaimsTokenObtainPairSerializer
+from .timeline import invalidate_timeline
+from .views import AsyncDoctorListView, AsyncMeView, DoctorListView, me as me_view
+
+# appointments (with prescription and invoice joined) + prescription items
+TIMELINE_QUERY_BUDGET = 2
+
+
+class PatientTimelineTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='x', role='admin')
+        cls.doctors = []
+        for name in ('dr_house', 'dr_wilson'):
+            user = User.objects.create_user(username=name, password='x', role='doctor')
+            cls.doctors.append(Doctor.objects.create(user=user, specialization='general', consultation_fee=500))
+        cls.patients = []
+        for name in ('patient_a', 'patient_b'):
+            user = User.objects.create_user(username=name, password='x', role='patient')
+            cls.patients.append(Patient.objects.create(user=user, date_of_birth=date(1990, 1, 1)))
+
+        now = timezone.now()
+        for i in range(6):
+            appointment = Appointment.objects.create(
+                doctor=cls.doctors[i % 2], patient=cls.patients[0],
+                appointment_date=now - timedelta(days=i), status='completed')
+            if i % 3:
+                Prescription.objects.create(appointment=appointment, diagnosis='Flu',
+                                            medicines='Paracetamol 500mg - thrice daily', instructions='Rest')
+            Invoice.objects.create(appointment=appointment, amount=500)
+
+    def setUp(self):
+        invalidate_timeline(*(patient.pk for patient in self.patients))
+
+    def timeline(self, user, patient=None, params=''):
+        self.client.force_authenticate(user)
+        patient = patient or self.patients[0]
+        return self.client.get(f'/api/users/patients/{patient.pk}/timeline/{params}')
+
+    def test_fixed_query_count_newest_first(self):
+        with self.assertNumQueries(TIMELINE_QUERY_BUDGET):
+            entries = self.timeline(self.admin).json()
+        self.assertEqual(len(entries), 6)
+        dates = [entry['appointment_date'] for entry in entries]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+        self.assertIsNone(entries[0]['prescription'])
+        self.assertEqual(entries[1]['prescription']['items'][0]['drug'], 'paracetamol')
+        self.assertEqual(entries[0]['invoice']['amount'], '500.00')
+
+    def test_cursor_paging(self):
+        page = self.timeline(self.admin, params='?page_size=4').json()
+        self.assertEqual(len(page['results']), 4)
+        rest = self.client.get(page['next']).json()
+        self.assertEqual(len(rest['results']), 2)
+
+    def test_visibility(self):
+        self.assertEqual(len(self.timeline(self.doctors[0].user).json()), 3)
+        self.assertEqual(len(self.timeline(self.patients[0].user).json()), 6)
+        self.assertEqual(self.timeline(self.patients[1].user).status_code, 404)
+        self.assertEqual(self.timeline(self.patients[1].user, patient=self.patients[1]).json(), [])
+
+    def test_cached_until_a_record_changes(self):
+        self.timeline(self.admin)
+        with self.assertNumQueries(0):
+            self.timeline(self.admin)
+        invoice = Invoice.objects.filter(appointment__patient=self.patients[0]).first()
+        invoice.status = 'paid'
+        invoice.save()
+        entries = self.timeline(self.admin).json()
+        self.assertIn('paid', [entry['invoice']['status'] for entry in entries])
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class ClaimsTokenTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        doctor_user = User.objects.create_user(username='dr_j', password='x', role='doctor')
+        cls.doctor = Doctor.objects.create(user=doctor_user, specialization='general', consultation_fee=500)
+        cls.patients = []
+        for name in ('patient_j', 'patient_k'):
+            user = User.objects.create_user(username=name, password='x', role='patient')
+            patient = Patient.objects.create(user=user, date_of_birth=date(1990, 1, 1))
+            Appointment.objects.create(doctor=cls.doctor, patient=patient, appointment_date=timezone.now())
+            cls.patients.append(patient)
+        cls.admin = User.objects.create_user(username='admin_j', password='x', role='admin')
+
+    def login(self, username):
+        response = self.client.post('/api/users/login/', {'username': username, 'password': 'x'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def get(self, url, access):
+        return self.client.get(url, headers={'Authorization': f'Bearer {access}'})
+
+    def test_only_the_access_token_carries_claims(self):
+        tokens = self.login('patient_j')
+        access = AccessToken(tokens['access'])
+        self.assertEqual((access['role'], access['username'], access['patient_id'], access['doctor_id']),
+                         ('patient', 'patient_j', self.patients[0].pk, None))
+        self.assertNotIn('role', RefreshToken(tokens['refresh']))
+        self.assertEqual(AccessToken(self.login('dr_j')['access'])['doctor_id'], self.doctor.pk)
+
+    def test_refresh_reads_the_current_role(self):
+        tokens = self.login('admin_j')
+        self.assertEqual(self.get('/api/users/patients/', tokens['access']).status_code, 200)
+        self.admin.role = 'patient'
+        self.admin.save()
+        response = self.client.post('/api/users/token/refresh/', {'refresh': tokens['refresh']})
+        access = response.json()['access']
+        self.assertEqual(AccessToken(access)['role'], 'patient')
+        self.assertEqual(self.get('/api/users/patients/', access).status_code, 403)
+
+        self.admin.is_active = False
+        self.admin.save()
+        response = self.client.post('/api/users/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_claims_user_permissions_and_scope_need_no_user_row(self):
+        doctor_access = self.login('dr_j')['access']
+        patient_access = self.login('patient_j')['access']
+        with self.assertNumQueries(1):  # the patients; no users_user lookup
+            self.assertEqual(self.get('/api/users/patients/', doctor_access).status_code, 200)
+        self.assertEqual(self.get('/api/users/patients/', patient_access).status_code, 403)
+        with self.assertNumQueries(1):
+            rows = self.get('/api/appointments/', patient_access).json()
+        self.assertEqual([row['patient'] for row in rows], [self.patients[0].pk])
+        self.assertEqual(len(self.get('/api/appointments/', doctor_access).json()), 2)
+
+
+class DoctorListCacheTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient_user = User.objects.create_user(username='patient_d', password='x', role='patient')
+        cls.doctor_user = User.objects.create_user(username='dr_d', password='x', role='doctor', first_name='Meera')
+        cls.doctor = Doctor.objects.create(user=cls.doctor_user, specialization='general', consultation_fee=500)
+
+    def setUp(self):
+        cache.clear()
+        self.builds = 0
+
+    def build(self, data='fresh'):
+        self.builds += 1
+        return [data]
+
+    def go_stale(self, variant='all'):
+        key = doctor_cache._key(variant)
+        cache.set(key, {**cache.get(key), 'fresh_until': 0})
+
+    def test_stale_entry_is_served_while_another_worker_rebuilds(self):
+        doctor_cache.get_doctor_list('all', lambda: self.build('old'))
+        self.go_stale()
+        cache.add(f"{doctor_cache._key('all')}:lock", 1)  # another worker is rebuilding
+        data, _ = doctor_cache.get_doctor_list('all', self.build)
+        self.assertEqual((data, self.builds), (['old'], 1))
+
+    def test_one_worker_rebuilds(self):
+        doctor_cache.get_doctor_list('all', self.build)
+        doctor_cache.get_doctor_list('all', self.build)
+        self.assertEqual(self.builds, 1)
+        self.go_stale()
+        data, _ = doctor_cache.get_doctor_list('all', lambda: self.build('rebuilt'))
+        self.assertEqual((data, self.builds), (['rebuilt'], 2))
+        self.assertFalse(cache.get(f"{doctor_cache._key('all')}:lock"))  # released
+
+    def test_cold_cache_waits_for_the_rebuild_in_progress(self):
+        key = doctor_cache._key('all')
+        cache.add(f'{key}:lock', 1)
+        entry = {'data': ['built elsewhere'], 'digest': 'd', 'fresh_until': float('inf')}
+        threading.Timer(0.1, cache.set, (key, entry)).start()
+        data, digest = doctor_cache.get_doctor_list('all', self.build)
+        self.assertEqual((data, digest, self.builds), (['built elsewhere'], 'd', 0))
+
+    def test_invalidation_during_a_build_is_not_cached(self):
+        def build():
+            doctor_cache.invalidate_doctor_list()  # a doctor was saved while the list was being read
+            return self.build()
+
+        data, _ = doctor_cache.get_doctor_list('all', build)
+        self.assertEqual(data, ['fresh'])
+        self.assertIsNone(cache.get(doctor_cache._key('all')))
+
+    def test_doctor_and_user_saves_invalidate_the_list(self):
+        self.client.force_authenticate(self.patient_user)
+
+        def names():
+            return [doctor['full_name'] for doctor in self.client.get('/api/users/doctors/').json()]
+
+        self.assertEqual(names(), ['Meera'])
+        self.doctor_user.first_name = 'Anita'
+        self.doctor_user.save()
+        self.assertEqual(names(), ['Anita'])
+        self.doctor.is_available = False
+        self.doctor.save()
+        self.assertEqual(names(), [])
+
+        self.doctor.is_available = True
+        self.doctor.save()
+        names()
+        self.doctor_user.last_login = timezone.now()
+        self.doctor_user.save(update_fields=['last_login'])  # not shown in the directory
+        self.assertIsNotNone(cache.get(doctor_cache._key('available')))
+
+
+class AsyncReadViewTests(APITestCase):
+    """The async read views must answer exactly like the sync views they stand in for."""
+
+    @classmethod
+    def setUpTestData(cls):
+        doctor_user = User.objects.create_user(username='dr_async', password='x', role='doctor')
+        cls.doctor = Doctor.objects.create(user=doctor_user, specialization='general', consultation_fee=500)
+        cls.patients = []
+        for name in ('patient_x', 'patient_y'):
+            user = User.objects.create_user(username=name, password='x', role='patient')
+            patient = Patient.objects.create(user=user, date_of_birth=date(1985, 2, 1))
+            Appointment.objects.create(doctor=cls.doctor, patient=patient, appointment_date=timezone.now())
+            cls.patients.append(patient)
+
+    def headers(self, user):
+        token = ClaimsTokenObtainPairSerializer.get_token(user).access_token
+        return {'Authorization': f'Bearer {token}'}
+
+    async def assert_same_response(self, async_view, sync_view, user, path='/', **kwargs):
+        headers = await sync_to_async(self.headers)(user)
+        sync_response = await sync_to_async(sync_view)(RequestFactory().get(path, headers=headers), **kwargs)
+        async_response = await async_view.as_view(sync_view=sync_view)(
+            AsyncRequestFactory().get(path, headers=headers), **kwargs)
+        for response in (sync_response, async_response):
+            if hasattr(response, 'render'):  # the handler renders these outside of a test
+                await sync_to_async(response.render)()
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+        return json.loads(async_response.content)
+
+    async def test_appointment_list_is_scoped(self):
+        for patient in self.patients:
+            rows = await self.assert_same_response(
+                AsyncAppointmentListView, AppointmentListCreateView.as_view(), patient.user)
+            self.assertEqual([row['patient'] for row in rows], [patient.pk])
+
+    async def test_appointment_detail_outside_scope_falls_back(self):
+        appointment = await Appointment.objects.aget(patient=self.patients[0])
+        await self.assert_same_response(AsyncAppointmentDetailView, AppointmentDetailView.as_view(),
+                                        self.patients[1].user, pk=appointment.pk)
+
+    async def test_me_and_doctor_list(self):
+        me = await self.assert_same_response(AsyncMeView, me_view, self.patients[0].user)
+        self.assertEqual(me['username'], 'patient_x')
+        doctors = await self.assert_same_response(AsyncDoctorListView, DoctorListView.as_view(), self.patients[0].user)
+        self.assertEqual(len(doctors), 1)
+
+
+class PerformanceMiddlewareTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        doctor_user = User.objects.create_user(username='dr_perf', password='x', role='doctor')
+        doctor = Doctor.objects.create(user=doctor_user, specialization='general', consultation_fee=500)
+        patient_user = User.objects.create_user(username='patient_perf', password='x', role='patient')
+        patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1))
+        cls.appointment = Appointment.objects.create(doctor=doctor, patient=patient, status='scheduled',
+                                                     appointment_date=timezone.now() + timedelta(days=1))
+        cls.admin = User.objects.create_user(username='admin_perf', password='x', role='admin')
+
+    def get(self, path):
+        self.client.force_authenticate(self.admin)
+        return self.client.get(path)
+
+    def timing(self, response):
+        return dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+
+    def test_no_server_timing_header_outside_debug(self):
+        self.assertFalse(self.get(f'/api/appointments/{self.appointment.pk}/').has_header('Server-Timing'))
+
+    @override_settings(PERF_SERVER_TIMING=True)
+    def test_server_timing_reports_queries_and_phases(self):
+        response = self.get(f'/api/appointments/{self.appointment.pk}/')
+        self.assertEqual(response.status_code, 200)
+        timing = self.timing(response)
+        # forced authentication never reaches the authenticator, so there is no auth phase
+        self.assertEqual(set(timing), {'db', 'view', 'serialize', 'render', 'total'})
+        self.assertRegex(timing['db'], r'desc="\d+ queries"')
+
+    @override_settings(PERF_SERVER_TIMING=True)
+    def test_generic_responses_are_timed_as_view(self):
+        response = self.get('/api/appointments/?page_size=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('serialize', self.timing(response))
+
+    def test_serializers_are_not_patched(self):
+        self.get('/api/appointments/')
+        self.assertEqual(BaseSerializer.__dict__['data'].fget.__module__, 'rest_framework.serializers')
+
+
+class OpenAPISchemaTests(APITestCase):
+
+    def test_build_writes_the_schema_and_pages(self):
+        with tempfile.TemporaryDirectory() as directory:
+            openapi.build(directory)
+            schema = json.loads((Path(directory) / 'swagger.json').read_text())
+            page = (Path(directory) / 'swagger.html').read_text()
+        self.assertIn('/appointments/', schema['paths'])
+        self.assertNotIn('host', schema)
+        self.assertIn('"url": "/static/openapi/swagger.json"', page)
+
+    def test_docs_urls_point_at_the_static_files(self):
+        response = self.client.get('/swagger/?format=openapi')
+        self.assertRedirects(response, '/static/openapi/swagger.json', fetch_redirect_response=False)
+        response = self.client.get('/redoc/')
+        self.assertRedirects(response, '/static/openapi/redoc.html', fetch_redirect_response=False)
+
+
+@override_settings(THROTTLE_BACKEND='memory', THROTTLE_LOGIN_USERNAME_RATE='3/min', THROTTLE_RATES={
+    'login': {'anon': '100/min'}, 'booking': {'patient': '2/min'}, 'list': {'patient': '100/min'}})
+class ThrottlingTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        doctor_user = User.objects.create_user(username='dr_t', password='x', role='doctor')
+        cls.doctor = Doctor.objects.create(user=doctor_user, specialization='general', consultation_fee=500)
+        cls.patient_user = User.objects.create_user(username='patient_t', password='x', role='patient')
+        Patient.objects.create(user=cls.patient_user, date_of_birth=date(1990, 1, 1))
+
+    def setUp(self):
+        throttling.reset_store()
+        self.addCleanup(throttling.reset_store)
+
+    def test_login_attempts_are_limited_per_username(self):
+        for i in range(3):
+            response = self.client.post('/api/users/login/', {'username': 'patient_t', 'password': 'wrong'},
+                                        REMOTE_ADDR=f'10.0.0.{i}')
+            self.assertEqual(response.status_code, 401)
+        response = self.client.post('/api/users/login/', {'username': 'patient_t', 'password': 'x'},
+                                    REMOTE_ADDR='10.0.0.9')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        response = self.client.post('/api/users/login/', {'username': 'dr_t', 'password': 'x'})
+        self.assertEqual(response.status_code, 200)
+
+    def login_forwarded(self, forwarded_for):
+        """A failed login through the proxy at 10.0.0.1, claiming ``X-Forwarded-For: forwarded_for``."""
+        return self.client.post('/api/users/login/', {'username': 'nobody', 'password': 'x'},
+                                REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=forwarded_for).status_code
+
+    @override_settings(THROTTLE_RATES={'login': {'anon': '2/min'}})
+    def test_forwarded_for_is_ignored_without_trusted_proxies(self):
+        self.assertEqual([self.login_forwarded(f'192.0.2.{i}') for i in range(3)], [401, 401, 429])
+
+    @override_settings(THROTTLE_RATES={'login': {'anon': '2/min'}},
+                       REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1})
+    def test_forwarded_for_names_the_client_behind_a_proxy(self):
+        self.assertEqual([self.login_forwarded('spoofed, 192.0.2.1') for _ in range(3)], [401, 401, 429])
+        self.assertEqual(self.login_forwarded('spoofed, 192.0.2.2'), 401)
+
+    def test_booking_has_its_own_bucket(self):
+        self.client.force_authenticate(self.patient_user)
+        start = datetime(2030, 1, 7, 10, tzinfo=dt_timezone.utc)  # inside working hours
+        statuses = [self.client.post('/api/appointments/', {
+            'doctor': self.doctor.pk, 'appointment_date': (start + timedelta(hours=i)).isoformat()}).status_code
+            for i in range(3)]
+        self.assertEqual(statuses, [201, 201, 429])
+        self.assertEqual(self.client.get('/api/appointments/').status_code, 200)
+
+    @override_settings(ADMISSION_MAX_CONCURRENCY=1)
+    def test_requests_over_the_concurrency_cap_are_turned_away(self):
+        inner = []
+
+        def view(request):
+            inner.append(middleware(request))  # a second request while this one is in progress
+            return HttpResponse()
+
+        middleware = throttling.AdmissionMiddleware(view)
+        self.assertEqual(middleware(RequestFactory().get('/')).status_code, 200)
+        self.assertEqual(inner[0].status_code, 429)
+        self.assertEqual(inner[0]['Retry-After'], '1')
+        self.assertEqual(middleware(RequestFactory().get('/')).status_code, 200)
@@ -0,0 +1,51 @@
+"""
+Per-patient cache of timeline pages.
+
+Each patient has a version number in the cache. A page is stored under the
+patient's current version plus the viewer and the query string, so one
+version bump invalidates every page of that patient, for every viewer,
+without tracking keys. ``users.signals`` bumps the version on any
+appointment, prescription or invoice write for the patient, including the
+bulk paths.
+
+A version is taken from the clock when it is first created, so an evicted
+version key can never come back as a number an old page was stored under.
+Changes that reach a timeline indirectly, such as a doctor's name, show up
+once the pages expire after ``TIMELINE_TTL``.
+"""
+import time
+
+from django.core.cache import cache
+
+from hospital_management.replicas import primary
+
+TIMELINE_TTL = 300
+
+
+def _version_key(patient_id):
+    return f'timeline:{patient_id}:version'
+
+
+def timeline_version(patient_id):
+    key = _version_key(patient_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_timeline(*patient_ids):
+    now = time.time_ns()
+    cache.set_many({_version_key(patient_id): now for patient_id in set(patient_ids)}, None)
+
+
+def get_timeline_page(patient_id, variant, build):
+    """The cached page for ``variant`` (viewer + query), built with ``build()`` on a miss."""
+    key = f'timeline:{patient_id}:{timeline_version(patient_id)}:{variant}'
+    data = cache.get(key)
+    if data is None:
+        with primary():
+            data = build()
+        cache.set(key, data, TIMELINE_TTL)
+    return data
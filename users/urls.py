@@ -1,14 +1,18 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
 from .views import RegisterView, DoctorListView, PatientListView
 
-from .views import RegisterView, DoctorListView, PatientListView, me
+from .views import (RegisterView, LoginView, DoctorListView, DoctorSlotsView, PatientListView, PatientTimelineView, me,
+                    AsyncDoctorListView, AsyncMeView)
+from hospital_management.async_views import read_view
 
 urlpatterns = [
     path('register/', RegisterView.as_view()),
-    path('login/', TokenObtainPairView.as_view()),
+    path('login/', LoginView.as_view()),
     path('token/refresh/', TokenRefreshView.as_view()),
-    path('doctors/', DoctorListView.as_view()),
+    path('doctors/', read_view(DoctorListView.as_view(), AsyncDoctorListView)),
+    path('doctors/<int:pk>/slots/', DoctorSlotsView.as_view()),
     path('patients/', PatientListView.as_view()),
-    path('me/', me),   # ← add this
+    path('patients/<int:pk>/timeline/', PatientTimelineView.as_view()),
+    path('me/', read_view(me, AsyncMeView)),   # ← add this
 ]
\ No newline at end of file
@@ -1,42 +1,168 @@
-from rest_framework import generics, permissions
+from datetime import timedelta
+
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import generics, permissions, serializers
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
+from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.response import Response
-from .serializers import RegisterSerializer, DoctorSerializer, PatientSerializer
+from .serializers import RegisterSerializer, DoctorSerializer, PatientSerializer, TimelineEntrySerializer
 from .models import Doctor, Patient
 
 from .permissions import IsAdmin, IsAdminOrDoctor
+from .authentication import ClaimsUser
+from .cache import aget_doctor_list, get_doctor_list
+from .scoping import scope_to_user
+from .timeline import get_timeline_page
+from appointments import scheduling
+from appointments.models import Appointment
+from hospital_management.async_views import AsyncReadView, Validated
+from hospital_management.conditional import ConditionalListMixin, check_preconditions, make_etag, set_validators
+from hospital_management.fieldsets import is_requested, load_only, selected_fields
+from hospital_management.instrumentation import serialized
+from hospital_management.params import date_param
 
 class RegisterView(generics.CreateAPIView):
     serializer_class = RegisterSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'register'
+
+class LoginView(TokenObtainPairView):
+    throttle_scope = 'login'
 
 class DoctorListView(generics.ListAPIView):
     serializer_class = DoctorSerializer
     permission_classes = [permissions.IsAuthenticated]
+    ordering = ('id',)
 
     def get_queryset(self):
-        user = self.request.user
-        if user.role in ['admin', 'doctor']:
-            return Doctor.objects.select_related('user').all()
-        return Doctor.objects.select_related('user').filter(is_available=True)
+        queryset = Doctor.objects.visible_to(self.request.user)
+        fields = selected_fields(self)
+        if fields is not None:
+            queryset = load_only(queryset, fields, keep=self.ordering)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if self.paginator.is_requested(request) or is_requested(request):
+            return super().list(request, *args, **kwargs)  # the cache holds whole, unpaged lists only
+        variant = 'all' if request.user.role in ['admin', 'doctor'] else 'available'
+        data, digest = get_doctor_list(
+            variant, lambda: serialized(self.get_serializer(self.get_queryset().order_by(*self.ordering), many=True)))
+        etag = doctor_list_etag(request, request.accepted_renderer.format, variant, digest)
+        return check_preconditions(request, etag, None) or set_validators(Response(data), etag, None)
+
 
+def doctor_list_etag(request, renderer_format, variant, digest):
+    return make_etag(request.get_full_path(), renderer_format, variant, digest)
+
+
+class DoctorSlotsView(APIView):
+    """Free slots of one doctor between ``?from=`` and ``?to=`` (ISO date or datetime)."""
+    permission_classes = [permissions.IsAuthenticated]
+    max_range = timedelta(days=31)
 
-class PatientListView(generics.ListAPIView):
-    queryset = Patient.objects.select_related('user').all()
+    def get(self, request, pk):
+        doctor = get_object_or_404(Doctor.objects.visible_to(request.user), pk=pk)
+
+        start = date_param(request, 'from') or timezone.now()
+        end = date_param(request, 'to') or start + timedelta(days=7)
+        if end <= start or end - start > self.max_range:
+            raise ValidationError("'to' must be after 'from' and at most 31 days later.")
+
+        field = serializers.DateTimeField()
+        return Response({
+            'doctor': doctor.pk,
+            'slot_minutes': doctor.slot_minutes,
+            'slots': [
+                {'start': field.to_representation(slot_start), 'end': field.to_representation(slot_end)}
+                for slot_start, slot_end in scheduling.free_slots(doctor, start, end)
+            ],
+        })
+
+
+
+class PatientListView(ConditionalListMixin, generics.ListAPIView):
     serializer_class = PatientSerializer
     permission_classes = [IsAdminOrDoctor]
+    ordering = ('id',)
+
+    def get_queryset(self):
+        queryset = Patient.objects.select_related('user')
+        fields = selected_fields(self)
+        if fields is not None:
+            queryset = load_only(queryset, fields, keep=('updated_at', *self.ordering))
+        return queryset
+
+
+class PatientTimelineView(generics.ListAPIView):
+    """
+    A patient's appointments, newest first, each with its prescription and
+    invoice. Admins see all of them, doctors only their own appointments with
+    the patient, and patients only their own timeline. Paging is the usual
+    opt-in cursor. Pages are cached per patient (see ``users.timeline``).
+    """
+    serializer_class = TimelineEntrySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    ordering = ('-appointment_date', '-id')
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):  # schema generation
+            return Appointment.objects.none()
+        queryset = Appointment.objects.filter(patient_id=self.kwargs['pk'])
+        return scope_to_user(queryset, self.request.user).select_related(
+            'doctor__user', 'prescription', 'invoice',
+        ).prefetch_related('prescription__items').order_by(*self.ordering)
+
+    def list(self, request, *args, **kwargs):
+        user = request.user
+        viewer = 'admin' if user.role == 'admin' else f'{user.role}:{user.pk}'
+        variant = f'{viewer}:{request.query_params.urlencode()}'
+        return Response(get_timeline_page(self.kwargs['pk'], variant, self._build))
 
+    def _build(self):
+        response = super().list(self.request, *self.args, **self.kwargs)
+        if not response.data and not self._patient_visible():
+            raise NotFound('Patient not found.')
+        return response.data
+
+    def _patient_visible(self):
+        patients = Patient.objects.filter(pk=self.kwargs['pk'])
+        if self.request.user.role == 'patient':
+            patients = patients.filter(user_id=self.request.user.pk)
+        return patients.exists()
+
+
+
+class AsyncDoctorListView(AsyncReadView):
+    async def get(self, request, user):
+        variant = 'all' if user.role in ['admin', 'doctor'] else 'available'
+        queryset = Doctor.objects.visible_to(user).order_by(*DoctorListView.ordering)
+        data, digest = await aget_doctor_list(variant, lambda: serialized(DoctorSerializer(queryset, many=True)))
+        return Validated(data, doctor_list_etag(request, self.renderer.format, variant, digest))
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def me(request):
+    # the email isn't a token claim, so this reads the (cached) user row
     return Response({
         "id": request.user.id,
         "username": request.user.username,
         "email": request.user.email,
         "role": request.user.role
-    })
\ No newline at end of file
+    })
+
+
+class AsyncMeView(AsyncReadView):
+    async def get(self, request, user):
+        full_user = await user.aget_full_user() if isinstance(user, ClaimsUser) else user
+        return {
+            "id": user.id,
+            "username": user.username,
+            "email": full_user.email,
+            "role": user.role
+        }